@@ -0,0 +1,29 @@
+"""add product search index
+
+Revision ID: 217dbc386275
+Revises: 44cf615a948c
+Create Date: 2026-10-18 14:13:19.066653
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.database.search import product_search_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = '217dbc386275'
+down_revision: Union[str, None] = '44cf615a948c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    product_search_index.create(connection)
+    product_search_index.rebuild(connection)
+
+
+def downgrade() -> None:
+    product_search_index.drop(op.get_bind())
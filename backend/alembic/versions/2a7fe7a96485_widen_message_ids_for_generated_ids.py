@@ -0,0 +1,29 @@
+"""widen message ids for generated ids
+
+Revision ID: 2a7fe7a96485
+Revises: ea3a7e230b23
+Create Date: 2026-10-18 14:42:33.273193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a7fe7a96485'
+down_revision: Union[str, None] = 'ea3a7e230b23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Message IDs are now generated by the server and need 53 bits
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.alter_column('id', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.alter_column('id', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
@@ -0,0 +1,39 @@
+"""add product created_at
+
+Revision ID: 44cf615a948c
+Revises: 7ff36c4fed98
+Create Date: 2026-10-18 14:11:39.817286
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '44cf615a948c'
+down_revision: Union[str, None] = '7ff36c4fed98'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    # Existing listings get the migration time so every row has a sortable value
+    products = sa.table('products', sa.column('created_at', sa.DateTime(timezone=True)))
+    op.execute(
+        products.update()
+        .where(products.c.created_at.is_(None))
+        .values(created_at=datetime.now(timezone.utc))
+    )
+    op.create_index('ix_products_price_id', 'products', ['price', 'id'], unique=False)
+    op.create_index('ix_products_created_at_id', 'products', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_created_at_id', table_name='products')
+    op.drop_index('ix_products_price_id', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('created_at')
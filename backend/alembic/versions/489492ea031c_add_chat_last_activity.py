@@ -0,0 +1,43 @@
+"""add chat last activity
+
+Revision ID: 489492ea031c
+Revises: 738f0ee4bf57
+Create Date: 2026-10-18 14:46:48.486436
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '489492ea031c'
+down_revision: Union[str, None] = '738f0ee4bf57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('last_message_id', sa.BigInteger(), nullable=True))
+    op.add_column('chats', sa.Column('last_activity_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("""
+        UPDATE chats SET
+            last_message_id = (SELECT MAX(messages.id) FROM messages WHERE messages.chat_id = chats.id),
+            last_activity_at = COALESCE(
+                (SELECT MAX(messages.timestamp) FROM messages WHERE messages.chat_id = chats.id),
+                CURRENT_TIMESTAMP
+            )
+    """)
+    with op.batch_alter_table('chats') as batch_op:
+        batch_op.alter_column('last_activity_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+    op.create_index('ix_chats_buyer_id_last_activity_at', 'chats', ['buyer_id', 'last_activity_at', 'id'], unique=False)
+    op.create_index('ix_chats_farmer_id_last_activity_at', 'chats', ['farmer_id', 'last_activity_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chats_farmer_id_last_activity_at', table_name='chats')
+    op.drop_index('ix_chats_buyer_id_last_activity_at', table_name='chats')
+    with op.batch_alter_table('chats') as batch_op:
+        batch_op.drop_column('last_activity_at')
+        batch_op.drop_column('last_message_id')
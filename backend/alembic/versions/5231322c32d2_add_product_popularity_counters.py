@@ -0,0 +1,51 @@
+"""add product popularity counters
+
+Revision ID: 5231322c32d2
+Revises: 217dbc386275
+Create Date: 2026-10-18 14:14:53.678270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5231322c32d2'
+down_revision: Union[str, None] = '217dbc386275'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COUNTER_COLUMNS = ('order_count', 'sales_count', 'order_count_7d', 'order_count_30d')
+SORT_INDEXES = {
+    'ix_products_order_count_id': 'order_count',
+    'ix_products_order_count_7d_id': 'order_count_7d',
+    'ix_products_order_count_30d_id': 'order_count_30d',
+}
+
+
+def upgrade() -> None:
+    # Counters start at zero; run `python -m app.scripts.backfill_popularity` to fill them
+    for column in COUNTER_COLUMNS:
+        op.add_column('products', sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+    for index_name, column in SORT_INDEXES.items():
+        op.create_index(index_name, 'products', [column, 'id'], unique=False)
+    op.create_table('product_sales_daily',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('sales_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('product_sales_daily')
+    for index_name in SORT_INDEXES:
+        op.drop_index(index_name, table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        for column in COUNTER_COLUMNS:
+            batch_op.drop_column(column)
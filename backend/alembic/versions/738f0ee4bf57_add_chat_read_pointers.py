@@ -0,0 +1,33 @@
+"""add chat read pointers
+
+Revision ID: 738f0ee4bf57
+Revises: 2a7fe7a96485
+Create Date: 2026-10-18 14:44:50.869263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '738f0ee4bf57'
+down_revision: Union[str, None] = '2a7fe7a96485'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('buyer_last_read_message_id', sa.BigInteger(), nullable=True))
+    op.add_column('chats', sa.Column('farmer_last_read_message_id', sa.BigInteger(), nullable=True))
+    op.drop_index('ix_messages_chat_id_timestamp', table_name='messages')
+    op.create_index('ix_messages_chat_id_id', 'messages', ['chat_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_chat_id_id', table_name='messages')
+    op.create_index('ix_messages_chat_id_timestamp', 'messages', ['chat_id', 'timestamp'], unique=False)
+    with op.batch_alter_table('chats') as batch_op:
+        batch_op.drop_column('farmer_last_read_message_id')
+        batch_op.drop_column('buyer_last_read_message_id')
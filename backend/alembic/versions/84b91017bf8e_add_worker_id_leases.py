@@ -0,0 +1,31 @@
+"""add worker id leases
+
+Revision ID: 84b91017bf8e
+Revises: ebb9713b63e8
+Create Date: 2026-10-18 15:25:15.305236
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '84b91017bf8e'
+down_revision: Union[str, None] = 'ebb9713b63e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('worker_id_leases',
+    sa.Column('worker_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('owner', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('worker_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('worker_id_leases')
@@ -0,0 +1,46 @@
+"""add stock reservations
+
+Revision ID: dee46359f8dc
+Revises: fbe57c56f059
+Create Date: 2026-10-18 14:19:07.744858
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dee46359f8dc'
+down_revision: Union[str, None] = 'fbe57c56f059'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('Held', 'Committed', 'Released', name='reservation_status'), nullable=False),
+    sa.Column('checkout_session_id', sa.String(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_reservations_id', 'stock_reservations', ['id'], unique=False)
+    op.create_index('ix_stock_reservations_order_id', 'stock_reservations', ['order_id'], unique=False)
+    op.create_index('ix_stock_reservations_checkout_session_id', 'stock_reservations', ['checkout_session_id'], unique=False)
+    op.create_index('ix_stock_reservations_status_expires_at', 'stock_reservations', ['status', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_reservations_status_expires_at', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_checkout_session_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_order_id', table_name='stock_reservations')
+    op.drop_index('ix_stock_reservations_id', table_name='stock_reservations')
+    op.drop_table('stock_reservations')
+    sa.Enum(name='reservation_status').drop(op.get_bind(), checkfirst=True)
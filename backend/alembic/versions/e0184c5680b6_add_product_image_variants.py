@@ -0,0 +1,27 @@
+"""add product image variants
+
+Revision ID: e0184c5680b6
+Revises: 489492ea031c
+Create Date: 2026-10-18 14:49:27.165171
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0184c5680b6'
+down_revision: Union[str, None] = '489492ea031c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('product_images', sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('product_images') as batch_op:
+        batch_op.drop_column('variants')
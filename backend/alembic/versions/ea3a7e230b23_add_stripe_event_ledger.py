@@ -0,0 +1,48 @@
+"""add stripe event ledger
+
+Revision ID: ea3a7e230b23
+Revises: dee46359f8dc
+Create Date: 2026-10-18 14:22:51.840271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ea3a7e230b23'
+down_revision: Union[str, None] = 'dee46359f8dc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stripe_events',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('Received', 'Processing', 'Processed', 'Failed', name='stripe_event_status'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('received_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stripe_events_status_updated_at', 'stripe_events', ['status', 'updated_at'], unique=False)
+    op.add_column('payments', sa.Column('stripe_checkout_session_id', sa.String(), nullable=True))
+    op.add_column('payments', sa.Column('stripe_payment_intent_id', sa.String(), nullable=True))
+    op.create_index('ix_payments_stripe_checkout_session_id', 'payments', ['stripe_checkout_session_id'], unique=False)
+    op.create_index('ix_payments_stripe_payment_intent_id', 'payments', ['stripe_payment_intent_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payments_stripe_payment_intent_id', table_name='payments')
+    op.drop_index('ix_payments_stripe_checkout_session_id', table_name='payments')
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('stripe_payment_intent_id')
+        batch_op.drop_column('stripe_checkout_session_id')
+    op.drop_index('ix_stripe_events_status_updated_at', table_name='stripe_events')
+    op.drop_table('stripe_events')
+    sa.Enum(name='stripe_event_status').drop(op.get_bind(), checkfirst=True)
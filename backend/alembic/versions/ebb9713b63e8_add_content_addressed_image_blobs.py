@@ -0,0 +1,45 @@
+"""add content addressed image blobs
+
+Revision ID: ebb9713b63e8
+Revises: e0184c5680b6
+Create Date: 2026-10-18 14:59:48.323001
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ebb9713b63e8'
+down_revision: Union[str, None] = 'e0184c5680b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('image_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('variants', sa.JSON(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('released_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_index('ix_image_blobs_ref_count_released_at', 'image_blobs', ['ref_count', 'released_at'], unique=False)
+    with op.batch_alter_table('product_images') as batch_op:
+        batch_op.add_column(sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_product_images_blob_sha256', ['blob_sha256'], unique=False)
+        batch_op.create_foreign_key(
+            'fk_product_images_blob_sha256_image_blobs', 'image_blobs', ['blob_sha256'], ['sha256']
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('product_images') as batch_op:
+        batch_op.drop_constraint('fk_product_images_blob_sha256_image_blobs', type_='foreignkey')
+        batch_op.drop_index('ix_product_images_blob_sha256')
+        batch_op.drop_column('blob_sha256')
+    op.drop_index('ix_image_blobs_ref_count_released_at', table_name='image_blobs')
+    op.drop_table('image_blobs')
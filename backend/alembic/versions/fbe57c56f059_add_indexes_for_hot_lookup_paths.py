@@ -0,0 +1,70 @@
+"""add indexes for hot lookup paths
+
+Revision ID: fbe57c56f059
+Revises: 5231322c32d2
+Create Date: 2026-10-18 14:15:45.963588
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fbe57c56f059'
+down_revision: Union[str, None] = '5231322c32d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_farmer_profiles_user_id', 'farmer_profiles', ['user_id']),
+    ('ix_buyer_profiles_user_id', 'buyer_profiles', ['user_id']),
+    ('ix_products_farmer_id', 'products', ['farmer_id']),
+    ('ix_products_category_price', 'products', ['category', 'price']),
+    ('ix_product_images_product_id', 'product_images', ['product_id']),
+    ('ix_orders_buyer_id', 'orders', ['buyer_id']),
+    ('ix_order_items_product_id', 'order_items', ['product_id']),
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    ('ix_comments_product_id', 'comments', ['product_id']),
+    ('ix_payments_order_id', 'payments', ['order_id']),
+    ('ix_chats_farmer_id', 'chats', ['farmer_id']),
+    ('ix_chats_buyer_id_farmer_id', 'chats', ['buyer_id', 'farmer_id']),
+    ('ix_messages_chat_id_timestamp', 'messages', ['chat_id', 'timestamp']),
+]
+
+
+def upgrade() -> None:
+    # Merge duplicate cart rows into the oldest one before enforcing uniqueness
+    op.execute("""
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(duplicate.quantity) FROM cart_items AS duplicate
+            WHERE duplicate.user_id = cart_items.user_id
+              AND duplicate.product_id = cart_items.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart_items
+            WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+            GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM cart_items
+        WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+          AND id NOT IN (
+            SELECT MIN(id) FROM cart_items
+            WHERE user_id IS NOT NULL AND product_id IS NOT NULL
+            GROUP BY user_id, product_id
+          )
+    """)
+    op.create_index('uq_cart_items_user_id_product_id', 'cart_items', ['user_id', 'product_id'], unique=True)
+
+    for index_name, table_name, columns in INDEXES:
+        op.create_index(index_name, table_name, columns, unique=False)
+
+
+def downgrade() -> None:
+    for index_name, table_name, _ in reversed(INDEXES):
+        op.drop_index(index_name, table_name=table_name)
+    op.drop_index('uq_cart_items_user_id_product_id', table_name='cart_items')
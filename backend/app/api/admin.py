@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
@@ -9,11 +9,14 @@ from ..database.database import get_db
 from ..repositories.buyers import BuyersRepository
 from ..repositories.farmers import FarmersRepository
 from ..repositories.users import UsersRepository
-from ..schemas.buyers import BuyerProfileInfo, BuyerProfileWithUserInfo
-from ..schemas.users import (FarmerProfileInfo, ProfileInfo, UserInfo,
-                             UserUpdate)
-from ..utils.security import decode_jwt_token
+from ..schemas.buyers import BuyerProfileWithUserInfo
+from ..schemas.users import FarmerProfileInfo, UserInfo, UserUpdate
+from ..utils.cache import principal_cache
+from ..utils.json_response import RowsJSONResponse
+from ..utils.response_cache import response_cache
+from ..utils.security import resolve_principal
 from ..utils.email_utils import send_email
+from ..utils.exports import ExportFormat, export_response
 from enum import Enum
 
 class ApprovalStatusEnum(str, Enum):
@@ -27,13 +30,12 @@ oauth2_scheme_2factor = OAuth2PasswordBearer(tokenUrl="/auth/users/login/confirm
 users_repository = UsersRepository()
 
 def admin_required(
-        token: str = Depends(oauth2_scheme_2factor), db: Session = Depends(get_db)
+        request: Request, token: str = Depends(oauth2_scheme_2factor), db: Session = Depends(get_db)
 ):
-    user_id = decode_jwt_token(token)
-    user = users_repository.get_user_by_id(db, user_id)
-    if user.role != "Admin":
+    principal = resolve_principal(request, db, token)
+    if not principal.is_admin:
         raise HTTPException(status_code=403, detail="Insufficient permissions.")
-    return user
+    return principal
 
 farmers_repository = FarmersRepository()
 buyers_repository = BuyersRepository()
@@ -51,61 +53,37 @@ router = APIRouter(
 #     return farmers
 
 
-@router.get("/farmers", response_model=list[FarmerProfileInfo])
+@router.get("/farmers", response_model=list[FarmerProfileInfo], response_class=RowsJSONResponse)
 def get_all_farmers(db: Session = Depends(get_db)):
     """
     Fetch all farmers with their profile data.
     """
-    # Fetch farmers with their user and profile data
-    farmers = farmers_repository.get_all_farmers(db)
-    serialized_farmers = [
-        FarmerProfileInfo(
-            id=farmer.id,
-            fullname=farmer.fullname,
-            email=farmer.email,
-            phone=farmer.phone,
-            role=farmer.role,
-            profile=ProfileInfo(
-                farm_name=farmer.farmer_profile.farm_name,
-                location=farmer.farmer_profile.location,
-                farm_size=farmer.farmer_profile.farm_size,
-                is_approved=farmer.farmer_profile.is_approved,
-                user_id=farmer.farmer_profile.user_id,
-            )
-            if farmer.farmer_profile
-            else None,
-        )
-        for farmer in farmers
-    ]
-    return serialized_farmers
+    # Rows are already shaped like FarmerProfileInfo, so they are serialized without validation
+    return RowsJSONResponse(farmers_repository.get_all_farmers(db))
 
 
-@router.get("/buyers", response_model=list[BuyerProfileWithUserInfo])
+@router.get("/buyers", response_model=list[BuyerProfileWithUserInfo], response_class=RowsJSONResponse)
 def get_all_buyers(db: Session = Depends(get_db)):
     """
     Fetch all buyers with their profile data.
     """
-    # Fetch buyers with their user and profile data
-    buyers = buyers_repository.get_all_buyers(db)
-    serialized_buyers = [
-        BuyerProfileWithUserInfo(
-            id=buyer.id,
-            fullname=buyer.fullname,
-            email=buyer.email,
-            phone=buyer.phone,
-            role=buyer.role,
-            profile=(
-                BuyerProfileInfo(
-                    delivery_address=buyer.buyer_profile.delivery_address,
-                    user_id=buyer.buyer_profile.user_id,
-                )
-                if buyer.buyer_profile
-                else None
-            ),
-        )
-        for buyer in buyers
-    ]
-    return serialized_buyers
+    return RowsJSONResponse(buyers_repository.get_all_buyers(db))
+
+
+# Streaming exports of the listings above, for tables too large for one response
+@router.get("/export/users")
+def export_users(request: Request, format: ExportFormat = ExportFormat.NDJSON, db: Session = Depends(get_db)):
+    return export_response(request, db, users_repository.export_users, format, "users")
+
+
+@router.get("/export/farmers")
+def export_farmers(request: Request, format: ExportFormat = ExportFormat.NDJSON, db: Session = Depends(get_db)):
+    return export_response(request, db, farmers_repository.export_farmers, format, "farmers")
+
+
+@router.get("/export/buyers")
+def export_buyers(request: Request, format: ExportFormat = ExportFormat.NDJSON, db: Session = Depends(get_db)):
+    return export_response(request, db, buyers_repository.export_buyers, format, "buyers")
 
 
 # # 2. Approve a farmer profile by user_id
@@ -246,3 +224,15 @@ def delete_user(
 ):
     users_repository.delete_user(db, user_id)
     return {"message": f"User with ID {user_id} has been deleted successfully."}
+
+
+# Hit/miss counters of the authorization cache
+@router.get("/metrics/principal-cache")
+def get_principal_cache_stats():
+    return principal_cache.stats()
+
+
+# Hit/miss counters of the public catalog response cache
+@router.get("/metrics/response-cache")
+def get_response_cache_stats():
+    return response_cache.stats()
@@ -5,6 +5,7 @@ from email.mime.text import MIMEText
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Response, HTTPException, Form, status, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from jose import jwt
 from sqlalchemy.orm import Session
@@ -18,13 +19,13 @@ from ..schemas.users import UserCreate, UserLogin, UserUpdate, UserInfo, Passwor
 from ..database.database import get_db
 from ..utils.security import (
     hash_password,
-    verify_password,
     create_jwt_token,
     decode_jwt_token,
 )
 
 from ..schemas.verification_code import VerificationCodeCreate, VerificationCodeVerify, UserRegistrationData
 from ..utils.email_utils import send_email
+from ..utils.passwords import password_service
 from app.config import (
     MAIL_USERNAME,
     MAIL_PASSWORD,
@@ -130,18 +131,30 @@ def post_signup(user_input: UserCreate, db: Session = Depends(get_db)):
     )
 
 
+async def verify_login_password(db: Session, user, password: str):
+    """
+    Check a login password on the password worker pool. Hashes made with outdated
+    bcrypt parameters are replaced with a fresh hash of the same password.
+    """
+    is_valid, new_hash = await password_service.verify_and_update(password, user.password_hashed)
+    if not is_valid:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if new_hash:
+        user.password_hashed = new_hash
+        await run_in_threadpool(db.commit)
+
+
 @router.post("/users/login/initiate", status_code=200)
 async def initiate_login(login_data: UserLogin, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     user = users_repository.get_user_by_email(db, login_data.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not verify_password(login_data.password, user.password_hashed):
-        raise HTTPException(
-            status_code=401,
-            detail="Incorrect password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    await verify_login_password(db, user, login_data.password)
     
     # Create a verification code entry
     verification_data = VerificationCodeCreate(
@@ -184,15 +197,9 @@ def confirm_login(
 
 # Login endpoint using email
 @router.post("/users/login")
-def post_login(login_data: UserLogin, db: Session = Depends(get_db)):
-    user_data = UserLogin(email=login_data.email, password=login_data.password)
-    user = users_repository.get_user_by_email(db, user_data.email)
-    if not verify_password(login_data.password, user.password_hashed):
-        raise HTTPException(
-            status_code=401,
-            detail="Incorrect password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+async def post_login(login_data: UserLogin, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(users_repository.get_user_by_email, db, login_data.email)
+    await verify_login_password(db, user, login_data.password)
 
     access_token = create_jwt_token(user.id)
     return {"access_token": access_token, "token_type": "bearer"}
@@ -295,7 +302,7 @@ async def confirm_password_reset(
         raise HTTPException(status_code=404, detail="User not found.")
     
     # Update the user's password
-    user.password_hashed = hash_password(password_reset_confirm.new_password)
+    user.password_hashed = await password_service.hash(password_reset_confirm.new_password)
     db.commit()
 
     return JSONResponse(
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from ..database.database import get_db
 from ..repositories.cart import CartRepository
-from ..schemas.cart import CartItem
+from ..schemas.cart import CartBulkUpdate, CartItem
 from ..utils.security import decode_jwt_token
 
 router = APIRouter()
@@ -13,10 +13,7 @@ cart_repository = CartRepository()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
 
 
-@router.get("/")
-def get_cart(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    user_id = decode_jwt_token(token)
-    cart_items = cart_repository.get_cart(db, user_id)
+def _cart_response(cart_items):
     return [
         {
             "product_id": cart_item.product_id,
@@ -28,6 +25,31 @@ def get_cart(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db))
     ]
 
 
+@router.get("/")
+def get_cart(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    user_id = decode_jwt_token(token)
+    cart_items = cart_repository.get_cart(db, user_id)
+    return _cart_response(cart_items)
+
+
+@router.put("/")
+def set_cart(cart: CartBulkUpdate, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """
+    Sync many cart items in one request.
+
+    - **mode=replace** (default): the cart becomes exactly the given items.
+    - **mode=merge**: the given products are set to the given quantities; other items stay.
+
+    A quantity of 0 removes the product. Returns the updated cart.
+    """
+    user_id = decode_jwt_token(token)
+    try:
+        cart_items = cart_repository.set_cart_items(db, user_id, cart.items, replace=cart.mode == "replace")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _cart_response(cart_items)
+
+
 @router.post("/")
 def add_to_cart(item: CartItem, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     user_id = decode_jwt_token(token)
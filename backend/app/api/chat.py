@@ -1,24 +1,30 @@
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional
 
-from fastapi import (APIRouter, Depends, HTTPException, WebSocket,
-                     WebSocketDisconnect)
+from fastapi import (APIRouter, Depends, HTTPException, Query, Response,
+                     WebSocket, WebSocketDisconnect)
 from fastapi.encoders import jsonable_encoder
 from fastapi.websockets import WebSocketState
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 
-from ..database.database import get_db
+from ..database.database import get_db, get_session_factory
 from ..database.models import User
 from ..repositories.chat import ChatRepository
 from ..repositories.users import UsersRepository
-from ..schemas.chat import (ChatResponse, ChatResponseWithMessages,
-                            MessageResponse)
+from ..schemas.chat import (ChatReadResponse, ChatReadUpdate, ChatResponse,
+                            ChatResponseWithMessages, ChatSummaryResponse,
+                            InboxEntry, MessageResponse)
 from ..utils.connection_manager import ConnectionManager
+from ..utils.ids import generate_id_async
+from ..utils.message_writer import MessageWriter
+from ..utils.pagination import NEXT_CURSOR_HEADER
 from ..utils.security import get_current_user, get_current_user_websocket
 
 router = APIRouter()
 chat_repository = ChatRepository()
 users_repository = UsersRepository()
 manager = ConnectionManager()
+message_writer = MessageWriter()
 import logging
 
 logging.basicConfig(
@@ -31,8 +37,8 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
-@router.get("/chats/{chat_id}", response_model=ChatResponseWithMessages)
-def get_chat(chat_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def get_participant_chat(db: Session, chat_id: int, user: User):
+    """Load a chat the user takes part in, enforcing the buyer-farmer communication rules."""
     # Check if the chat exists
     chat = chat_repository.get_chat_by_id(db, chat_id)
     if not chat:
@@ -56,9 +62,17 @@ def get_chat(chat_id: int, db: Session = Depends(get_db), user: User = Depends(g
     else:
         # Admins can communicate with anyone
         pass
+    return chat
+
+
+@router.get("/chats/{chat_id}", response_model=ChatResponseWithMessages)
+def get_chat(chat_id: int, response: Response, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    chat = get_participant_chat(db, chat_id, user)
 
-    # Get the messages
-    messages = chat_repository.get_recent_messages(db, chat_id, limit=50)
+    # Get the latest messages; older ones are paged through /chats/{chat_id}/messages
+    messages, next_before = chat_repository.get_messages_page(db, chat_id, limit=50)
+    if next_before:
+        response.headers[NEXT_CURSOR_HEADER] = str(next_before)
 
     # Return chat info and messages
     return ChatResponseWithMessages(
@@ -68,14 +82,57 @@ def get_chat(chat_id: int, db: Session = Depends(get_db), user: User = Depends(g
         messages=messages
     )
 
+
+@router.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
+def get_chat_messages(
+    chat_id: int,
+    response: Response,
+    before: Optional[int] = Query(None, description="Return messages older than this message ID"),
+    limit: int = Query(50, ge=1, le=100, description="Maximum number of messages to return"),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Page backwards through a chat's history.
+
+    Returns up to **limit** messages older than **before** (the newest ones when it is
+    omitted), oldest first. When older messages exist, the ``before`` value for the
+    next page is sent in the X-Next-Cursor response header.
+    """
+    get_participant_chat(db, chat_id, user)
+    messages, next_before = chat_repository.get_messages_page(db, chat_id, limit, before)
+    if next_before:
+        response.headers[NEXT_CURSOR_HEADER] = str(next_before)
+    return messages
+
+
+@router.post("/chats/{chat_id}/read", response_model=ChatReadResponse)
+def mark_chat_read(
+    chat_id: int,
+    read_update: Optional[ChatReadUpdate] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Mark the chat as read up to **message_id**, or up to its latest message."""
+    chat = get_participant_chat(db, chat_id, user)
+    message_id = read_update.message_id if read_update else None
+    last_read_message_id = chat_repository.mark_read(db, chat, user.id, message_id)
+    return ChatReadResponse(chat_id=chat.id, last_read_message_id=last_read_message_id)
+
 # WebSocket endpoint for chat (simplified)
 @router.websocket("/ws/chat/{chat_id}")
-async def websocket_chat(websocket: WebSocket, chat_id: int, db: Session = Depends(get_db)):
+async def websocket_chat(
+    websocket: WebSocket,
+    chat_id: int,
+    session_factory: sessionmaker = Depends(get_session_factory),
+):
     logger.info(f"New WebSocket connection request for chat_id={chat_id}")
-    user = await get_current_user_websocket(websocket, db)
-    logger.info(f"Authenticated WebSocket user: user_id={user.id}, chat_id={chat_id}")
+    # The session is only needed to authorize the socket, not for its whole lifetime
+    with session_factory() as db:
+        user = await get_current_user_websocket(websocket, db)
+        logger.info(f"Authenticated WebSocket user: user_id={user.id}, chat_id={chat_id}")
+        chat = chat_repository.get_chat_by_id(db, chat_id)
 
-    chat = chat_repository.get_chat_by_id(db, chat_id)
     if not chat:
         await websocket.close(code=1008)
         logger.error("Chat not found")
@@ -96,22 +153,29 @@ async def websocket_chat(websocket: WebSocket, chat_id: int, db: Session = Depen
 
             content = data.get("content")
             if content:
-                message = chat_repository.create_message(
-                    db, chat_id=chat_id, sender_id=user.id, content=content
+                # Broadcast right away; the message is saved by the write-behind buffer
+                message = MessageResponse(
+                    id=await generate_id_async(),
+                    chat_id=chat_id,
+                    sender_id=user.id,
+                    content=content,
+                    timestamp=datetime.now(timezone.utc),
                 )
-                logger.info(f"Message saved: message_id={message.id}, chat_id={chat_id}, user_id={user.id}")
+                await message_writer.submit(message.model_dump())
+                logger.info(f"Message queued: message_id={message.id}, chat_id={chat_id}, user_id={user.id}")
 
-                message_orm = MessageResponse.from_orm(message)
-                message_dict = jsonable_encoder(message_orm)
+                message_dict = jsonable_encoder(message)
                 await manager.broadcast(chat_id, message_dict)
     except WebSocketDisconnect:
         logger.warning(f"WebSocket disconnected: chat_id={chat_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
     finally:
-        if websocket.client_state != WebSocketState.DISCONNECTED:
+        # The manager may already have closed a slow client's socket
+        if (websocket.client_state != WebSocketState.DISCONNECTED
+                and websocket.application_state != WebSocketState.DISCONNECTED):
             await websocket.close()
-        manager.disconnect(chat_id, websocket)
+        await manager.disconnect(chat_id, websocket)
         logger.info(f"WebSocket connection closed: user_id={user.id}, chat_id={chat_id}")
 
 # Endpoint for buyer to initiate a chat with a farmer
@@ -138,7 +202,28 @@ def create_chat_with_farmer(farmer_id: int, db: Session = Depends(get_db), user:
     return ChatResponse.from_orm(new_chat)
 
 # Endpoint to get chats for the current user
-@router.get("/chats/", response_model=List[ChatResponse])
+@router.get("/chats/", response_model=List[ChatSummaryResponse])
 def get_user_chats(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     chats = chat_repository.get_user_chats(db, user_id=user.id, role=user.role)
-    return chats
\ No newline at end of file
+    return chats
+
+
+@router.get("/inbox", response_model=List[InboxEntry])
+def get_inbox(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of chats to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Get a page of the current user's chats, most recently active first, each with the
+    other participant, the last message and the number of unread messages.
+
+    When more chats exist, the cursor for the next page is sent in the X-Next-Cursor
+    response header.
+    """
+    entries, next_cursor = chat_repository.get_inbox(db, user.id, user.role, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return entries
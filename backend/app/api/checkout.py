@@ -1,14 +1,18 @@
 # api/checkout.py
+from datetime import datetime, timedelta, timezone
+
 import stripe
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from ..repositories.orders import OrdersRepository
-from ..config import STRIPE_SECRET_KEY
 from ..database.database import get_db
 from ..repositories.cart import CartRepository
+from ..repositories.reservations import ReservationsRepository
 from ..schemas.orders import OrderCreate
 from ..utils.security import decode_jwt_token
+from ..utils.stripe_client import get_stripe_client
 import logging
 logging.basicConfig(
     level=logging.INFO,  # Записывать все логи уровня INFO и выше
@@ -25,11 +29,44 @@ router = APIRouter()
 cart_repository = CartRepository()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
 orders_repository = OrdersRepository()
-stripe.api_key = STRIPE_SECRET_KEY
+reservations_repository = ReservationsRepository()
 
 @router.post("/create-checkout-session")
-def create_checkout_session(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def create_checkout_session(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    stripe_client: stripe.StripeClient = Depends(get_stripe_client),
+):
     user_id = decode_jwt_token(token)
+    # Database work runs on the threadpool; the Stripe round-trip only awaits on the event loop
+    order_id, session_params = await run_in_threadpool(create_pending_order, db, user_id)
+
+    try:
+        checkout_session = await stripe_client.checkout.sessions.create_async(
+            session_params,
+            # Retries of this request (ours or the client's) can never open a second session
+            options={'idempotency_key': f'checkout-order-{order_id}'},
+        )
+    except stripe.error.StripeError as e:
+        logger.error(f"Stripe API error for order {order_id}: {e.user_message or e}")
+        await run_in_threadpool(reservations_repository.release_order, db, order_id)
+        raise HTTPException(status_code=502, detail=e.user_message or "Payment provider is unavailable.")
+    except Exception as e:
+        logger.exception("An unexpected error occurred during Stripe session creation.")
+        await run_in_threadpool(reservations_repository.release_order, db, order_id)
+        raise HTTPException(status_code=500, detail="Internal server error.")
+
+    await run_in_threadpool(reservations_repository.attach_checkout_session, db, order_id, checkout_session.id)
+    return {'checkout_url': checkout_session.url}
+
+
+def create_pending_order(db: Session, user_id: int):
+    """
+    Turn the user's cart into a pending order holding its stock.
+
+    Returns the order ID and the Stripe Checkout Session parameters. The session's
+    connection is returned to the pool before the caller talks to Stripe.
+    """
     cart_items = cart_repository.get_cart(db, user_id)
     logger.info(f"User ID decoded from token: {user_id}")
     logger.info(f"Cart items retrieved: {cart_items}")
@@ -108,25 +145,25 @@ def create_checkout_session(token: str = Depends(oauth2_scheme), db: Session = D
         logger.exception("An unexpected error occurred during order creation.")
         raise HTTPException(status_code=500, detail="Internal server error during order creation.")
 
-    try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=line_items,
-            mode='payment',
-            success_url='http://localhost:3000/success?session_id={CHECKOUT_SESSION_ID}',
-            cancel_url='http://localhost:3000/cancel',
-            client_reference_id=str(user_id),
-            metadata={'order_id': str(order.id)},  # Store order_id in metadata
-        )
-        return {'checkout_url': checkout_session.url}
-    except stripe.error.StripeError as e:
-        logger.error(f"Stripe API error: {e.user_message}")
-        orders_repository.delete_order(db, order.id)
-        raise HTTPException(status_code=502, detail=e.user_message)
-    except HTTPException as e:
-        logger.error(f"HTTP error occurred: {e.detail}")
-        raise e
-    except Exception as e:
-        logger.exception("An unexpected error occurred during Stripe session creation.")
-        orders_repository.delete_order(db, order.id)
-        raise HTTPException(status_code=500, detail="Internal server error.")
\ No newline at end of file
+    # Stripe sessions must stay open at least 30 minutes; never outlive the stock hold by much
+    hold_expires_at = reservations_repository.get_hold_expiry(db, order.id)
+    session_expires_at = max(
+        hold_expires_at or datetime.now(timezone.utc),
+        datetime.now(timezone.utc) + timedelta(minutes=31),
+    )
+
+    session_params = {
+        'payment_method_types': ['card'],
+        'line_items': line_items,
+        'mode': 'payment',
+        'success_url': 'http://localhost:3000/success?session_id={CHECKOUT_SESSION_ID}',
+        'cancel_url': 'http://localhost:3000/cancel',
+        'client_reference_id': str(user_id),
+        'metadata': {'order_id': str(order.id)},  # Store order_id in metadata
+        # payment_intent.* webhook events only carry the payment intent's own metadata
+        'payment_intent_data': {'metadata': {'order_id': str(order.id)}},
+        'expires_at': int(session_expires_at.timestamp()),
+    }
+    order_id = order.id
+    db.close()
+    return order_id, session_params
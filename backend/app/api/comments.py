@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Request, Response
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from ..database.database import get_db
 from ..repositories.comments import CommentsRepository
 from ..schemas.comments import CommentCreate, CommentInfoList
+from ..utils.response_cache import comments_tag, response_cache
 from ..utils.security import check_user_role, decode_jwt_token
 
 router = APIRouter()
 comments_repository = CommentsRepository()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
+COMMENT_LIST = TypeAdapter(CommentInfoList)
 
 
 # Create a comment on a product (Anyone)
@@ -41,7 +44,7 @@ def create_comment(
 
 # Get comments on a product (Anyone)
 @router.get("/products/{product_id}/comments", response_model=CommentInfoList)
-def get_comments(product_id: int, db: Session = Depends(get_db)):
+def get_comments(product_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Get all comments for a specific product.
 
@@ -51,8 +54,10 @@ def get_comments(product_id: int, db: Session = Depends(get_db)):
     Returns:
     - A list of comments for the specified product.
     """
-    comments = comments_repository.get_comment_by_product_id(db, product_id)
-    return CommentInfoList(comments=comments)
+    return response_cache.respond(
+        request, [comments_tag(product_id)], COMMENT_LIST,
+        lambda headers: CommentInfoList(comments=comments_repository.get_comment_by_product_id(db, product_id)),
+    )
 
 
 # Update a comment (Users and Admins)
@@ -1,15 +1,14 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, Response, HTTPException
+from fastapi import APIRouter, Depends, Response
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from ..database.database import get_db
-from ..database.models import User, FarmerProfile
 from ..repositories.orders import OrdersRepository
-from ..schemas.orders import OrderInfo, OrderUpdate, FarmerOrderInfo, FarmerPurchasedProducts, \
-    ProductInfo, OrderedProductDetail
-from ..utils.security import check_user_role, decode_jwt_token, users_repository
+from ..schemas.orders import OrderInfo, OrderUpdate, FarmerPurchasedProducts
+from ..utils.json_response import RowsJSONResponse
+from ..utils.security import CurrentPrincipal, check_user_role, decode_jwt_token, require_roles
 
 router = APIRouter()
 orders_repository = OrdersRepository()
@@ -30,40 +29,20 @@ def get_orders(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db
     orders = orders_repository.get_orders_by_user_id(db, user_id)
     return orders
 
-@router.get("/{order_id}", response_model=OrderInfo)
+@router.get("/{order_id}", response_model=OrderInfo, response_class=RowsJSONResponse)
 def get_order(
     order_id: int,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
     user_id = decode_jwt_token(token)
-    order = orders_repository.get_order_by_id(db, order_id)
+    order = orders_repository.get_order_info(db, order_id)
 
-    if order.buyer_id != user_id:
+    if order["buyer_id"] != user_id:
         check_user_role(token, db, ["Admin"])
 
-    order_info = OrderInfo(
-        id=order.id,
-        total_price=order.total_price,
-        status=order.status,
-        created_at=order.created_at,
-        buyer_id=order.buyer_id,
-        items=[
-            OrderedProductDetail(
-                product=ProductInfo(
-                    id=item.product.id,
-                    name=item.product.name,
-                    description=item.product.description,
-                    category=item.product.category,
-                    price=item.product.price
-                ),
-                quantity=item.quantity
-            )
-            for item in order.items
-        ]
-    )
-
-    return order_info
+    # The row dicts already have the OrderInfo shape, so they are serialized without validation
+    return RowsJSONResponse(order)
 
 # Update an order status (Buyers and Admins)
 @router.patch("/{order_id}", status_code=200)
@@ -115,10 +94,10 @@ def delete_order(
     return Response(content=f"Order with id {order_id} deleted", status_code=200)
 
 
-@router.get("/farmer/orders", response_model=FarmerPurchasedProducts)
+@router.get("/farmer/orders", response_model=FarmerPurchasedProducts, response_class=RowsJSONResponse)
 def get_farmer_orders(
-        token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db),
+        principal: CurrentPrincipal = Depends(require_roles("Farmer")),
 ):
     """
     Get all orders placed to a specific farmer.
@@ -130,12 +109,5 @@ def get_farmer_orders(
     Returns:
     - A list of orders with buyer and product details related to the farmer.
     """
-    user_id = decode_jwt_token(token)
-
-    check_user_role(token, db, ["Farmer"])
-    user = users_repository.get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials.")
-
-    farmer_orders = orders_repository.get_purchased_products_by_farmer_user_id(db, user_id)
-    return farmer_orders
\ No newline at end of file
+    farmer_orders = orders_repository.get_purchased_products_by_farmer_user_id(db, principal.user_id)
+    return RowsJSONResponse(farmer_orders)
\ No newline at end of file
@@ -1,35 +1,38 @@
 from typing import List, Optional
 
 from fastapi import (APIRouter, Depends, File, Form, HTTPException, Query,
-                     Response, UploadFile)
-from fastapi.security import OAuth2PasswordBearer
+                     Request, Response, UploadFile)
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from ..database.database import get_db
-from ..database.models import User
 from ..repositories.products import ProductsRepository
 from ..schemas.products import ProductCreate, ProductInfo, ProductUpdate
-from ..utils.file_upload import save_product_images
-from ..utils.security import (check_farmer_approval, check_user_role,
-                              decode_jwt_token)
+from ..utils.file_upload import discard_product_images, save_product_images
+from ..utils.pagination import NEXT_CURSOR_HEADER
+from ..utils.response_cache import (CATALOG_TAG, farmer_products_tag,
+                                    product_tag, response_cache)
+from ..utils.security import (CurrentPrincipal, get_current_principal,
+                              require_roles)
 
 router = APIRouter()
 products_repository = ProductsRepository()
 VALID_CATEGORIES = {"Vegetables", "Fruits", "Seeds", "Dairy", "Meat", "Equipment"}
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
+PRODUCT = TypeAdapter(ProductInfo)
+PRODUCT_LIST = TypeAdapter(List[ProductInfo])
 
 
 @router.post("/", response_model=ProductInfo, status_code=201)
-def create_product(
+async def create_product(
         name: str = Form(...),
         quantity: int = Form(...),
         category: str = Form(...),
         description: Optional[str] = Form(None),
         price: float = Form(...),
         images: List[UploadFile] = File(...),
-        token: str = Depends(oauth2_scheme),
         db: Session = Depends(get_db),
-        farmer: User = Depends(check_farmer_approval)
+        principal: CurrentPrincipal = Depends(get_current_principal),
 ):
     """
     Create a new product with multiple images.
@@ -40,12 +43,11 @@ def create_product(
             detail=f"Invalid category: {category}. Allowed categories are: {', '.join(VALID_CATEGORIES)}"
         )
 
-    # Verify user role
-    user_id = decode_jwt_token(token)
-    check_user_role(token, db, ["Farmer", "Admin"])
+    # Only approved farmers can list products
+    principal.require_approved_farmer()
 
-    # Save images and get their URLs
-    image_urls = save_product_images(images)
+    # Stream, resize and save images, getting the URLs of their variants
+    saved_images = await save_product_images(images, db)
 
     # Create the product input data
     product_input = ProductCreate(
@@ -56,25 +58,107 @@ def create_product(
         description=description
     )
 
-    # Create the product
-    product = products_repository.create_product(db, product_input, user_id, image_urls)
+    def create():
+        product = products_repository.create_product(
+            db,
+            product_input,
+            principal.user_id,
+            [image["image_url"] for image in saved_images],
+            farmer_profile_id=principal.info.farmer_profile_id,
+            image_variants=[image["variants"] for image in saved_images],
+            image_blobs=[(image["sha256"], image["blob"]) for image in saved_images],
+        )
+        # Serialized here, so loading the images never blocks the event loop
+        return ProductInfo.model_validate(product, from_attributes=True)
 
-    # Return the product data as JSON
-    return product
+    # Create the product
+    try:
+        return await run_in_threadpool(create)
+    except Exception:
+        await run_in_threadpool(discard_product_images, db, saved_images)
+        raise
 
 
 @router.get("/", response_model=List[ProductInfo])
-def get_all_products(db: Session = Depends(get_db)):
+def get_all_products(
+    request: Request,
+    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of products to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    sort_by: str = Query(
+        "id",
+        description="Sorting options: 'id', 'price_asc', 'price_desc', 'newest', 'popularity', 'popularity_7d', 'popularity_30d'"
+    ),
+    category: Optional[str] = Query(None, description="Filter products by category"),
+    price_from: float = Query(0.0, description="Minimum price"),
+    price_until: float = Query(-1.0, description="Maximum price (-1 for no limit)"),
+):
     """
-    Get all products.
+    Get a page of products.
+
+    - **limit**: Page size (1-200).
+    - **cursor**: Opaque cursor returned by the previous page; omit it for the first page.
+    - **sort_by**: Sorting options: 'id', 'price_asc', 'price_desc', 'newest', 'popularity',
+      'popularity_7d', 'popularity_30d'.
+    - **category**: Filter products by category.
+    - **price_from** / **price_until**: Price range (use -1 for no upper limit).
+
+    Returns:
+    - A list of products. When more products exist, the cursor for the next page is
+      sent in the X-Next-Cursor response header.
+    """
+    def build(headers):
+        products, next_cursor = products_repository.get_products_page(
+            db, limit, cursor, sort_by, category, price_from, price_until
+        )
+        if next_cursor:
+            headers[NEXT_CURSOR_HEADER] = next_cursor
+        return products
+
+    return response_cache.respond(request, [CATALOG_TAG], PRODUCT_LIST, build)
+
+
+# Declared before /{product_id} so "search" is not parsed as a product ID
+@router.get("/search", response_model=List[ProductInfo])
+def search_products(
+    db: Session = Depends(get_db),
+    q: Optional[str] = Query(None, description="Full-text search over name, description, category and farm location"),
+    name: Optional[str] = Query(None, description="Filter products by name (word prefix match)"),
+    category: Optional[str] = Query(None, description="Filter products by category"),
+    farm_location: Optional[str] = Query(None, description="Filter products by farm location (word prefix match)"),
+    price_from: float = Query(0.0, description="Minimum price"),
+    price_until: float = Query(-1.0, description="Maximum price (-1 for no limit)"),
+    sort_by: Optional[str] = Query(
+        None,
+        description="Sorting options: 'price_asc', 'price_desc', 'popularity', 'popularity_7d', 'popularity_30d', 'newest'"
+    ),
+):
     """
-    products = products_repository.get_all_products(db)
+    Search for products based on name, category, farm location, price range, and sorting options.
+
+    - **q**: Full-text search over name, description, category and farm location.
+    - **name**: Filter products by name (word prefix match).
+    - **category**: Filter products by category.
+    - **farm_location**: Filter products by farm location (word prefix match).
+    - **price_from**: Minimum price.
+    - **price_until**: Maximum price (use -1 for no upper limit).
+    - **sort_by**: Sorting options: 'price_asc', 'price_desc', 'popularity', 'popularity_7d',
+      'popularity_30d', 'newest'. Without a sort option, results are ordered by relevance.
+
+    Text filters match whole words by prefix, e.g. "tom" matches "Cherry tomatoes".
+
+    Returns:
+    - A list of products matching the search criteria.
+    """
+    products = products_repository.search_products(
+        db, name, category, farm_location, price_from, price_until, sort_by, q
+    )
     return products
 
 
 # Get a product by its ID
 @router.get("/{product_id}", response_model=ProductInfo)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Get product details by its ID.
 
@@ -84,8 +168,10 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     Returns:
     - The product details if found.
     """
-    product = products_repository.get_product_by_id(db, product_id)
-    return product
+    return response_cache.respond(
+        request, [product_tag(product_id)], PRODUCT,
+        lambda headers: products_repository.get_product_by_id(db, product_id),
+    )
 
 
 # Update a product (Farmers and Admins)
@@ -93,8 +179,8 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
 def update_product(
         product_id: int,
         product_input: ProductUpdate,
-        token: str = Depends(oauth2_scheme),
         db: Session = Depends(get_db),
+        principal: CurrentPrincipal = Depends(require_roles("Farmer", "Admin")),
 ):
     """
     Update an existing product.
@@ -107,7 +193,6 @@ def update_product(
     Returns:
     - A success message with the updated product's ID.
     """
-    check_user_role(token, db, ["Farmer", "Admin"])
     updated_product = products_repository.update_product(db, product_id, product_input)
     return Response(content=f"Product with id {product_id} updated", status_code=200)
 
@@ -115,7 +200,9 @@ def update_product(
 # Delete a product (Farmers and Admins)
 @router.delete("/{product_id}", status_code=200)
 def delete_product(
-        product_id: int, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+        product_id: int,
+        db: Session = Depends(get_db),
+        principal: CurrentPrincipal = Depends(require_roles("Farmer", "Admin")),
 ):
     """
     Delete an existing product.
@@ -127,14 +214,13 @@ def delete_product(
     Returns:
     - A success message with the deleted product's ID.
     """
-    check_user_role(token, db, ["Farmer", "Admin"])
     deleted_product = products_repository.delete_product(db, product_id)
     return Response(content=f"Product with id {product_id} deleted", status_code=200)
 
 
 # Get all products of a farmer by farmer ID
 @router.get("/farmer/{farmer_id}", response_model=list[ProductInfo])
-def get_products_by_farmer(farmer_id: int, db: Session = Depends(get_db)):
+def get_products_by_farmer(farmer_id: int, request: Request, db: Session = Depends(get_db)):
     """
     Get all products belonging to a specific farmer.
 
@@ -144,39 +230,10 @@ def get_products_by_farmer(farmer_id: int, db: Session = Depends(get_db)):
     Returns:
     - A list of products belonging to the farmer.
     """
-    products = products_repository.get_products_by_farmer_id(db, farmer_id)
-    if not products:
-        raise HTTPException(status_code=404, detail="No products found for this farmer")
-    return products
-
-
-@router.get("/search", response_model=List[ProductInfo])
-def search_products(
-    db: Session = Depends(get_db),
-    name: Optional[str] = Query(None, description="Filter products by name (partial match)"),
-    category: Optional[str] = Query(None, description="Filter products by category"),
-    farm_location: Optional[str] = Query(None, description="Filter products by farm location (partial match)"),
-    price_from: float = Query(0.0, description="Minimum price"),
-    price_until: float = Query(-1.0, description="Maximum price (-1 for no limit)"),
-    sort_by: Optional[str] = Query(
-        None, description="Sorting options: 'price_asc', 'price_desc', 'popularity', 'newest'"
-    ),
-):
-    """
-    Search for products based on name, category, farm location, price range, and sorting options.
-
-    - **name**: Filter products by name (partial match).
-    - **category**: Filter products by category.
-    - **farm_location**: Filter products by farm location (partial match).
-    - **price_from**: Minimum price.
-    - **price_until**: Maximum price (use -1 for no upper limit).
-    - **sort_by**: Sorting options: 'price_asc', 'price_desc', 'popularity', 'newest'.
-
-    Returns:
-    - A list of products matching the search criteria.
-    """
-    products = products_repository.search_products(
-        db, name, category, farm_location, price_from, price_until, sort_by
-    )
-    return products
+    def build(headers):
+        products = products_repository.get_products_by_farmer_id(db, farmer_id)
+        if not products:
+            raise HTTPException(status_code=404, detail="No products found for this farmer")
+        return products
 
+    return response_cache.respond(request, [farmer_products_tag(farmer_id)], PRODUCT_LIST, build)
@@ -7,7 +7,8 @@ from ..database.database import get_db
 from ..schemas.buyers import BuyerProfileCreate
 from ..schemas.farmers import FarmerProfileCreate
 from ..schemas.users import UserUpdate
-from ..utils.security import check_user_role, decode_jwt_token
+from ..utils.security import (CurrentPrincipal, decode_jwt_token,
+                              get_current_principal, require_roles)
 from .auth import users_repository
 
 router = APIRouter()
@@ -18,12 +19,10 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/users/login")
 @router.post("/farmer/")
 def create_farmer_profile(
     profile_data: FarmerProfileCreate,
-    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
+    principal: CurrentPrincipal = Depends(require_roles("Farmer", "Admin")),
 ):
-    check_user_role(token, db, ["Farmer", "Admin"])
-    user_id = decode_jwt_token(token)
-    profile = users_repository.create_profile(db, user_id, profile_data)
+    profile = users_repository.create_profile(db, principal.user_id, profile_data)
     return profile
     # return JSONResponse(
     #     status_code=200,
@@ -36,12 +35,10 @@ def create_farmer_profile(
 @router.post("/buyer/")
 def create_buyer_profile(
     profile_data: BuyerProfileCreate,
-    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
+    principal: CurrentPrincipal = Depends(require_roles("Buyer", "Admin")),
 ):
-    check_user_role(token, db, ["Buyer", "Admin"])
-    user_id = decode_jwt_token(token)
-    profile = users_repository.create_profile(db, user_id, profile_data)
+    profile = users_repository.create_profile(db, principal.user_id, profile_data)
     return profile
     return JSONResponse(
         status_code=200,
@@ -52,12 +49,9 @@ def create_buyer_profile(
 
 # Get current user's profile
 @router.get("/me")
-def get_profile(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    user_id = decode_jwt_token(token)
-    user = users_repository.get_user_by_id(db, user_id)
-
+def get_profile(principal: CurrentPrincipal = Depends(get_current_principal)):
     # Use the 'profile' property
-    profile = user.profile
+    profile = principal.user.profile
 
     # if user.role == "Admin":
     #     return {"message": "Admin users do not have a specific profile."}
@@ -1,13 +1,20 @@
 # api/webhooks.py
+import json
+
 import stripe
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, sessionmaker
 from starlette.responses import JSONResponse
 
 from ..config import STRIPE_SECRET_KEY, STRIPE_WEBHOOK_SECRET
-from ..database.database import get_db
+from ..database.database import get_db, get_session_factory
+from ..database.models import Order
 from ..repositories.cart import CartRepository
 from ..repositories.orders import OrdersRepository
+from ..repositories.payments import PaymentsRepository
+from ..repositories.reservations import ReservationsRepository
+from ..repositories.stripe_events import StripeEventsRepository
 from ..schemas.orders import OrderUpdate  # Импортируйте нужные схемы
 import logging
 
@@ -26,6 +33,9 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 orders_repository = OrdersRepository()
 cart_repository = CartRepository()
+reservations_repository = ReservationsRepository()
+payments_repository = PaymentsRepository()
+stripe_events_repository = StripeEventsRepository()
 
 # Установка ключа Stripe API
 if not STRIPE_SECRET_KEY:
@@ -36,7 +46,12 @@ else:
     logger.info("Stripe API key успешно установлен.")
 
 @router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    session_factory: sessionmaker = Depends(get_session_factory),
+):
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
 
@@ -54,56 +69,140 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
         logger.error("Неверная подпись", exc_info=True)
         raise HTTPException(status_code=400, detail="Неверная подпись")
 
-    # Обработка события
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        logger.info("Обработка события checkout.session.completed")
+    if event['type'] not in EVENT_HANDLERS:
+        return JSONResponse(status_code=200, content={"status": "ignored"})
+
+    # Повторная доставка того же события отбрасывается по ID без какой-либо обработки
+    is_new = await run_in_threadpool(
+        stripe_events_repository.record_received, db, event['id'], event['type'], payload.decode()
+    )
+    if not is_new:
+        logger.info(f"Событие {event['id']} уже получено, повтор пропущен.")
+        return JSONResponse(status_code=200, content={"status": "duplicate"})
+
+    # Обработка после ответа, чтобы Stripe получил 200 сразу
+    background_tasks.add_task(process_stripe_event, event['id'], session_factory)
+    return JSONResponse(status_code=200, content={"status": "success"})
+
+
+def process_stripe_event(event_id: str, session_factory: sessionmaker):
+    """
+    Apply one ledger event with its handler. Failures are recorded on the ledger row
+    and retried by the background sweep in main.py.
+    """
+    db = session_factory()
+    try:
+        stripe_event = stripe_events_repository.claim(db, event_id)
+        if not stripe_event:
+            return
+        event = stripe.Event.construct_from(json.loads(stripe_event.payload), stripe.api_key)
         try:
-            handle_checkout_session(session, db)
-            logger.info("Событие checkout.session.completed обработано успешно")
-        except HTTPException as e:
-            logger.error(f"HTTPException при обработке вебхука: {e.detail}")
-            raise e
+            EVENT_HANDLERS[event['type']](event['data']['object'], db)
         except Exception as e:
-            logger.exception("Неожиданная ошибка при обработке вебхука")
-            raise HTTPException(status_code=500, detail="Внутренняя ошибка при обработке вебхука")
+            db.rollback()
+            detail = e.detail if isinstance(e, HTTPException) else repr(e)
+            logger.error(f"Ошибка при обработке события {event_id} ({event['type']}): {detail}")
+            stripe_events_repository.mark_failed(db, event_id, str(detail))
+            return
+        stripe_events_repository.mark_processed(db, event_id)
+        logger.info(f"Событие {event_id} ({event['type']}) обработано успешно")
+    finally:
+        db.close()
 
-    return JSONResponse(status_code=200, content={"status": "success"})
+
+def _get_order_id(stripe_object) -> int:
+    order_id = (stripe_object.get('metadata') or {}).get('order_id')
+    if not order_id:
+        logger.error("order_id отсутствует в метаданных.")
+        raise HTTPException(status_code=400, detail="order_id отсутствует в метаданных.")
+    return int(order_id)
 
 
 def handle_checkout_session(session, db: Session):
-    try:
-        if not session.client_reference_id:
-            logger.error("client_reference_id отсутствует в сессии.")
-            raise HTTPException(status_code=400, detail="client_reference_id отсутствует.")
-
-        if not session.metadata.get('order_id'):
-            logger.error("order_id отсутствует в метаданных сессии.")
-            raise HTTPException(status_code=400, detail="order_id отсутствует в метаданных.")
-
-        user_id = int(session.client_reference_id)
-        order_id = int(session.metadata.get('order_id'))
-
-        logger.info(f"Обработка сессии оплаты для user_id: {user_id}, order_id: {order_id}")
-
-        # Получение заказа по order_id
-        order = orders_repository.get_order_by_id(db, order_id)
-        if not order:
-            logger.error(f"Заказ с ID {order_id} не найден.")
-            raise HTTPException(status_code=404, detail="Заказ не найден")
-
-        # Обновление статуса заказа на 'Success'
-        order_update = OrderUpdate(status='Paid')
-        orders_repository.update_order(db, order_id, order_update)
-        logger.info(f"Статус заказа ID {order_id} обновлён на 'Success'.")
-
-        # Очистка корзины
-        cart_repository.clear_cart(db, user_id)
-        logger.info(f"Корзина очищена для user_id: {user_id}.")
-
-    except HTTPException as e:
-        logger.error(f"HTTPException в handle_checkout_session: {e.detail}", exc_info=True)
-        raise e
-    except Exception as e:
-        logger.exception("Неожиданная ошибка в handle_checkout_session.")
-        raise HTTPException(status_code=500, detail="Внутренняя ошибка при обработке сессии оплаты.")
\ No newline at end of file
+    if not session.client_reference_id:
+        logger.error("client_reference_id отсутствует в сессии.")
+        raise HTTPException(status_code=400, detail="client_reference_id отсутствует.")
+
+    user_id = int(session.client_reference_id)
+    order_id = _get_order_id(session)
+
+    logger.info(f"Обработка сессии оплаты для user_id: {user_id}, order_id: {order_id}")
+
+    # Получение заказа по order_id
+    order = orders_repository.get_order_by_id(db, order_id)
+    if not order:
+        logger.error(f"Заказ с ID {order_id} не найден.")
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+
+    # Удержанный товар становится продажей (или резервируется заново, если удержание истекло)
+    if not reservations_repository.commit_order(db, order_id):
+        # Оплата пришла после истечения удержания, а товар уже продан: заказ остаётся
+        # отменённым, платёж фиксируется для ручного возврата, корзина не очищается
+        _record_completed_payment(db, order, session)
+        db.commit()
+        logger.error(f"Заказ ID {order_id} оплачен, но товара нет в наличии: требуется возврат платежа.")
+        return
+
+    # Обновление статуса заказа на 'Paid'
+    order_update = OrderUpdate(status='Paid')
+    order = orders_repository.update_order(db, order_id, order_update)
+    logger.info(f"Статус заказа ID {order_id} обновлён на 'Paid'.")
+
+    _record_completed_payment(db, order, session)
+
+    # Очистка корзины (в той же транзакции фиксируется платёж)
+    cart_repository.clear_cart(db, user_id)
+    logger.info(f"Корзина очищена для user_id: {user_id}.")
+
+
+def _record_completed_payment(db: Session, order: Order, session):
+    amount_total = session.get('amount_total')
+    payments_repository.record_payment(
+        db,
+        order,
+        status='Completed',
+        amount=amount_total / 100 if amount_total is not None else None,
+        checkout_session_id=session.id,
+        payment_intent_id=session.get('payment_intent'),
+    )
+
+
+def handle_checkout_session_expired(session, db: Session):
+    """Покупатель не оплатил сессию: товар возвращается в продажу, заказ отменяется."""
+    order_id = _get_order_id(session)
+    order = db.get(Order, order_id)
+    if not order:
+        logger.warning(f"Заказ с ID {order_id} для истекшей сессии не найден.")
+        return
+
+    reservations_repository.release_order(db, order_id)
+    payments_repository.record_payment(db, order, status='Failed', checkout_session_id=session.id)
+    db.commit()
+    logger.info(f"Сессия оплаты заказа ID {order_id} истекла, заказ отменён.")
+
+
+def handle_payment_failed(payment_intent, db: Session):
+    """
+    Попытка оплаты отклонена. Сессия остаётся открытой для новой попытки, поэтому
+    товар остаётся удержанным до оплаты или истечения сессии.
+    """
+    metadata_order_id = (payment_intent.get('metadata') or {}).get('order_id')
+    if metadata_order_id:
+        order = db.get(Order, int(metadata_order_id))
+    else:
+        payment = payments_repository.get_payment_by_payment_intent_id(db, payment_intent.id)
+        order = payment.order if payment else None
+    if not order:
+        logger.warning(f"Заказ для payment_intent {payment_intent.id} не найден.")
+        return
+
+    payments_repository.record_payment(db, order, status='Failed', payment_intent_id=payment_intent.id)
+    db.commit()
+    logger.info(f"Оплата заказа ID {order.id} отклонена.")
+
+
+EVENT_HANDLERS = {
+    'checkout.session.completed': handle_checkout_session,
+    'checkout.session.expired': handle_checkout_session_expired,
+    'payment_intent.payment_failed': handle_payment_failed,
+}
@@ -9,6 +9,12 @@ load_dotenv()
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STRIPE_CONNECT_TIMEOUT_SECONDS", 5))
+STRIPE_READ_TIMEOUT_SECONDS = float(os.getenv("STRIPE_READ_TIMEOUT_SECONDS", 20))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", 2))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", 5))
+STRIPE_EVENT_RETRY_SECONDS = int(os.getenv("STRIPE_EVENT_RETRY_SECONDS", 300))
 from pathlib import Path
 
 # Define the path to the .env file
@@ -35,4 +41,70 @@ MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
 
 # JWT Settings
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 14400))
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 14400))
+
+# Password hashing: bcrypt cost and the worker pool that runs it off the event loop
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+
+# Cache of authenticated users' role and approval status
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+# Public catalog responses: "memory://" (per process) or a redis:// URL shared by all workers.
+# Writes invalidate them, stock and popularity changes included; the TTL bounds staleness if an
+# invalidation is lost (for example, while Redis is unreachable).
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "memory://")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2000))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 30))
+# Admin exports are read from a server-side cursor and streamed this many rows at a time
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+# Database
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Seconds
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() in ("true", "1", "t")
+DB_ECHO = os.getenv("DB_ECHO", "False").lower() in ("true", "1", "t")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 30000))
+
+# Background jobs
+POPULARITY_REFRESH_SECONDS = int(os.getenv("POPULARITY_REFRESH_SECONDS", 3600))
+RESERVATION_SWEEP_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", 60))
+
+# Uploaded product images: worker processes that resize them and the largest accepted image
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", min(2, os.cpu_count() or 1)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 40_000_000))
+# Upload size limits, enforced while the files are copied, and where uploads are staged
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", 10 * 1024 * 1024))
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", 40 * 1024 * 1024))
+UPLOAD_STAGING_DIRECTORY = os.getenv("UPLOAD_STAGING_DIRECTORY", "upload_staging")
+# Where image variants are stored: a local directory served under /static, or "s3://bucket/prefix"
+IMAGE_STORAGE_URL = os.getenv("IMAGE_STORAGE_URL", "uploaded_images")
+IMAGE_STORAGE_ENDPOINT_URL = os.getenv("IMAGE_STORAGE_ENDPOINT_URL")  # S3-compatible services such as MinIO
+IMAGE_PUBLIC_URL = os.getenv("IMAGE_PUBLIC_URL")  # Base URL images are served from; defaults to the bucket
+# Unreferenced images are deleted once unused for this long, so in-flight uploads can still claim them
+IMAGE_GC_GRACE_SECONDS = int(os.getenv("IMAGE_GC_GRACE_SECONDS", 600))
+IMAGE_GC_SECONDS = int(os.getenv("IMAGE_GC_SECONDS", 300))
+
+# Pub/sub between workers for chat websockets: "memory://" (single worker) or a redis:// URL
+CHAT_BACKPLANE_URL = os.getenv("CHAT_BACKPLANE_URL", "memory://")
+# Chat messages are written to the database in batches, at most this many or this often
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 100))
+CHAT_WRITE_INTERVAL_MS = int(os.getenv("CHAT_WRITE_INTERVAL_MS", 50))
+# Unsaved messages allowed before senders wait for the database to catch up
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", 10000))
+# Server-generated IDs: unique per worker process (0-63). Set explicitly (a distinct value
+# for every process), or leave unset to lease a free one from the database at startup
+ID_WORKER_ID = int(os.environ["ID_WORKER_ID"]) if os.getenv("ID_WORKER_ID") else None
+ID_WORKER_LEASE_SECONDS = int(os.getenv("ID_WORKER_LEASE_SECONDS", 60))
+# How long generating an ID waits for a worker ID (a lease being renewed) before failing
+ID_WORKER_WAIT_SECONDS = float(os.getenv("ID_WORKER_WAIT_SECONDS", 10))
+# Outgoing chat messages buffered per websocket before a slow client is disconnected
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 100))
+CHAT_SEND_TIMEOUT_SECONDS = float(os.getenv("CHAT_SEND_TIMEOUT_SECONDS", 10))
+
+# Stock reservations for pending checkouts
+STOCK_RESERVATION_TTL_MINUTES = int(os.getenv("STOCK_RESERVATION_TTL_MINUTES", 35))
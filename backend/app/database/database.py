@@ -1,20 +1,128 @@
-from sqlalchemy import create_engine
+from functools import lru_cache
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
+                                    create_async_engine)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+from ..config import (DATABASE_URL, DB_ECHO, DB_MAX_OVERFLOW, DB_POOL_PRE_PING,
+                      DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+                      SQLITE_BUSY_TIMEOUT_MS)
 
 Base = declarative_base()
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+# Drivers used for the async engine, keyed by backend name
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+# INSERT constructs supporting ON CONFLICT upserts, keyed by backend name
+DIALECT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _engine_options(url, pool_class) -> dict:
+    """Build pool and driver options for the given database URL."""
+    options = {"echo": DB_ECHO}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if _is_memory_sqlite(url):
+            # Every connection to ":memory:" is a new database, so share a single one
+            options["poolclass"] = StaticPool
+            return options
+
+    options.update(
+        poolclass=pool_class,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Let readers and the single writer work concurrently (WAL) and make writers
+    wait for the lock instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    """Create a pooled engine for the configured database."""
+    url = make_url(url)
+    options = _engine_options(url, QueuePool)
+    options.update(overrides)
+    db_engine = create_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def create_async_db_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    """Create a pooled async engine, swapping in the async driver for the backend."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    options = _engine_options(url, AsyncAdaptedQueuePool)
+    options.update(overrides)
+    db_engine = create_async_engine(url, **options)
+    if backend == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    # Created on first use so the async driver is only required by code that needs it
+    return create_async_db_engine()
+
+
+@lru_cache(maxsize=None)
+def get_async_sessionmaker() -> async_sessionmaker:
+    return async_sessionmaker(
+        bind=get_async_engine(), autoflush=False, expire_on_commit=False
+    )
+
+
+def get_session_factory() -> sessionmaker:
+    """For work that outlives the request, such as background tasks, and opens its own sessions."""
+    return SessionLocal
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -1,9 +1,12 @@
 
-from sqlalchemy import (Boolean, Column, DateTime, Enum, Float, ForeignKey,
-                        Integer, String, Text)
+from datetime import datetime, timezone
+
+from sqlalchemy import (JSON, BigInteger, Boolean, Column, Date, DateTime,
+                        Enum, Float, ForeignKey, Index, Integer, String, Text)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
+from ..utils.ids import generate_id
 from .database import Base
 
 
@@ -49,7 +52,7 @@ class FarmerProfile(Base):
     farm_name = Column(String, nullable=False)
     location = Column(String, nullable=False)
     farm_size = Column(Float, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     is_approved = Column(
         Enum("approved", "rejected", "pending", name="approval_status"),
         default="pending",
@@ -65,7 +68,7 @@ class BuyerProfile(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     delivery_address = Column(String, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     user = relationship("User", back_populates="buyer_profile")
     orders = relationship("Order", back_populates="buyer")
@@ -91,27 +94,80 @@ class Product(Base):
     )
     price = Column(Float, nullable=False)
     quantity = Column(Integer, nullable=False)
-    farmer_id = Column(Integer, ForeignKey("farmer_profiles.id"))
+    farmer_id = Column(Integer, ForeignKey("farmer_profiles.id"), index=True)
+    # Set in Python so SQLite stores the same format the catalog cursors compare against
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Popularity counters maintained by PopularityRepository
+    order_count = Column(Integer, nullable=False, default=0, server_default="0")
+    sales_count = Column(Integer, nullable=False, default=0, server_default="0")
+    order_count_7d = Column(Integer, nullable=False, default=0, server_default="0")
+    order_count_30d = Column(Integer, nullable=False, default=0, server_default="0")
     farmer = relationship("FarmerProfile", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
     comments = relationship("Comment", back_populates="product")
     images = relationship("ProductImage", back_populates="product", cascade="all, delete-orphan")
     cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
 
+    # Category listings filtered/sorted by price, and the keyset indexes for the catalog sorts
+    __table_args__ = (
+        Index("ix_products_category_price", "category", "price"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_order_count_id", "order_count", "id"),
+        Index("ix_products_order_count_7d_id", "order_count_7d", "id"),
+        Index("ix_products_order_count_30d_id", "order_count_30d", "id"),
+    )
+
+
+class ProductSalesDaily(Base):
+    """Per-day order totals for a product, used to maintain the rolling popularity counters."""
+    __tablename__ = "product_sales_daily"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    sales_count = Column(Integer, nullable=False, default=0)
+
 class ProductImage(Base):
     __tablename__ = "product_images"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     image_url = Column(String, nullable=False)
+    # Resized WebP/JPEG URLs and sizes per variant ("thumbnail", "medium", "full")
+    variants = Column(JSON, nullable=True)
+    # The stored blob the variants belong to; None for images uploaded before blobs
+    blob_sha256 = Column(String(64), ForeignKey("image_blobs.sha256"), nullable=True, index=True)
 
     product = relationship("Product", back_populates="images")
 
+
+class ImageBlob(Base):
+    """
+    Resized variants of one uploaded image, stored under the SHA-256 of the original.
+
+    ``ref_count`` counts the product images using the blob. Blobs left unreferenced
+    since ``released_at`` are deleted from storage by the garbage collector.
+    """
+    __tablename__ = "image_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    # Storage keys and sizes per variant, in the same shape as ProductImage.variants
+    variants = Column(JSON, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    released_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    # The garbage collector looks up unreferenced blobs by release time
+    __table_args__ = (
+        Index("ix_image_blobs_ref_count_released_at", "ref_count", "released_at"),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    buyer_id = Column(Integer, ForeignKey("buyer_profiles.id"))
+    buyer_id = Column(Integer, ForeignKey("buyer_profiles.id"), index=True)
     total_price = Column(Float, nullable=False)
     status = Column(
         Enum("Pending", "Processing", "Paid", "Cancelled", name="order_status"),
@@ -122,14 +178,39 @@ class Order(Base):
     buyer = relationship("BuyerProfile", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
     payment = relationship("Payment", back_populates="order", uselist=False)
+    reservations = relationship("StockReservation", back_populates="order", cascade="all, delete-orphan")
+
+
+class StockReservation(Base):
+    """Stock held for a pending order until it is paid or its hold expires."""
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(
+        Enum("Held", "Committed", "Released", name="reservation_status"),
+        default="Held",
+        nullable=False,
+    )
+    checkout_session_id = Column(String, nullable=True, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    order = relationship("Order", back_populates="reservations")
+
+    # The sweeper looks up held reservations past their expiry
+    __table_args__ = (
+        Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
 
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     quantity = Column(Integer, nullable=False)
 
     product = relationship("Product", back_populates="order_items")
@@ -143,7 +224,7 @@ class Comment(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), default=func.now())
     author_id = Column(Integer, ForeignKey("users.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
 
     user = relationship("User", back_populates="comments")
     product = relationship("Product", back_populates="comments")
@@ -153,29 +234,67 @@ class Payment(Base):
     __tablename__ = "payments"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     amount = Column(Float, nullable=False)
     status = Column(
         Enum("Pending", "Completed", "Failed", name="payment_status"), nullable=False
     )
+    stripe_checkout_session_id = Column(String, nullable=True, index=True)
+    stripe_payment_intent_id = Column(String, nullable=True, index=True)
 
     order = relationship("Order", back_populates="payment")
 
 
+class StripeEvent(Base):
+    """Ledger of Stripe webhook events, so each event is applied once."""
+    __tablename__ = "stripe_events"
+
+    id = Column(String, primary_key=True)  # Stripe event ID (evt_...)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(
+        Enum("Received", "Processing", "Processed", "Failed", name="stripe_event_status"),
+        default="Received",
+        nullable=False,
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # The retry sweep looks up unprocessed events by age
+    __table_args__ = (
+        Index("ix_stripe_events_status_updated_at", "status", "updated_at"),
+    )
+
+
 class Chat(Base):
     __tablename__ = "chats"
 
     id = Column(Integer, primary_key=True, index=True)
     buyer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    farmer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    farmer_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Newest message each participant has read; later messages from the other side are unread
+    buyer_last_read_message_id = Column(BigInteger, nullable=True)
+    farmer_last_read_message_id = Column(BigInteger, nullable=True)
+    # Denormalized from messages when they are saved, so inboxes need no aggregation
+    last_message_id = Column(BigInteger, nullable=True)
+    last_activity_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
 
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_chats_buyer_id_farmer_id", "buyer_id", "farmer_id"),
+        Index("ix_chats_buyer_id_last_activity_at", "buyer_id", "last_activity_at", "id"),
+        Index("ix_chats_farmer_id_last_activity_at", "farmer_id", "last_activity_at", "id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Generated by the server so a message can be broadcast before it is saved
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=False, default=generate_id)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=False)
@@ -184,6 +303,24 @@ class Message(Base):
     chat = relationship("Chat", back_populates="messages")
     sender = relationship("User", backref="messages_sent")
 
+    __table_args__ = (
+        # IDs are time-ordered, so this serves both history pages and unread counts
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
+
+
+class WorkerIdLease(Base):
+    """
+    A snowflake worker ID (see app.utils.ids) held by a running process until
+    ``expires_at``. Processes renew their lease while they run; an expired lease can
+    be taken over by another process.
+    """
+    __tablename__ = "worker_id_leases"
+
+    worker_id = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
 
 class CartItem(Base):
     __tablename__ = "cart_items"
@@ -196,6 +333,11 @@ class CartItem(Base):
     user = relationship("User", back_populates="cart_items")
     product = relationship("Product")
 
+    # One row per product in a user's cart; also serves lookups by user_id
+    __table_args__ = (
+        Index("uq_cart_items_user_id_product_id", "user_id", "product_id", unique=True),
+    )
+
 
 class VerificationCode(Base):
     __tablename__ = "verification_codes"
@@ -0,0 +1,170 @@
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.orm import Session
+
+SEARCH_TABLE = "product_search"
+
+# Searchable fields and the tsvector weight each one gets on PostgreSQL
+SEARCH_COLUMNS = {
+    "name": "A",
+    "description": "B",
+    "category": "C",
+    "location": "D",
+}
+
+# Relative importance of the same fields for SQLite's bm25() ranking
+BM25_WEIGHTS = {
+    "name": 10.0,
+    "description": 4.0,
+    "category": 2.0,
+    "location": 1.0,
+}
+
+SUPPORTED_DIALECTS = ("sqlite", "postgresql")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Text of one indexed document per product, shared by both backends
+_DOCUMENT_SELECT = """
+    SELECT p.id AS product_id,
+           p.name AS name,
+           COALESCE(p.description, '') AS description,
+           CAST(p.category AS TEXT) AS category,
+           COALESCE(f.location, '') AS location
+    FROM products p
+    LEFT JOIN farmer_profiles f ON f.id = p.farmer_id
+"""
+
+
+def _tokens(value: str) -> List[str]:
+    return _TOKEN_RE.findall(value.lower())
+
+
+class ProductSearchIndex:
+    """
+    Full-text index over product name, description, category and farm location.
+
+    SQLite uses an FTS5 virtual table keyed by product id; PostgreSQL uses a weighted
+    tsvector table with a GIN index. Both are maintained by ProductsRepository inside
+    the same transaction as the product change.
+    """
+
+    def supports(self, db: Session) -> bool:
+        return db.get_bind().dialect.name in SUPPORTED_DIALECTS
+
+    def create(self, connection) -> None:
+        """Create the index table for the connection's dialect."""
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                f"{', '.join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+            ))
+        elif dialect == "postgresql":
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+                "document TSVECTOR NOT NULL)"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document "
+                f"ON {SEARCH_TABLE} USING GIN (document)"
+            ))
+
+    def drop(self, connection) -> None:
+        if connection.dialect.name in SUPPORTED_DIALECTS:
+            connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+
+    def _upsert_sql(self, dialect: str, where: str = "") -> str:
+        if dialect == "sqlite":
+            return (
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+                f"SELECT product_id, {', '.join(SEARCH_COLUMNS)} FROM ({_DOCUMENT_SELECT} {where})"
+            )
+        document = " || ".join(
+            f"setweight(to_tsvector('simple', d.{column}), '{weight}')"
+            for column, weight in SEARCH_COLUMNS.items()
+        )
+        return (
+            f"INSERT INTO {SEARCH_TABLE} (product_id, document) "
+            f"SELECT d.product_id, {document} FROM ({_DOCUMENT_SELECT} {where}) AS d "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+        )
+
+    def index_product(self, db: Session, product_id: int) -> None:
+        """(Re)index one product. Call after the product row has been flushed."""
+        dialect = db.get_bind().dialect.name
+        if dialect not in SUPPORTED_DIALECTS:
+            return
+        if dialect == "sqlite":
+            self.remove_product(db, product_id)
+        db.execute(text(self._upsert_sql(dialect, "WHERE p.id = :product_id")), {"product_id": product_id})
+
+    def remove_product(self, db: Session, product_id: int) -> None:
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :product_id"), {"product_id": product_id})
+        elif dialect == "postgresql":
+            db.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE product_id = :product_id"), {"product_id": product_id})
+
+    def rebuild(self, connection) -> None:
+        """Re-index the whole catalog (used by migrations to backfill existing products)."""
+        dialect = connection.dialect.name
+        if dialect not in SUPPORTED_DIALECTS:
+            return
+        connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        connection.execute(text(self._upsert_sql(dialect)))
+
+    def _match_expression(self, dialect: str, terms: Iterable[Tuple[Sequence[str], str]]) -> Optional[str]:
+        """
+        Build the backend query for the given (columns, text) terms. Every word of every
+        term must match as a prefix; an empty column list searches all columns.
+        """
+        clauses = []
+        for columns, value in terms:
+            words = _tokens(value or "")
+            if not words:
+                continue
+            if dialect == "sqlite":
+                expression = " AND ".join(f'"{word}"*' for word in words)
+                if columns:
+                    expression = f"{{{' '.join(columns)}}} : ({expression})"
+                clauses.append(f"({expression})")
+            else:
+                weights = "".join(SEARCH_COLUMNS[column] for column in columns)
+                clauses.extend(f"{word}:*{weights}" for word in words)
+        if not clauses:
+            return None
+        return " AND ".join(clauses) if dialect == "sqlite" else " & ".join(clauses)
+
+    def match(self, db: Session, terms: Iterable[Tuple[Sequence[str], str]]):
+        """
+        Return a subquery of (product_id, rank) for products matching all terms, where a
+        lower rank is a better match, or None when the terms contain no searchable words.
+        """
+        dialect = db.get_bind().dialect.name
+        expression = self._match_expression(dialect, terms)
+        if expression is None:
+            return None
+
+        if dialect == "sqlite":
+            weights = ", ".join(str(BM25_WEIGHTS[column]) for column in SEARCH_COLUMNS)
+            statement = text(
+                f"SELECT rowid AS product_id, bm25({SEARCH_TABLE}, {weights}) AS rank "
+                f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query"
+            )
+        else:
+            statement = text(
+                "SELECT product_id, -ts_rank(document, to_tsquery('simple', :query)) AS rank "
+                f"FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('simple', :query)"
+            )
+        return (
+            statement.bindparams(query=expression)
+            .columns(product_id=Integer, rank=Float)
+            .subquery("search")
+        )
+
+
+product_search_index = ProductSearchIndex()
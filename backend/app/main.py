@@ -1,21 +1,38 @@
+import os
+import socket
 import threading
 import time
+import uuid
 
 import requests
 import socketio
 from app.api.admin import router as admin_router
 from app.api.auth import router as auth_router
 from app.api.cart import router as cart_router
-from app.api.chat import router as chat_router
+from app.api.chat import manager as chat_manager, message_writer, router as chat_router
 from app.api.checkout import router as checkout_router
 from app.api.comments import router as comments_router
 from app.api.orders import router as orders_router
 from app.api.products import router as products_router
 from app.api.profiles import router as profiles_router
-from app.api.webhook import router as webhooks_router
+from app.api.webhook import process_stripe_event, router as webhooks_router
+from app.config import (ID_WORKER_ID, ID_WORKER_LEASE_SECONDS,
+                        IMAGE_GC_SECONDS, POPULARITY_REFRESH_SECONDS,
+                        RESERVATION_SWEEP_SECONDS, STRIPE_EVENT_RETRY_SECONDS)
+from app.database.database import SessionLocal
+from app.repositories.images import ImageBlobsRepository
+from app.repositories.popularity import PopularityRepository
+from app.repositories.reservations import ReservationsRepository
+from app.repositories.stripe_events import StripeEventsRepository
+from app.repositories.worker_ids import WorkerIdLeasesRepository
+from app.utils.file_upload import shutdown_image_pool
+from app.utils.ids import id_generator
+from app.utils.passwords import password_service
+from app.utils.static_files import ImageStaticFiles
+from app.utils.storage import LocalStorage, image_storage
+from app.utils.stripe_client import close_stripe_client
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 app = FastAPI()
 
@@ -29,6 +46,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],  # Lets browser clients read the catalog page cursor
 )
 
 # Include routers
@@ -42,7 +60,20 @@ app.include_router(admin_router)
 app.include_router(checkout_router, prefix="/checkout", tags=["Checkout"])
 app.include_router(webhooks_router, tags=["Webhooks"])
 app.include_router(cart_router, prefix="/cart", tags=["Carts"])
-app.mount("/static", StaticFiles(directory="uploaded_images"), name="static")
+# Images in object storage are served by the bucket or its CDN
+if isinstance(image_storage, LocalStorage):
+    os.makedirs(image_storage.directory, exist_ok=True)
+    app.mount("/static", ImageStaticFiles(directory=image_storage.directory), name="static")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_stripe_client()
+    await message_writer.close()
+    await chat_manager.close()
+    shutdown_image_pool()
+    password_service.shutdown()
+    release_worker_id()
 
 
 @app.get("/healthcheck")
@@ -66,4 +97,139 @@ def send_ping():
 # Run ping thread
 ping_thread = threading.Thread(target=send_ping)
 ping_thread.daemon = True
-ping_thread.start()
\ No newline at end of file
+ping_thread.start()
+
+
+# Rolling popularity counters: drop order days that left the 7/30-day windows
+def refresh_popularity():
+    popularity_repository = PopularityRepository()
+    while True:
+        db = SessionLocal()
+        try:
+            popularity_repository.refresh_rolling_counts(db)
+        except Exception as e:
+            print(f"Failed to refresh popularity counters: {e}")
+        finally:
+            db.close()
+        time.sleep(POPULARITY_REFRESH_SECONDS)
+
+
+popularity_thread = threading.Thread(target=refresh_popularity)
+popularity_thread.daemon = True
+popularity_thread.start()
+
+
+# Stock reservations: put stock from abandoned checkouts back on sale
+def release_expired_reservations():
+    reservations_repository = ReservationsRepository()
+    while True:
+        db = SessionLocal()
+        try:
+            reservations_repository.release_expired(db)
+        except Exception as e:
+            print(f"Failed to release expired stock reservations: {e}")
+        finally:
+            db.close()
+        time.sleep(RESERVATION_SWEEP_SECONDS)
+
+
+reservation_thread = threading.Thread(target=release_expired_reservations)
+reservation_thread.daemon = True
+reservation_thread.start()
+
+
+# Stripe webhook events that failed or were interrupted by a restart
+def retry_stripe_events():
+    stripe_events_repository = StripeEventsRepository()
+    while True:
+        db = SessionLocal()
+        try:
+            for event_id in stripe_events_repository.get_retryable_event_ids(db):
+                process_stripe_event(event_id, SessionLocal)
+        except Exception as e:
+            print(f"Failed to retry Stripe events: {e}")
+        finally:
+            db.close()
+        time.sleep(STRIPE_EVENT_RETRY_SECONDS)
+
+
+stripe_events_thread = threading.Thread(target=retry_stripe_events)
+stripe_events_thread.daemon = True
+stripe_events_thread.start()
+
+
+# Stored images no product uses any more
+def collect_image_garbage():
+    image_blobs_repository = ImageBlobsRepository()
+    while True:
+        db = SessionLocal()
+        try:
+            image_blobs_repository.collect_garbage(db, image_storage)
+        except Exception as e:
+            print(f"Failed to collect unused images: {e}")
+        finally:
+            db.close()
+        time.sleep(IMAGE_GC_SECONDS)
+
+
+image_gc_thread = threading.Thread(target=collect_image_garbage)
+image_gc_thread.daemon = True
+image_gc_thread.start()
+
+
+# Snowflake worker ID of this process, leased from the database unless ID_WORKER_ID is set
+worker_id_leases_repository = WorkerIdLeasesRepository()
+worker_id_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@app.on_event("startup")
+def acquire_worker_id():
+    """Lease a worker ID before serving requests; startup fails if none is free."""
+    if ID_WORKER_ID is not None:
+        return
+    db = SessionLocal()
+    try:
+        worker_id = worker_id_leases_repository.acquire(db, worker_id_owner, ID_WORKER_LEASE_SECONDS)
+        id_generator.assign(worker_id, valid_for=ID_WORKER_LEASE_SECONDS * 0.8)
+    finally:
+        db.close()
+    worker_id_thread.start()
+
+
+def hold_worker_id_lease():
+    while True:
+        time.sleep(ID_WORKER_LEASE_SECONDS / 4)
+        db = SessionLocal()
+        try:
+            worker_id = id_generator.worker_id
+            if worker_id is not None and not worker_id_leases_repository.renew(
+                    db, worker_id, worker_id_owner, ID_WORKER_LEASE_SECONDS
+            ):
+                # Expired and taken over by another process: its IDs are no longer ours
+                print(f"Lost the lease of worker ID {worker_id}")
+                id_generator.assign(None)
+                worker_id = None
+            if worker_id is None:
+                worker_id = worker_id_leases_repository.acquire(db, worker_id_owner, ID_WORKER_LEASE_SECONDS)
+            # Stop generating IDs a little before the lease could be taken over
+            id_generator.assign(worker_id, valid_for=ID_WORKER_LEASE_SECONDS * 0.8)
+        except Exception as e:
+            print(f"Failed to lease a worker ID: {e}")
+        finally:
+            db.close()
+
+
+def release_worker_id():
+    if ID_WORKER_ID is not None or id_generator.worker_id is None:
+        return
+    db = SessionLocal()
+    try:
+        worker_id_leases_repository.release(db, id_generator.worker_id, worker_id_owner)
+        id_generator.assign(None)
+    finally:
+        db.close()
+
+
+# Started once the first lease is taken, at startup
+worker_id_thread = threading.Thread(target=hold_worker_id_lease)
+worker_id_thread.daemon = True
@@ -1,16 +1,47 @@
-from sqlalchemy.orm import Session, joinedload
+from typing import List
 
-from ..database.models import User
+from sqlalchemy import select
+from sqlalchemy.engine import MappingResult
+from sqlalchemy.orm import Session
+
+from ..database.models import BuyerProfile, User
 
 
 class BuyersRepository:
-    def get_all_buyers(self, db: Session):
+    def get_all_buyers(self, db: Session) -> List[dict]:
+        """
+        Fetch all users with the role 'Buyer', including their profile, as
+        BuyerProfileWithUserInfo-shaped dicts built from column rows.
+        """
+        rows = db.execute(
+            select(
+                User.id, User.fullname, User.email, User.phone, User.role,
+                BuyerProfile.id.label("profile_id"), BuyerProfile.delivery_address, BuyerProfile.user_id,
+            )
+            .outerjoin(BuyerProfile, BuyerProfile.user_id == User.id)
+            .where(User.role == "Buyer")
+            .order_by(User.id)
+        )
+        return [
+            {
+                "id": id, "fullname": fullname, "email": email, "phone": phone, "role": role,
+                "profile": {
+                    "delivery_address": delivery_address,
+                    "user_id": user_id,
+                } if profile_id is not None else None,
+            }
+            for id, fullname, email, phone, role, profile_id, delivery_address, user_id in rows
+        ]
+
+    def export_buyers(self, db: Session, batch_size: int) -> MappingResult:
         """
-        Fetch all users with the role 'Buyer', including their profile.
+        Buyers with their profile as flat column rows, fetched ``batch_size`` at a
+        time from a server-side cursor.
         """
-        return (
-            db.query(User)
-            .filter(User.role == "Buyer")
-            .options(joinedload(User.buyer_profile))  # Eager load profile data
-            .all()
-        )
\ No newline at end of file
+        return db.execute(
+            select(User.id, User.fullname, User.email, User.phone, BuyerProfile.delivery_address)
+            .outerjoin(BuyerProfile, BuyerProfile.user_id == User.id)
+            .where(User.role == "Buyer")
+            .order_by(User.id)
+            .execution_options(yield_per=batch_size)
+        ).mappings()
@@ -1,18 +1,39 @@
+from typing import Dict
+
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
+from ..database.database import DIALECT_INSERTS
 from ..database.models import CartItem, Product
 
 
+def _merge_quantities(cart_items: list) -> Dict[int, int]:
+    """Sum the quantities of repeated products, keeping the first-seen order."""
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
 class CartRepository:
     def validate_cart_items(self, db: Session, cart_items: list):
-        """Validate cart items against available stock."""
-        for item in cart_items:
-            product = db.query(Product).filter(Product.id == item.product_id).first()
+        """Validate cart items against available stock, loading all products in one query."""
+        self._validate_quantities(db, _merge_quantities(cart_items))
+
+    def _validate_quantities(self, db: Session, quantities: Dict[int, int]):
+        if not quantities:
+            return
+        products = {
+            product.id: product
+            for product in db.query(Product).filter(Product.id.in_(quantities)).all()
+        }
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
             if not product:
-                raise ValueError(f"Product with ID {item.product_id} does not exist.")
-            if product.quantity < item.quantity:
+                raise ValueError(f"Product with ID {product_id} does not exist.")
+            if product.quantity < quantity:
                 raise ValueError(
-                    f"Insufficient stock for product {product.name}. Available: {product.quantity}, Requested: {item.quantity}")
+                    f"Insufficient stock for product {product.name}. Available: {product.quantity}, Requested: {quantity}")
 
     def get_cart(self, db: Session, user_id: int):
         return (
@@ -33,6 +54,66 @@ class CartRepository:
         db.refresh(item)
         return item
 
+    def set_cart_items(self, db: Session, user_id: int, cart_items: list, replace: bool = True):
+        """
+        Write many cart items with one upsert and one commit.
+
+        With ``replace`` the cart ends up holding exactly ``cart_items``; otherwise the
+        listed products are set to the given quantities and the rest of the cart is kept.
+        A quantity of 0 or less removes the product.
+        """
+        quantities = _merge_quantities(cart_items)
+        kept = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        self._validate_quantities(db, kept)
+
+        try:
+            if replace:
+                db.execute(
+                    delete(CartItem)
+                    .where(CartItem.user_id == user_id, CartItem.product_id.not_in(kept))
+                    .execution_options(synchronize_session=False)
+                )
+            elif removed:
+                db.execute(
+                    delete(CartItem)
+                    .where(CartItem.user_id == user_id, CartItem.product_id.in_(removed))
+                    .execution_options(synchronize_session=False)
+                )
+            if kept:
+                self._upsert_quantities(db, user_id, kept)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        db.expire_all()
+        return self.get_cart(db, user_id)
+
+    def _upsert_quantities(self, db: Session, user_id: int, quantities: Dict[int, int]):
+        dialect_insert = DIALECT_INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            statement = dialect_insert(CartItem).values([
+                {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+                for product_id, quantity in quantities.items()
+            ])
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[CartItem.user_id, CartItem.product_id],
+                set_={"quantity": statement.excluded.quantity},
+            ))
+            return
+
+        existing = {
+            item.product_id: item
+            for item in db.query(CartItem).filter(
+                CartItem.user_id == user_id, CartItem.product_id.in_(quantities)
+            )
+        }
+        for product_id, quantity in quantities.items():
+            if product_id in existing:
+                existing[product_id].quantity = quantity
+            else:
+                db.add(CartItem(user_id=user_id, product_id=product_id, quantity=quantity))
+
     def clear_cart(self, db: Session, user_id: int):
         db.query(CartItem).filter(CartItem.user_id == user_id).delete()
         db.commit()
@@ -1,6 +1,24 @@
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
-from ..database.models import Chat, Message
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from ..database.database import DIALECT_INSERTS
+from ..database.models import Chat, Message, User
+from ..schemas.chat import (ChatCounterpart, ChatSummaryResponse, InboxEntry,
+                            MessageResponse)
+from ..utils.pagination import decode_cursor, encode_cursor
+
+INBOX_CURSOR = "inbox"
+
+
+class MessageIdCollisionError(Exception):
+    """Messages whose ID is already stored for a different message."""
+
+    def __init__(self, messages: List[dict]):
+        super().__init__(f"Message IDs already used by other messages: {[message['id'] for message in messages]}")
+        self.messages = messages
 
 
 class ChatRepository:
@@ -21,29 +39,244 @@ class ChatRepository:
         return new_chat
 
     def create_message(self, db: Session, chat_id: int, sender_id: int, content: str) -> Message:
-        new_message = Message(chat_id=chat_id, sender_id=sender_id, content=content)
+        new_message = Message(
+            chat_id=chat_id, sender_id=sender_id, content=content, timestamp=datetime.now(timezone.utc)
+        )
         db.add(new_message)
+        db.flush()
+        self._record_activity(db, [
+            {"id": new_message.id, "chat_id": chat_id, "timestamp": new_message.timestamp}
+        ])
         db.commit()
         db.refresh(new_message)
         return new_message
 
-    def get_user_chats(self, db: Session, user_id: int, role: str):
-        if role == "Buyer":
-            return db.query(Chat).filter(Chat.buyer_id == user_id).all()
-        elif role == "Farmer":
-            return db.query(Chat).filter(Chat.farmer_id == user_id).all()
+    def save_messages(self, db: Session, messages: List[dict]):
+        """
+        Insert a batch of messages that already carry their server-generated IDs.
+
+        Messages whose ID is already stored are skipped, so replaying a batch whose
+        commit outcome was unknown cannot duplicate them. A stored message with the
+        same ID but another chat, sender or content is not a replay: two workers
+        generated the same ID, and MessageIdCollisionError is raised instead.
+        """
+        dialect_insert = DIALECT_INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            inserted = set(db.execute(
+                dialect_insert(Message).values(messages)
+                .on_conflict_do_nothing(index_elements=[Message.id])
+                .returning(Message.id)
+            ).scalars())
         else:
+            stored = set(db.execute(
+                select(Message.id).where(Message.id.in_([message["id"] for message in messages]))
+            ).scalars())
+            inserted = {message["id"] for message in messages if message["id"] not in stored}
+            db.add_all(Message(**message) for message in messages if message["id"] in inserted)
+            db.flush()
+        replayed = [message for message in messages if message["id"] not in inserted]
+        if replayed:
+            self._check_replayed(db, replayed)
+        self._record_activity(db, messages)
+        db.commit()
+
+    def _check_replayed(self, db: Session, messages: List[dict]):
+        """Raise MessageIdCollisionError unless ``messages`` are stored as they are."""
+        stored = {
+            row.id: (row.chat_id, row.sender_id, row.content)
+            for row in db.execute(
+                select(Message.id, Message.chat_id, Message.sender_id, Message.content)
+                .where(Message.id.in_([message["id"] for message in messages]))
+            )
+        }
+        collisions = [
+            message for message in messages
+            if stored.get(message["id"]) != (message["chat_id"], message["sender_id"], message["content"])
+        ]
+        if collisions:
+            db.rollback()
+            raise MessageIdCollisionError(collisions)
+
+    def _record_activity(self, db: Session, messages: List[dict]):
+        """
+        Point each chat's last_message_id/last_activity_at at its newest message in
+        ``messages``. Conditional on the ID being newer, so batches saved out of order
+        or replayed never move a chat back.
+        """
+        latest: Dict[int, dict] = {}
+        for message in messages:
+            current = latest.get(message["chat_id"])
+            if current is None or message["id"] > current["id"]:
+                latest[message["chat_id"]] = message
+
+        chats = Chat.__table__
+        db.execute(
+            update(chats)
+            .where(
+                chats.c.id == bindparam("target_chat_id"),
+                or_(chats.c.last_message_id.is_(None), chats.c.last_message_id < bindparam("message_id")),
+            )
+            .values(
+                last_message_id=bindparam("message_id"),
+                last_activity_at=bindparam("activity_at", type_=chats.c.last_activity_at.type),
+            ),
+            [
+                {"target_chat_id": chat_id, "message_id": message["id"], "activity_at": message["timestamp"]}
+                for chat_id, message in latest.items()
+            ],
+        )
+
+    def _participant_columns(self, role: str):
+        """The user's own ID column, read pointer and the counterpart's ID column for ``role``."""
+        if role == "Buyer":
+            return Chat.buyer_id, Chat.buyer_last_read_message_id, Chat.farmer_id
+        if role == "Farmer":
+            return Chat.farmer_id, Chat.farmer_last_read_message_id, Chat.buyer_id
+        return None
+
+    def _unread_count(self, user_id: int, last_read_id):
+        """Correlated count of the other side's messages after the read pointer."""
+        return (
+            select(func.count(Message.id))
+            .where(
+                Message.chat_id == Chat.id,
+                Message.id > func.coalesce(last_read_id, 0),
+                Message.sender_id != user_id,
+            )
+            .correlate(Chat)
+            .scalar_subquery()
+        )
+
+    def get_user_chats(self, db: Session, user_id: int, role: str) -> List[ChatSummaryResponse]:
+        """
+        The user's chats with their unread count and last message, all from one query.
+        The last message is joined through Chat.last_message_id and unread messages are
+        counted on the (chat_id, id) index.
+        """
+        columns = self._participant_columns(role)
+        if columns is None:
             return []
+        own_id, last_read_id, _ = columns
+
+        last_message = aliased(Message)
+        rows = (
+            db.query(Chat, self._unread_count(user_id, last_read_id), last_message)
+            .outerjoin(last_message, last_message.id == Chat.last_message_id)
+            .filter(own_id == user_id)
+            .order_by(Chat.id)
+            .all()
+        )
+        return [
+            ChatSummaryResponse(
+                id=chat.id,
+                buyer_id=chat.buyer_id,
+                farmer_id=chat.farmer_id,
+                unread_count=unread_count,
+                last_read_message_id=self._last_read_id(chat, user_id),
+                last_message=MessageResponse.model_validate(message) if message else None,
+            )
+            for chat, unread_count, message in rows
+        ]
+
+    def get_inbox(
+        self, db: Session, user_id: int, role: str, limit: int = 20, cursor: Optional[str] = None
+    ) -> Tuple[List[InboxEntry], Optional[str]]:
+        """
+        One page of the user's inbox, most recently active chats first, and the cursor
+        for the next page.
+
+        A single query returns each chat with the counterpart, the last message and the
+        unread count. Pages are keyset-paginated on (last_activity_at, id), which the
+        per-participant activity indexes serve directly.
+        """
+        columns = self._participant_columns(role)
+        if columns is None:
+            return [], None
+        own_id, last_read_id, counterpart_id = columns
+
+        counterpart = aliased(User)
+        last_message = aliased(Message)
+        query = (
+            db.query(Chat, counterpart, last_message, self._unread_count(user_id, last_read_id))
+            .join(counterpart, counterpart.id == counterpart_id)
+            .outerjoin(last_message, last_message.id == Chat.last_message_id)
+            .filter(own_id == user_id)
+        )
+        if cursor:
+            last_activity_at, last_id = decode_cursor(cursor, INBOX_CURSOR, [datetime, int])
+            query = query.filter(or_(
+                Chat.last_activity_at < last_activity_at,
+                and_(Chat.last_activity_at == last_activity_at, Chat.id < last_id),
+            ))
+
+        # Fetch one extra row to learn whether another page exists
+        rows = query.order_by(Chat.last_activity_at.desc(), Chat.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_chat = rows[-1][0]
+            next_cursor = encode_cursor(INBOX_CURSOR, [last_chat.last_activity_at, last_chat.id])
+
+        entries = [
+            InboxEntry(
+                chat_id=chat.id,
+                counterpart=ChatCounterpart.model_validate(other_user),
+                last_message=MessageResponse.model_validate(message) if message else None,
+                last_activity_at=chat.last_activity_at,
+                unread_count=unread_count,
+            )
+            for chat, other_user, message, unread_count in rows
+        ]
+        return entries, next_cursor
+
+    def _last_read_column(self, chat: Chat, user_id: int):
+        return Chat.buyer_last_read_message_id if user_id == chat.buyer_id else Chat.farmer_last_read_message_id
+
+    def _last_read_id(self, chat: Chat, user_id: int) -> Optional[int]:
+        return chat.buyer_last_read_message_id if user_id == chat.buyer_id else chat.farmer_last_read_message_id
+
+    def mark_read(self, db: Session, chat: Chat, user_id: int, message_id: Optional[int] = None) -> Optional[int]:
+        """
+        Move the participant's last-read pointer up to ``message_id``, or to the
+        latest message. The pointer never moves back nor past the latest message.
+        Returns the pointer after the update.
+        """
+        latest_id = db.query(func.max(Message.id)).filter(Message.chat_id == chat.id).scalar()
+        if latest_id is None:
+            return self._last_read_id(chat, user_id)
+        if message_id is None or message_id > latest_id:
+            message_id = latest_id
+
+        column = self._last_read_column(chat, user_id)
+        db.execute(
+            update(Chat)
+            .where(Chat.id == chat.id, or_(column.is_(None), column < message_id))
+            .values({column: message_id})
+        )
+        db.commit()
+        db.refresh(chat)
+        return self._last_read_id(chat, user_id)
 
     def get_chat_messages(self, db: Session, chat_id: int):
-        return db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.timestamp).all()
+        return db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.id).all()
+
+    def get_messages_page(
+        self, db: Session, chat_id: int, limit: int = 50, before: Optional[int] = None
+    ) -> Tuple[List[Message], Optional[int]]:
+        """
+        Up to ``limit`` messages older than message ``before`` (or the newest ones),
+        oldest first. Seeks on (chat_id, id), so deep history costs the same as the
+        first page. Returns the messages and the ``before`` value for the next page,
+        or None when there is no older history.
+        """
+        query = db.query(Message).filter(Message.chat_id == chat_id)
+        if before is not None:
+            query = query.filter(Message.id < before)
+        messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = list(reversed(messages[:limit]))
+        return messages, (messages[0].id if has_more else None)
 
     def get_recent_messages(self, db: Session, chat_id: int, limit: int = 50):
-        messages = (
-            db.query(Message)
-            .filter(Message.chat_id == chat_id)
-            .order_by(Message.timestamp.desc())
-            .limit(limit)
-            .all()
-        )
-        return list(reversed(messages))
\ No newline at end of file
+        messages, _ = self.get_messages_page(db, chat_id, limit)
+        return messages
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 
 from ..database.models import Comment, Product, User
 from ..schemas.comments import CommentCreate, CommentInfo
+from ..utils.response_cache import comments_tag, response_cache
 
 
 class CommentsRepository:
@@ -24,6 +25,7 @@ class CommentsRepository:
             )
             db.add(new_comment)
             db.commit()
+            response_cache.invalidate(comments_tag(product_id))
             db.refresh(new_comment)
 
         except Exception as e:
@@ -55,6 +57,7 @@ class CommentsRepository:
 
         try:
             db.commit()
+            response_cache.invalidate(comments_tag(comment.product_id))
             db.refresh(comment)
         except Exception as e:
             db.rollback()
@@ -66,9 +69,12 @@ class CommentsRepository:
         """Delete a specific comment."""
         comment = self.get_comment_by_id(db, comment_id)
 
+        product_id = comment.product_id
+
         try:
             db.delete(comment)
             db.commit()
+            response_cache.invalidate(comments_tag(product_id))
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=str(e))
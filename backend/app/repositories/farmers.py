@@ -1,8 +1,13 @@
+from typing import List
+
 from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.engine import MappingResult
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
 from ..database.models import FarmerProfile, User
+from ..utils.cache import principal_cache
 
 
 class FarmersRepository:
@@ -13,16 +18,51 @@ class FarmersRepository:
     #         raise HTTPException(status_code=404, detail="No farmers found")
     #     return farmers
 
-    def get_all_farmers(self, db: Session):
+    def get_all_farmers(self, db: Session) -> List[dict]:
         """
-        Fetch all users with the role 'Farmer', including their profile.
+        Fetch all users with the role 'Farmer', including their profile, as
+        FarmerProfileInfo-shaped dicts built from column rows.
         """
-        return (
-            db.query(User)
-            .filter(User.role == "Farmer")
-            .options(joinedload(User.farmer_profile))  # Eager load profile data
-            .all()
+        rows = db.execute(
+            select(
+                User.id, User.fullname, User.email, User.phone, User.role,
+                FarmerProfile.id.label("profile_id"), FarmerProfile.farm_name, FarmerProfile.location,
+                FarmerProfile.farm_size, FarmerProfile.is_approved, FarmerProfile.user_id,
+            )
+            .outerjoin(FarmerProfile, FarmerProfile.user_id == User.id)
+            .where(User.role == "Farmer")
+            .order_by(User.id)
         )
+        return [
+            {
+                "id": id, "fullname": fullname, "email": email, "phone": phone, "role": role,
+                "profile": {
+                    "farm_name": farm_name,
+                    "location": location,
+                    "farm_size": farm_size,
+                    "is_approved": is_approved,
+                    "user_id": user_id,
+                } if profile_id is not None else None,
+            }
+            for id, fullname, email, phone, role, profile_id, farm_name, location, farm_size, is_approved, user_id
+            in rows
+        ]
+
+    def export_farmers(self, db: Session, batch_size: int) -> MappingResult:
+        """
+        Farmers with their profile as flat column rows, fetched ``batch_size`` at a
+        time from a server-side cursor.
+        """
+        return db.execute(
+            select(
+                User.id, User.fullname, User.email, User.phone,
+                FarmerProfile.farm_name, FarmerProfile.location, FarmerProfile.farm_size, FarmerProfile.is_approved,
+            )
+            .outerjoin(FarmerProfile, FarmerProfile.user_id == User.id)
+            .where(User.role == "Farmer")
+            .order_by(User.id)
+            .execution_options(yield_per=batch_size)
+        ).mappings()
 
     def approve_farmer(self, db: Session, user_id: int):
         """Set is_approved to True for a farmer profile by user_id."""
@@ -41,6 +81,7 @@ class FarmersRepository:
             raise HTTPException(
                 status_code=500, detail="Error updating farmer approval status"
             )
+        principal_cache.invalidate(user_id)
         return farmer
 
     def update_farmer_approval(self, db: Session, user_id: int, approval_status: str):
@@ -68,5 +109,6 @@ class FarmersRepository:
             raise HTTPException(
                 status_code=500, detail="Error updating farmer approval status"
             )
+        principal_cache.invalidate(user_id)
 
         return farmer
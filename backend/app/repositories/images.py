@@ -0,0 +1,160 @@
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import bindparam, case, delete, select, update
+from sqlalchemy.orm import Session
+
+from ..config import IMAGE_GC_GRACE_SECONDS
+from ..database.database import DIALECT_INSERTS
+from ..database.models import ImageBlob
+from ..utils.storage import BlobStorage
+
+logger = logging.getLogger(__name__)
+
+
+def blob_keys(variants: dict) -> List[str]:
+    return [key for variant in variants.values() for key in (variant["webp"], variant["jpeg"])]
+
+
+class ImageBlobsRepository:
+    """
+    Stored images, shared by every product image with the same original content.
+
+    A blob row exists for every blob written to storage and counts the product images
+    referencing it. Reference counts change in the same transaction as the product
+    images themselves. A blob left unreferenced for IMAGE_GC_GRACE_SECONDS is deleted;
+    the grace period lets an upload that found the blob finish creating its product.
+    """
+
+    def claim_existing(self, db: Session, hashes: Iterable[str]) -> Dict[str, dict]:
+        """
+        The variants of the blobs already stored for ``hashes``. Unreferenced ones get
+        their grace period restarted, so they are not collected before the upload
+        creating a reference commits. A blob collected before its grace period could be
+        restarted is left out, to be uploaded again like a new one.
+        """
+        hashes = set(hashes)
+        if not hashes:
+            return {}
+        blobs = db.query(ImageBlob).filter(ImageBlob.sha256.in_(hashes)).all()
+        variants = {blob.sha256: blob.variants for blob in blobs}
+        released = [blob.sha256 for blob in blobs if blob.ref_count == 0]
+        if released:
+            db.execute(
+                update(ImageBlob)
+                .where(ImageBlob.sha256.in_(released), ImageBlob.ref_count == 0)
+                .values(released_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            # The garbage collector may have deleted some between the query and the update
+            kept = set(db.execute(select(ImageBlob.sha256).where(ImageBlob.sha256.in_(released))).scalars())
+            for sha256 in set(released) - kept:
+                del variants[sha256]
+        return variants
+
+    def _upsert(self, db: Session, blobs: List[Tuple[str, dict]], references: Counter):
+        now = datetime.now(timezone.utc)
+        variants = dict(blobs)
+        rows = [
+            {
+                "sha256": sha256,
+                "variants": variants[sha256],
+                "ref_count": references[sha256],
+                "released_at": None if references[sha256] else now,
+                "created_at": now,
+            }
+            for sha256 in variants
+        ]
+        dialect_insert = DIALECT_INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            statement = dialect_insert(ImageBlob).values(rows)
+            if references:
+                statement = statement.on_conflict_do_update(
+                    index_elements=[ImageBlob.sha256],
+                    set_={
+                        "ref_count": ImageBlob.ref_count + statement.excluded.ref_count,
+                        "released_at": None,
+                    },
+                )
+            else:
+                statement = statement.on_conflict_do_nothing(index_elements=[ImageBlob.sha256])
+            db.execute(statement)
+            return
+        for row in rows:
+            blob = db.get(ImageBlob, row["sha256"])
+            if blob is None:
+                db.add(ImageBlob(**row))
+            elif row["ref_count"]:
+                blob.ref_count += row["ref_count"]
+                blob.released_at = None
+        db.flush()
+
+    def add_references(self, db: Session, blobs: List[Tuple[str, dict]]):
+        """
+        Count one reference per entry of ``blobs`` (sha256, storage variants), creating
+        the blob rows still missing. Runs in the caller's transaction and does not commit.
+        """
+        if blobs:
+            self._upsert(db, blobs, Counter(sha256 for sha256, _ in blobs))
+
+    def register_unreferenced(self, db: Session, blobs: List[Tuple[str, dict]]):
+        """
+        Record blobs written to storage whose product was never created, so the garbage
+        collector deletes them unless another upload claims them first.
+        """
+        if blobs:
+            self._upsert(db, blobs, Counter())
+            db.commit()
+
+    def release(self, db: Session, hashes: Iterable[str]):
+        """Drop one reference per entry of ``hashes``. Runs in the caller's transaction and does not commit."""
+        references = Counter(hashes)
+        if not references:
+            return
+        blobs = ImageBlob.__table__
+        remaining = blobs.c.ref_count - bindparam("references")
+        released_at = bindparam("released_at", type_=blobs.c.released_at.type)
+        db.execute(
+            update(blobs)
+            .where(blobs.c.sha256 == bindparam("target_sha256"))
+            .values(ref_count=remaining, released_at=case((remaining <= 0, released_at), else_=None)),
+            [
+                {"target_sha256": sha256, "references": count, "released_at": datetime.now(timezone.utc)}
+                for sha256, count in references.items()
+            ],
+        )
+
+    def collect_garbage(
+        self, db: Session, storage: BlobStorage, grace_seconds: int = IMAGE_GC_GRACE_SECONDS, limit: int = 100
+    ) -> int:
+        """
+        Delete up to ``limit`` blobs unreferenced for longer than ``grace_seconds``,
+        from the database and then from storage. Returns how many were deleted.
+
+        Each row is deleted only if it is still unreferenced, so a blob claimed in the
+        meantime is kept. Should deleting the files fail, they are only leaked.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+        condition = (ImageBlob.ref_count == 0, ImageBlob.released_at < cutoff)
+        candidates = db.query(ImageBlob).filter(*condition).order_by(ImageBlob.released_at).limit(limit).all()
+        collected = 0
+        for blob in candidates:
+            keys = blob_keys(blob.variants)
+            deleted = db.execute(
+                delete(ImageBlob)
+                .where(ImageBlob.sha256 == blob.sha256, *condition)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if deleted.rowcount != 1:
+                continue
+            for key in keys:
+                try:
+                    storage.delete(key)
+                except Exception as e:
+                    logger.error("Failed to delete image %s from storage: %s", key, e)
+            collected += 1
+        return collected
@@ -1,12 +1,15 @@
 from typing import List
 
 from fastapi import HTTPException
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session,  joinedload
 
 from ..database.models import Order, OrderItem, Product, BuyerProfile, User, FarmerProfile
-from ..schemas.orders import OrderCreate, OrderUpdate, FarmerOrderInfo, OrderedProductDetail, BuyerInfo, \
-    FarmerPurchasedProducts, PurchasedProductInfo, ProductInfo
+from .popularity import PopularityRepository
+from .products import ProductsRepository
+from .reservations import ReservationsRepository
+from ..schemas.orders import OrderCreate, OrderUpdate
 import logging
 logging.basicConfig(
     level=logging.INFO,  # Записывать все логи уровня INFO и выше
@@ -19,41 +22,70 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
+popularity_repository = PopularityRepository()
+products_repository = ProductsRepository()
+reservations_repository = ReservationsRepository()
 
 class OrdersRepository:
     def create_order(self, db: Session, order_data: OrderCreate, buyer_id: int) -> Order:
-        """Create a new order and associated order items."""
+        """
+        Create a new order and its items, reserving stock in the same transaction.
+
+        Stock is taken with a conditional ``UPDATE ... WHERE quantity >= :n`` per product,
+        so concurrent checkouts can never both pass the check and oversell. Any failure
+        rolls back the whole order, including stock already taken for earlier items.
+        """
         logger.info(f"Starting order creation for buyer_id: {buyer_id}")
+
+        # Merge repeated products so each one is reserved once
+        requested_quantities = {}
+        for item_data in order_data.items:
+            if item_data.quantity <= 0:
+                raise HTTPException(status_code=400, detail=f"Invalid quantity for product with ID {item_data.product_id}.")
+            requested_quantities[item_data.product_id] = (
+                requested_quantities.get(item_data.product_id, 0) + item_data.quantity
+            )
+
         try:
-            # Create the order
+            # Load every product of the order in one query to fail fast without taking locks
+            products = {
+                product.id: product
+                for product in db.query(Product).filter(Product.id.in_(requested_quantities)).all()
+            }
+            for product_id, quantity in requested_quantities.items():
+                product = products.get(product_id)
+                if not product:
+                    logger.warning(f"Product with ID {product_id} not found.")
+                    raise HTTPException(status_code=400, detail=f"Product with ID {product_id} not found.")
+                if product.quantity < quantity:
+                    logger.warning(f"Insufficient stock for product {product.name}. Available: {product.quantity}, Requested: {quantity}")
+                    raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.name}.")
+
+            # Reserve stock in product ID order so concurrent orders lock rows in the same order
+            for product_id, quantity in sorted(requested_quantities.items()):
+                if not products_repository.take_stock(db, product_id, quantity):
+                    product = products[product_id]
+                    logger.warning(f"Stock for product {product.name} was taken by a concurrent order. Requested: {quantity}")
+                    raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.name}.")
+
             new_order = Order(
                 buyer_id=buyer_id,
                 total_price=order_data.total_price,
                 status=order_data.status,
             )
+            new_order.items = [
+                OrderItem(product_id=item_data.product_id, quantity=item_data.quantity)
+                for item_data in order_data.items
+            ]
             db.add(new_order)
+            db.flush()
+            if new_order.status == "Pending":
+                # Hold the stock until the order is paid or the hold expires
+                reservations_repository.hold(db, new_order.id, requested_quantities)
+            popularity_repository.record_order_items(db, requested_quantities)
             db.commit()
+            products_repository.invalidate_cached_stock(db, requested_quantities)
             db.refresh(new_order)
-            logger.info(f"New order created with ID: {new_order.id}")
-
-            # Create order items
-            for item_data in order_data.items:
-                product = db.query(Product).filter(Product.id == item_data.product_id).first()
-                if not product:
-                    logger.warning(f"Product with ID {item_data.product_id} not found.")
-                    raise HTTPException(status_code=400, detail=f"Product with ID {item_data.product_id} not found.")
-                if product.quantity < item_data.quantity:
-                    logger.warning(f"Insufficient stock for product {product.name}. Available: {product.quantity}, Requested: {item_data.quantity}")
-                    raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.name}.")
-
-                order_item = OrderItem(
-                    order_id=new_order.id,
-                    product_id=item_data.product_id,
-                    quantity=item_data.quantity
-                )
-                db.add(order_item)
-                product.quantity -= item_data.quantity  # Adjust product stock
-            db.commit()
             logger.info(f"Order created with ID: {new_order.id}")
         except HTTPException as e:
             db.rollback()
@@ -87,6 +119,48 @@ class OrdersRepository:
         logger.info(f"Order with ID {order_id} fetched successfully.")
         return order
 
+    def get_order_info(self, db: Session, order_id: int) -> dict:
+        """
+        Retrieve an order with its ordered products as an OrderInfo-shaped dict,
+        read in one query of column rows.
+        """
+        rows = db.execute(
+            select(
+                Order.id, Order.total_price, Order.status, Order.created_at, Order.buyer_id,
+                OrderItem.quantity, Product.id, Product.name, Product.description, Product.category, Product.price,
+            )
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(Product, Product.id == OrderItem.product_id)
+            .where(Order.id == order_id)
+            .order_by(OrderItem.id)
+        ).all()
+        if not rows:
+            logger.warning(f"Order with ID {order_id} not found.")
+            raise HTTPException(status_code=404, detail="Order not found")
+
+        id, total_price, status, created_at, buyer_id = rows[0][:5]
+        return {
+            "id": id,
+            "total_price": total_price,
+            "status": status,
+            "created_at": created_at,
+            "buyer_id": buyer_id,
+            "items": [
+                {
+                    "product": {
+                        "id": product_id,
+                        "name": name,
+                        "description": description,
+                        "category": category,
+                        "price": price,
+                    },
+                    "quantity": quantity,
+                }
+                for *_, quantity, product_id, name, description, category, price in rows
+                if product_id is not None
+            ],
+        }
+
     def get_orders_by_user_id(self, db: Session, user_id: int) -> List[Order]:
         """Retrieve all orders for a specific user."""
         return db.query(Order).filter(Order.buyer_id == user_id).all()
@@ -122,7 +196,9 @@ class OrdersRepository:
         order = db.query(Order).filter(Order.id == order_id).first()
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
-        
+
+        # Put stock still held for an unpaid order back on sale
+        reservations_repository.release_order(db, order_id)
         try:
             db.delete(order)
             db.commit()
@@ -130,44 +206,48 @@ class OrdersRepository:
             db.rollback()
             raise HTTPException(status_code=500, detail="Error deleting order")
 
-    def get_purchased_products_by_farmer_user_id(self, db: Session, farmer_user_id: int) -> FarmerPurchasedProducts:
+    def get_purchased_products_by_farmer_user_id(self, db: Session, farmer_user_id: int) -> dict:
+        """The farmer's ordered products as a FarmerPurchasedProducts-shaped dict built from column rows."""
         logger.info(f"Fetching purchased products for farmer_user_id: {farmer_user_id}")
         try:
-            farmer_profile = db.query(FarmerProfile).filter(FarmerProfile.user_id == farmer_user_id).first()
-            if not farmer_profile:
+            farmer_profile_id = db.execute(
+                select(FarmerProfile.id).where(FarmerProfile.user_id == farmer_user_id).limit(1)
+            ).scalar()
+            if farmer_profile_id is None:
                 logger.warning(f"FarmerProfile not found for user_id: {farmer_user_id}")
                 raise HTTPException(status_code=404, detail="Farmer profile not found.")
 
-            logger.info(f"Found FarmerProfile: id={farmer_profile.id}")
+            logger.info(f"Found FarmerProfile: id={farmer_profile_id}")
 
-            order_items = (
-                db.query(OrderItem)
-                .join(Product)
-                .join(Order)
-                .filter(Product.farmer_id == farmer_profile.id)
-                .all()
-            )
-
-            logger.info(f"Number of OrderItems fetched: {len(order_items)}")
-
-            purchases = []
-            for item in order_items:
-                purchase = PurchasedProductInfo(
-                    product=ProductInfo(
-                        id=item.product.id,
-                        name=item.product.name,
-                        description=item.product.description,
-                        category=item.product.category,
-                        price=item.product.price
-                    ),
-                    quantity=item.quantity,
-                    purchase_time=item.order.created_at
+            rows = db.execute(
+                select(
+                    Product.id, Product.name, Product.description, Product.category, Product.price,
+                    OrderItem.quantity, Order.created_at,
                 )
-                purchases.append(purchase)
+                .select_from(OrderItem)
+                .join(Product, Product.id == OrderItem.product_id)
+                .join(Order, Order.id == OrderItem.order_id)
+                .where(Product.farmer_id == farmer_profile_id)
+                .order_by(OrderItem.id)
+            )
+            purchases = [
+                {
+                    "product": {
+                        "id": product_id,
+                        "name": name,
+                        "description": description,
+                        "category": category,
+                        "price": price,
+                    },
+                    "quantity": quantity,
+                    "purchase_time": purchase_time,
+                }
+                for product_id, name, description, category, price, quantity, purchase_time in rows
+            ]
 
             logger.info(f"Retrieved {len(purchases)} purchased products for farmer_user_id: {farmer_user_id}")
 
-            return FarmerPurchasedProducts(purchases=purchases)
+            return {"purchases": purchases}
 
         except HTTPException as e:
             logger.error(f"Error fetching purchased products for farmer_user_id {farmer_user_id}: {e.detail}")
@@ -0,0 +1,42 @@
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from ..database.models import Order, Payment
+
+
+class PaymentsRepository:
+    def get_payment_by_order_id(self, db: Session, order_id: int) -> Optional[Payment]:
+        return db.query(Payment).filter(Payment.order_id == order_id).first()
+
+    def get_payment_by_payment_intent_id(self, db: Session, payment_intent_id: str) -> Optional[Payment]:
+        return db.query(Payment).filter(Payment.stripe_payment_intent_id == payment_intent_id).first()
+
+    def record_payment(
+        self,
+        db: Session,
+        order: Order,
+        status: str,
+        amount: Optional[float] = None,
+        checkout_session_id: Optional[str] = None,
+        payment_intent_id: Optional[str] = None,
+    ) -> Payment:
+        """
+        Create or update the payment of an order. A completed payment is never moved
+        back to another status, since Stripe does not deliver events in order.
+        Does not commit.
+        """
+        payment = self.get_payment_by_order_id(db, order.id)
+        if not payment:
+            payment = Payment(order_id=order.id, amount=order.total_price, status=status)
+            db.add(payment)
+        elif payment.status != "Completed":
+            payment.status = status
+
+        if amount is not None:
+            payment.amount = amount
+        if checkout_session_id:
+            payment.stripe_checkout_session_id = checkout_session_id
+        if payment_intent_id:
+            payment.stripe_payment_intent_id = payment_intent_id
+        return payment
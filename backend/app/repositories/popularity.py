@@ -0,0 +1,135 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..database.database import DIALECT_INSERTS
+from ..database.models import Order, OrderItem, Product, ProductSalesDaily
+from ..utils.response_cache import CATALOG_TAG, response_cache
+
+ROLLING_WINDOWS = {
+    "order_count_7d": 7,
+    "order_count_30d": 30,
+}
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class PopularityRepository:
+    """
+    Maintains the per-product popularity counters so sorting by popularity reads an
+    indexed column instead of counting order_items on every request.
+    """
+
+    def record_order_items(self, db: Session, quantities: Dict[int, int], day: Optional[date] = None, sign: int = 1):
+        """
+        Add (or with sign=-1, remove) one order's items to the counters.
+
+        ``quantities`` maps product ID to ordered quantity. Runs in the caller's
+        transaction and does not commit.
+        """
+        day = day or _today()
+        for product_id, quantity in sorted(quantities.items()):
+            db.execute(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(
+                    order_count=Product.order_count + sign,
+                    sales_count=Product.sales_count + sign * quantity,
+                    order_count_7d=Product.order_count_7d + sign,
+                    order_count_30d=Product.order_count_30d + sign,
+                )
+            )
+            self._add_to_daily_bucket(db, product_id, day, sign, sign * quantity)
+
+    def _add_to_daily_bucket(self, db: Session, product_id: int, day: date, orders: int, units: int):
+        dialect_insert = DIALECT_INSERTS.get(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            statement = dialect_insert(ProductSalesDaily).values(
+                product_id=product_id, day=day, order_count=orders, sales_count=units
+            )
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[ProductSalesDaily.product_id, ProductSalesDaily.day],
+                set_={
+                    "order_count": ProductSalesDaily.order_count + orders,
+                    "sales_count": ProductSalesDaily.sales_count + units,
+                },
+            ))
+            return
+
+        bucket = db.get(ProductSalesDaily, (product_id, day))
+        if bucket:
+            bucket.order_count += orders
+            bucket.sales_count += units
+        else:
+            db.add(ProductSalesDaily(product_id=product_id, day=day, order_count=orders, sales_count=units))
+        db.flush()
+
+    def refresh_rolling_counts(self, db: Session, today: Optional[date] = None):
+        """
+        Recompute the 7/30-day counters from the daily buckets so days that left the
+        window stop counting, and drop buckets older than the longest window.
+        """
+        today = today or _today()
+        values = {}
+        for column, days in ROLLING_WINDOWS.items():
+            values[column] = (
+                select(func.coalesce(func.sum(ProductSalesDaily.order_count), 0))
+                .where(
+                    ProductSalesDaily.product_id == Product.id,
+                    ProductSalesDaily.day > today - timedelta(days=days),
+                )
+                .scalar_subquery()
+            )
+        db.execute(update(Product).values(**values))
+
+        oldest_day = today - timedelta(days=max(ROLLING_WINDOWS.values()))
+        db.execute(delete(ProductSalesDaily).where(ProductSalesDaily.day <= oldest_day))
+        db.commit()
+        # The popularity sorts of the catalog may have changed order
+        response_cache.invalidate(CATALOG_TAG)
+
+    def backfill(self, db: Session, today: Optional[date] = None):
+        """Rebuild every counter from the order history, ignoring cancelled orders."""
+        today = today or _today()
+        counted_order_ids = select(Order.id).where(Order.status != "Cancelled")
+        window_start = datetime.combine(today - timedelta(days=max(ROLLING_WINDOWS.values()) - 1), time.min)
+
+        db.execute(delete(ProductSalesDaily))
+        order_day = func.date(Order.created_at)
+        db.execute(
+            insert(ProductSalesDaily).from_select(
+                ["product_id", "day", "order_count", "sales_count"],
+                select(
+                    OrderItem.product_id,
+                    order_day,
+                    # Orders, not order lines: repeated lines of a product count once, as live
+                    func.count(func.distinct(OrderItem.order_id)),
+                    func.sum(OrderItem.quantity),
+                )
+                .join(Order, Order.id == OrderItem.order_id)
+                .where(
+                    OrderItem.product_id.is_not(None),
+                    Order.created_at >= window_start,
+                    Order.status != "Cancelled",
+                )
+                .group_by(OrderItem.product_id, order_day),
+            )
+        )
+
+        db.execute(update(Product).values(
+            order_count=(
+                select(func.count(func.distinct(OrderItem.order_id)))
+                .where(OrderItem.product_id == Product.id, OrderItem.order_id.in_(counted_order_ids))
+                .scalar_subquery()
+            ),
+            sales_count=(
+                select(func.coalesce(func.sum(OrderItem.quantity), 0))
+                .where(OrderItem.product_id == Product.id, OrderItem.order_id.in_(counted_order_ids))
+                .scalar_subquery()
+            ),
+        ))
+        self.refresh_rolling_counts(db, today)
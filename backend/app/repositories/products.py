@@ -1,19 +1,46 @@
-from typing import List
+from typing import Iterable, List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy import func
+from sqlalchemy import and_, or_, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
-from ..database.models import FarmerProfile, OrderItem, Product, ProductImage
+from ..database.models import FarmerProfile, Product, ProductImage
+from ..database.search import product_search_index
 from ..schemas.products import ProductCreate, ProductUpdate
+from ..utils.pagination import decode_cursor, encode_cursor
+from ..utils.response_cache import (CATALOG_TAG, comments_tag,
+                                    farmer_products_tag, product_tag,
+                                    response_cache)
+from .images import ImageBlobsRepository
+
+# Catalog sort orders: (sort column, descending). Product.id breaks ties.
+CATALOG_SORTS = {
+    "id": (Product.id, False),
+    "price_asc": (Product.price, False),
+    "price_desc": (Product.price, True),
+    "newest": (Product.created_at, True),
+    "popularity": (Product.order_count, True),
+    "popularity_7d": (Product.order_count_7d, True),
+    "popularity_30d": (Product.order_count_30d, True),
+}
+
+image_blobs_repository = ImageBlobsRepository()
 
 
 class ProductsRepository:
-    def create_product(self, db: Session, product_input: ProductCreate, user_id: int, image_urls: List[str]):
-        farmer_profile = db.query(FarmerProfile).filter(FarmerProfile.user_id == user_id).first()
-        if not farmer_profile:
-            raise HTTPException(status_code=404, detail="Farmer profile not found.")
+    def create_product(self, db: Session, product_input: ProductCreate, user_id: int, image_urls: List[str],
+                       farmer_profile_id: Optional[int] = None, image_variants: Optional[List[dict]] = None,
+                       image_blobs: Optional[List[Tuple[str, dict]]] = None):
+        """
+        Create a product with its images. ``image_blobs`` holds, per image, the SHA-256
+        and storage variants of the blob it uses; a reference to each is counted.
+        """
+        if farmer_profile_id is None:
+            farmer_profile = db.query(FarmerProfile).filter(FarmerProfile.user_id == user_id).first()
+            if not farmer_profile:
+                raise HTTPException(status_code=404, detail="Farmer profile not found.")
+            farmer_profile_id = farmer_profile.id
 
         new_product = Product(
             name=product_input.name,
@@ -21,15 +48,25 @@ class ProductsRepository:
             price=product_input.price,
             quantity=product_input.quantity,
             description=product_input.description,
-            farmer_id=farmer_profile.id
+            farmer_id=farmer_profile_id
         )
 
         # Create ProductImage instances
-        product_images = [ProductImage(image_url=url) for url in image_urls]
+        image_variants = image_variants or [None] * len(image_urls)
+        blob_hashes = [sha256 for sha256, _ in image_blobs] if image_blobs else [None] * len(image_urls)
+        product_images = [
+            ProductImage(image_url=url, variants=variants, blob_sha256=sha256)
+            for url, variants, sha256 in zip(image_urls, image_variants, blob_hashes)
+        ]
         new_product.images = product_images
 
         db.add(new_product)
+        if image_blobs:
+            image_blobs_repository.add_references(db, image_blobs)
+        db.flush()
+        product_search_index.index_product(db, new_product.id)
         db.commit()
+        response_cache.invalidate(CATALOG_TAG, farmer_products_tag(farmer_profile_id))
         db.refresh(new_product)
         return new_product
 
@@ -46,9 +83,13 @@ class ProductsRepository:
 
         for field, value in product_data.model_dump(exclude_unset=True).items():
             setattr(product, field, value)
+        farmer_id = product.farmer_id
 
         try:
+            db.flush()
+            product_search_index.index_product(db, product.id)
             db.commit()
+            response_cache.invalidate(CATALOG_TAG, product_tag(product_id), farmer_products_tag(farmer_id))
             db.refresh(product)
         except IntegrityError:
             db.rollback()
@@ -59,13 +100,62 @@ class ProductsRepository:
         product = db.query(Product).filter(Product.id == product_id).first()
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
+        farmer_id = product.farmer_id
+        product_search_index.remove_product(db, product.id)
+        # Deleting the product cascades to its images; their blobs lose a reference each
+        image_blobs_repository.release(db, [image.blob_sha256 for image in product.images if image.blob_sha256])
         db.delete(product)
         db.commit()
+        response_cache.invalidate(
+            CATALOG_TAG, product_tag(product_id), farmer_products_tag(farmer_id), comments_tag(product_id)
+        )
         return product
     
+    def take_stock(self, db: Session, product_id: int, quantity: int) -> bool:
+        """
+        Atomically decrement stock if enough is available. Returns False instead of
+        going negative. Runs in the caller's transaction and does not commit.
+        """
+        result = db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.quantity >= quantity)
+            .values(quantity=Product.quantity - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def restore_stock(self, db: Session, product_id: int, quantity: int):
+        """Return previously taken stock. Runs in the caller's transaction and does not commit."""
+        db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(quantity=Product.quantity + quantity)
+            .execution_options(synchronize_session=False)
+        )
+
+    def invalidate_cached_stock(self, db: Session, product_ids: Iterable[int]):
+        """
+        Stop serving cached responses that show the stock of ``product_ids`` or rank
+        them by popularity. Call once the transaction that changed them has committed.
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        farmer_ids = {farmer_id for (farmer_id,) in db.query(Product.farmer_id).filter(Product.id.in_(product_ids))}
+        response_cache.invalidate(
+            CATALOG_TAG,
+            *(product_tag(product_id) for product_id in product_ids),
+            *(farmer_products_tag(farmer_id) for farmer_id in farmer_ids),
+        )
+
     def get_products_by_farmer_id(self, db: Session, farmer_id: int):
         """Retrieve all products associated with a specific farmer."""
-        products = db.query(Product).filter(Product.farmer_id == farmer_id).all()
+        products = (
+            db.query(Product)
+            .options(selectinload(Product.images))
+            .filter(Product.farmer_id == farmer_id)
+            .all()
+        )
         return products
 
     def search_products(
@@ -77,17 +167,35 @@ class ProductsRepository:
             price_from: float = 0.0,
             price_until: float = -1.0,
             sort_by: str = None,
+            q: str = None,
     ):
-        """Search for products based on various filters."""
-        query = db.query(Product)
+        """
+        Search for products based on various filters.
 
-        # Join with FarmerProfile if farm_location is specified
-        if farm_location:
-            query = query.join(Product.farmer)
-            query = query.filter(FarmerProfile.location.ilike(f"%{farm_location.lower()}%"))
+        Text filters go through the full-text index: every word must match the start of
+        a word in the field (``q`` searches name, description, category and farm location).
+        Without an explicit sort, results are ordered by relevance.
+        """
+        query = db.query(Product).options(selectinload(Product.images))
 
-        if name:
-            query = query.filter(Product.name.ilike(f"%{name.lower()}%"))
+        search = None
+        if product_search_index.supports(db):
+            search = product_search_index.match(db, [
+                ((), q),
+                (("name",), name),
+                (("location",), farm_location),
+            ])
+            if search is not None:
+                query = query.join(search, search.c.product_id == Product.id)
+        else:
+            # Substring matching for databases without a full-text backend
+            if farm_location:
+                query = query.join(Product.farmer)
+                query = query.filter(FarmerProfile.location.ilike(f"%{farm_location.lower()}%"))
+            if name:
+                query = query.filter(Product.name.ilike(f"%{name.lower()}%"))
+            if q:
+                query = query.filter(Product.name.ilike(f"%{q.lower()}%"))
 
         if category:
             query = query.filter(Product.category == category)
@@ -101,15 +209,14 @@ class ProductsRepository:
             query = query.order_by(Product.price.asc())
         elif sort_by == 'price_desc':
             query = query.order_by(Product.price.desc())
-        elif sort_by == 'popularity':
-            # Order by number of order_items (number of times the product has been ordered)
-            query = (
-                query.outerjoin(Product.order_items)
-                .group_by(Product.id)
-                .order_by(func.count(OrderItem.id).desc())
-            )
+        elif sort_by in ('popularity', 'popularity_7d', 'popularity_30d'):
+            # Order by the maintained count of orders containing the product
+            sort_column, _ = CATALOG_SORTS[sort_by]
+            query = query.order_by(sort_column.desc(), Product.id.desc())
         elif sort_by == 'newest':
             query = query.order_by(Product.created_at.desc())
+        elif search is not None:
+            query = query.order_by(search.c.rank, Product.id)
 
         return query.all()
 
@@ -117,5 +224,75 @@ class ProductsRepository:
         """Retrieve all products."""
         return db.query(Product).all()
 
+    def get_products_page(
+            self,
+            db: Session,
+            limit: int = 50,
+            cursor: Optional[str] = None,
+            sort_by: str = "id",
+            category: Optional[str] = None,
+            price_from: float = 0.0,
+            price_until: float = -1.0,
+    ) -> Tuple[List[Product], Optional[str]]:
+        """
+        Return one page of the catalog and the cursor for the next page.
+
+        Pages are keyset-paginated on (sort column, id), so fetching a page costs the
+        same regardless of how deep into the catalog the client has scrolled.
+        """
+        if sort_by not in CATALOG_SORTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid sort_by: {sort_by}. Allowed values are: {', '.join(CATALOG_SORTS)}"
+            )
+        sort_column, descending = CATALOG_SORTS[sort_by]
+
+        query = db.query(Product).options(selectinload(Product.images))
+        if category:
+            query = query.filter(Product.category == category)
+        if price_until != -1.0:
+            query = query.filter(Product.price <= price_until)
+        if price_from:
+            query = query.filter(Product.price >= price_from)
+
+        if cursor:
+            key_columns = [Product.id] if sort_column is Product.id else [sort_column, Product.id]
+            values = decode_cursor(cursor, sort_by, [column.type.python_type for column in key_columns])
+            if sort_column is Product.id:
+                last_id = values[0]
+                query = query.filter(Product.id < last_id if descending else Product.id > last_id)
+            else:
+                last_value, last_id = values
+                if descending:
+                    query = query.filter(or_(
+                        sort_column < last_value,
+                        and_(sort_column == last_value, Product.id < last_id),
+                    ))
+                else:
+                    query = query.filter(or_(
+                        sort_column > last_value,
+                        and_(sort_column == last_value, Product.id > last_id),
+                    ))
+
+        if sort_column is Product.id:
+            order_by = [Product.id.desc() if descending else Product.id.asc()]
+        elif descending:
+            order_by = [sort_column.desc(), Product.id.desc()]
+        else:
+            order_by = [sort_column.asc(), Product.id.asc()]
+
+        # Fetch one extra row to learn whether another page exists
+        products = query.order_by(*order_by).limit(limit + 1).all()
+        if len(products) <= limit:
+            return products, None
+
+        products = products[:limit]
+        last = products[-1]
+        if sort_column is Product.id:
+            next_cursor = encode_cursor(sort_by, [last.id])
+        else:
+            next_cursor = encode_cursor(sort_by, [getattr(last, sort_column.key), last.id])
+        return products, next_cursor
+
 
 UPLOAD_DIRECTORY = "uploaded_images"
\ No newline at end of file
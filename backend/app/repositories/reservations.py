@@ -0,0 +1,167 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..config import STOCK_RESERVATION_TTL_MINUTES
+from ..database.models import Order, StockReservation
+from .popularity import PopularityRepository
+from .products import ProductsRepository
+
+logger = logging.getLogger(__name__)
+
+popularity_repository = PopularityRepository()
+products_repository = ProductsRepository()
+
+
+class ReservationsRepository:
+    """
+    Stock held for pending checkouts.
+
+    OrdersRepository.create_order takes the stock and records a hold per product. A
+    hold ends either committed, when the payment succeeds, or released, when it expires
+    or the checkout fails: the stock goes back on sale and the order is cancelled.
+    Status changes are conditional on the hold still being "Held", so the sweeper and
+    the payment webhook can race safely.
+    """
+
+    def hold(self, db: Session, order_id: int, quantities: Dict[int, int], ttl_minutes: int = STOCK_RESERVATION_TTL_MINUTES):
+        """Record holds for stock already taken for an order. Does not commit."""
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes)
+        for product_id, quantity in quantities.items():
+            db.add(StockReservation(
+                order_id=order_id,
+                product_id=product_id,
+                quantity=quantity,
+                status="Held",
+                expires_at=expires_at,
+            ))
+
+    def get_hold_expiry(self, db: Session, order_id: int) -> Optional[datetime]:
+        reservation = (
+            db.query(StockReservation)
+            .filter(StockReservation.order_id == order_id, StockReservation.status == "Held")
+            .first()
+        )
+        if not reservation:
+            return None
+        expires_at = reservation.expires_at
+        # SQLite hands back naive datetimes; holds are always stored in UTC
+        return expires_at if expires_at.tzinfo else expires_at.replace(tzinfo=timezone.utc)
+
+    def attach_checkout_session(self, db: Session, order_id: int, checkout_session_id: str):
+        db.execute(
+            update(StockReservation)
+            .where(StockReservation.order_id == order_id)
+            .values(checkout_session_id=checkout_session_id)
+        )
+        db.commit()
+
+    def commit_order(self, db: Session, order_id: int) -> bool:
+        """
+        Turn an order's holds into a sale once it is paid.
+
+        If the holds were already released (the payment arrived after expiry), the stock
+        is taken again when still available and the items are counted again for
+        popularity. Returns False when it is not: then nothing is taken, the order
+        stays cancelled and needs a manual refund.
+        """
+        reservations = (
+            db.query(StockReservation)
+            .filter(StockReservation.order_id == order_id)
+            .order_by(StockReservation.product_id)
+            .all()
+        )
+        retaken_quantities = {}
+        for reservation in reservations:
+            committed = db.execute(
+                update(StockReservation)
+                .where(StockReservation.id == reservation.id, StockReservation.status == "Held")
+                .values(status="Committed")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if committed:
+                continue
+
+            db.refresh(reservation)
+            if reservation.status != "Released":
+                continue
+            if products_repository.take_stock(db, reservation.product_id, reservation.quantity):
+                reservation.status = "Committed"
+                retaken_quantities[reservation.product_id] = reservation.quantity
+            else:
+                logger.error(
+                    f"Order {order_id} was paid after its stock hold expired and product "
+                    f"{reservation.product_id} is sold out; the order needs a manual refund."
+                )
+                # Give back what was taken again for the other items
+                db.rollback()
+                return False
+        if retaken_quantities:
+            # release_order took these items off the popularity counters; the sale stands after all
+            order = db.get(Order, order_id)
+            order_day = order.created_at.date() if order.created_at else None
+            popularity_repository.record_order_items(db, retaken_quantities, day=order_day, sign=1)
+        db.commit()
+        products_repository.invalidate_cached_stock(db, retaken_quantities)
+        return True
+
+    def release_order(self, db: Session, order_id: int) -> bool:
+        """
+        Put an order's held stock back on sale and cancel the order if it is still
+        pending. Returns False when nothing was held (already committed or released).
+        """
+        reservations = (
+            db.query(StockReservation)
+            .filter(StockReservation.order_id == order_id, StockReservation.status == "Held")
+            .order_by(StockReservation.product_id)
+            .all()
+        )
+        released_quantities = {}
+        for reservation in reservations:
+            released = db.execute(
+                update(StockReservation)
+                .where(StockReservation.id == reservation.id, StockReservation.status == "Held")
+                .values(status="Released")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if released:
+                products_repository.restore_stock(db, reservation.product_id, reservation.quantity)
+                released_quantities[reservation.product_id] = reservation.quantity
+
+        if not released_quantities:
+            db.rollback()
+            return False
+
+        order = db.get(Order, order_id)
+        if order.status == "Pending":
+            order.status = "Cancelled"
+        order_day = order.created_at.date() if order.created_at else None
+        popularity_repository.record_order_items(db, released_quantities, day=order_day, sign=-1)
+        db.commit()
+        products_repository.invalidate_cached_stock(db, released_quantities)
+        logger.info(f"Released stock held for order {order_id}: {released_quantities}")
+        return True
+
+    def release_expired(self, db: Session, now: Optional[datetime] = None, limit: int = 100) -> int:
+        """Release holds past their expiry. Returns the number of orders released."""
+        now = now or datetime.now(timezone.utc)
+        order_ids = [
+            order_id
+            for (order_id,) in db.query(StockReservation.order_id)
+            .filter(StockReservation.status == "Held", StockReservation.expires_at <= now)
+            .distinct()
+            .limit(limit)
+            .all()
+        ]
+        released = 0
+        for order_id in order_ids:
+            try:
+                if self.release_order(db, order_id):
+                    released += 1
+            except Exception:
+                db.rollback()
+                logger.exception(f"Failed to release expired stock hold for order {order_id}")
+        return released
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import STRIPE_EVENT_MAX_ATTEMPTS, STRIPE_EVENT_RETRY_SECONDS
+from ..database.models import StripeEvent
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class StripeEventsRepository:
+    """
+    Ledger of received Stripe webhook events.
+
+    Stripe delivers events at least once, so the ledger row keyed by event ID decides
+    who applies an event: a delivery is queued only when it inserts the row, and
+    processing starts only after claiming the row with a conditional update.
+    """
+
+    def record_received(self, db: Session, event_id: str, event_type: str, payload: str) -> bool:
+        """Store a delivered event. Returns False for a duplicate delivery."""
+        db.add(StripeEvent(id=event_id, type=event_type, payload=payload, status="Received"))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+    def claim(self, db: Session, event_id: str, stale_after_seconds: int = STRIPE_EVENT_RETRY_SECONDS) -> Optional[StripeEvent]:
+        """
+        Mark an event as being processed and return it, or None when it is processed
+        already or another worker is processing it. An event stuck in "Processing"
+        longer than ``stale_after_seconds`` (its worker died) can be claimed again.
+        """
+        now = _now()
+        claimed = db.execute(
+            update(StripeEvent)
+            .where(
+                StripeEvent.id == event_id,
+                or_(
+                    StripeEvent.status.in_(("Received", "Failed")),
+                    (StripeEvent.status == "Processing")
+                    & (StripeEvent.updated_at <= now - timedelta(seconds=stale_after_seconds)),
+                ),
+            )
+            .values(status="Processing", attempts=StripeEvent.attempts + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return None
+        return db.get(StripeEvent, event_id)
+
+    def mark_processed(self, db: Session, event_id: str):
+        self._finish(db, event_id, "Processed", None)
+
+    def mark_failed(self, db: Session, event_id: str, error: str):
+        self._finish(db, event_id, "Failed", error)
+
+    def _finish(self, db: Session, event_id: str, status: str, error: Optional[str]):
+        db.execute(
+            update(StripeEvent)
+            .where(StripeEvent.id == event_id)
+            .values(status=status, last_error=error, updated_at=_now())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    def get_retryable_event_ids(
+        self,
+        db: Session,
+        max_attempts: int = STRIPE_EVENT_MAX_ATTEMPTS,
+        retry_after_seconds: int = STRIPE_EVENT_RETRY_SECONDS,
+        limit: int = 100,
+    ) -> List[str]:
+        """Unprocessed events left behind by a failure or a restart, oldest first."""
+        cutoff = _now() - timedelta(seconds=retry_after_seconds)
+        rows = (
+            db.query(StripeEvent.id)
+            .filter(
+                StripeEvent.status != "Processed",
+                StripeEvent.updated_at <= cutoff,
+                StripeEvent.attempts < max_attempts,
+            )
+            .order_by(StripeEvent.received_at)
+            .limit(limit)
+            .all()
+        )
+        return [event_id for (event_id,) in rows]
@@ -2,6 +2,8 @@ from datetime import datetime, timedelta
 from typing import List
 
 from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.engine import MappingResult
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -9,6 +11,7 @@ from ..database.models import (BuyerProfile, FarmerProfile, User,
                                VerificationCode)
 from ..schemas.users import UserCreate, UserUpdate
 from ..schemas.verification_code import VerificationCodeCreate
+from ..utils.cache import principal_cache
 from ..utils.code_generator import generate_verification_code
 
 
@@ -74,6 +77,8 @@ class UsersRepository:
 
             db.commit()
             db.refresh(profile)
+            # The cached principal does not know about the new profile yet
+            principal_cache.invalidate(user_id)
 
         except IntegrityError:
             db.rollback()
@@ -119,6 +124,7 @@ class UsersRepository:
         except IntegrityError:
             db.rollback()
             raise HTTPException(status_code=400, detail="Integrity error")
+        principal_cache.invalidate(user_id)
         return {
             "id": db_user.id,
             "fullname": db_user.fullname,
@@ -137,6 +143,14 @@ class UsersRepository:
         """Get all users from the database."""
         return db.query(User).all()
 
+    def export_users(self, db: Session, batch_size: int) -> MappingResult:
+        """All users as flat column rows, fetched ``batch_size`` at a time from a server-side cursor."""
+        return db.execute(
+            select(User.id, User.fullname, User.email, User.phone, User.role, User.is_active)
+            .order_by(User.id)
+            .execution_options(yield_per=batch_size)
+        ).mappings()
+
     def delete_user(self, db: Session, user_id: int):
         """Delete a user by their ID."""
         user = db.query(User).filter(User.id == user_id).first()
@@ -144,6 +158,7 @@ class UsersRepository:
             raise HTTPException(status_code=404, detail="User not found")
         db.delete(user)
         db.commit()
+        principal_cache.invalidate(user_id)
 
     def get_profile_by_id(self, db: Session, farmer_id: int) -> User:
         user = db.query(FarmerProfile).filter(FarmerProfile.id == farmer_id).first()
@@ -0,0 +1,68 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database.models import WorkerIdLease
+from ..utils.ids import MAX_WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerIdLeasesRepository:
+    """
+    Snowflake worker IDs leased to running processes, so that no two processes
+    generate IDs with the same worker ID whatever their host or PID.
+
+    A lease is taken with a conditional write, which only one process can win, and
+    must be renewed before it expires; an expired lease is free for the taking.
+    """
+
+    def acquire(self, db: Session, owner: str, lease_seconds: int) -> int:
+        """Lease the lowest free worker ID to ``owner``. Raises RuntimeError if all are taken."""
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=lease_seconds)
+        leases = dict(db.execute(select(WorkerIdLease.worker_id, WorkerIdLease.expires_at)).all())
+        for worker_id in range(MAX_WORKER_ID + 1):
+            if worker_id not in leases:
+                db.add(WorkerIdLease(worker_id=worker_id, owner=owner, expires_at=expires_at))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another process inserted it first
+                    db.rollback()
+                    continue
+            else:
+                taken = db.execute(
+                    update(WorkerIdLease)
+                    .where(WorkerIdLease.worker_id == worker_id, WorkerIdLease.expires_at < now)
+                    .values(owner=owner, expires_at=expires_at)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+                if not taken:
+                    continue
+            logger.info(f"Leased worker ID {worker_id} to {owner}")
+            return worker_id
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} worker IDs are leased to running processes")
+
+    def renew(self, db: Session, worker_id: int, owner: str, lease_seconds: int) -> bool:
+        """Extend ``owner``'s lease. False if it was lost (expired and taken over)."""
+        renewed = db.execute(
+            update(WorkerIdLease)
+            .where(WorkerIdLease.worker_id == worker_id, WorkerIdLease.owner == owner)
+            .values(expires_at=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return bool(renewed)
+
+    def release(self, db: Session, worker_id: int, owner: str):
+        db.execute(
+            delete(WorkerIdLease)
+            .where(WorkerIdLease.worker_id == worker_id, WorkerIdLease.owner == owner)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
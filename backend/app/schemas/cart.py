@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal
 
 from pydantic import BaseModel
 
@@ -10,3 +10,9 @@ class CartItem(BaseModel):
 
 class Cart(BaseModel):
     items: List[CartItem]
+
+
+class CartBulkUpdate(BaseModel):
+    items: List[CartItem]
+    # "replace": the cart becomes exactly `items`; "merge": only the listed products change
+    mode: Literal["replace", "merge"] = "replace"
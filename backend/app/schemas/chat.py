@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -27,4 +27,35 @@ class ChatResponseWithMessages(ChatResponse):
     messages: List[MessageResponse]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ChatSummaryResponse(ChatResponse):
+    unread_count: int = 0
+    last_read_message_id: Optional[int] = None
+    last_message: Optional[MessageResponse] = None
+
+
+class ChatReadUpdate(BaseModel):
+    message_id: Optional[int] = None
+
+
+class ChatReadResponse(BaseModel):
+    chat_id: int
+    last_read_message_id: Optional[int] = None
+
+
+class ChatCounterpart(BaseModel):
+    id: int
+    fullname: str
+    role: str
+
+    class Config:
+        from_attributes = True
+
+
+class InboxEntry(BaseModel):
+    chat_id: int
+    counterpart: ChatCounterpart
+    last_message: Optional[MessageResponse] = None
+    last_activity_at: datetime
+    unread_count: int = 0
@@ -1,11 +1,20 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
 
+class ImageVariant(BaseModel):
+    width: int
+    height: int
+    webp: str
+    jpeg: str
+
+
 class ProductImageInfo(BaseModel):
     id: int
     image_url: str
+    # Missing for images uploaded before variants were generated
+    variants: Optional[Dict[str, ImageVariant]] = None
     class Config:
         orm_mode = True
 
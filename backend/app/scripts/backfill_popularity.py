@@ -0,0 +1,22 @@
+"""
+Rebuild the product popularity counters from the order history.
+
+Run from the backend directory after applying migrations:
+
+    python -m app.scripts.backfill_popularity
+"""
+from app.database.database import SessionLocal
+from app.repositories.popularity import PopularityRepository
+
+
+def main():
+    db = SessionLocal()
+    try:
+        PopularityRepository().backfill(db)
+    finally:
+        db.close()
+    print("Product popularity counters rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional
+
+from ..config import CHAT_BACKPLANE_URL
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[str, dict], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """
+    Pub/sub channel between the workers serving websockets.
+
+    Each worker subscribes to the channels its connected clients listen on, and every
+    published message reaches each subscribed worker, the publisher included.
+    """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        pass
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane: publishing calls the local subscriber directly."""
+
+    def __init__(self):
+        self.handlers: Dict[str, MessageHandler] = {}
+
+    async def publish(self, channel: str, message: dict):
+        handler = self.handlers.get(channel)
+        if handler:
+            await handler(channel, message)
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        self.handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str):
+        self.handlers.pop(channel, None)
+
+
+class RedisBackplane(Backplane):
+    """
+    Backplane over Redis PUBLISH/SUBSCRIBE, for several workers or nodes.
+
+    ``client`` is a ``redis.asyncio.Redis`` or any client with the same ``publish`` and
+    ``pubsub()`` API. Each worker keeps one pub/sub connection and one reader task that
+    hands incoming messages to the handler of their channel.
+    """
+
+    def __init__(self, client, prefix: str = "farmer_market:", poll_timeout: float = 1.0):
+        self.client = client
+        self.prefix = prefix
+        self.poll_timeout = poll_timeout
+        self.handlers: Dict[str, MessageHandler] = {}
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: dict):
+        await self.client.publish(self.prefix + channel, json.dumps(message))
+
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        self.handlers[channel] = handler
+        if self._pubsub is None:
+            self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.prefix + channel)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, channel: str):
+        if self.handlers.pop(channel, None) and self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.prefix + channel)
+
+    async def _read(self):
+        while self.handlers:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=self.poll_timeout
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Backplane connection failed, retrying")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            channel = channel[len(self.prefix):]
+            handler = self.handlers.get(channel)
+            if handler is None:
+                continue
+            try:
+                await handler(channel, json.loads(message["data"]))
+            except Exception:
+                logger.exception(f"Failed to deliver backplane message on {channel}")
+
+    async def close(self):
+        self.handlers.clear()
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self.client.close()
+
+
+def create_backplane(url: str = CHAT_BACKPLANE_URL) -> Backplane:
+    """Build the backplane for ``url``: "memory://" (one worker) or a redis:// URL."""
+    if not url or url.startswith("memory://"):
+        return InMemoryBackplane()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("CHAT_BACKPLANE_URL points to Redis, but the 'redis' package is not installed.")
+        return RedisBackplane(redis_asyncio.from_url(url))
+    raise ValueError(f"Unsupported CHAT_BACKPLANE_URL: {url}")
@@ -1,23 +1,134 @@
+import asyncio
+import json
+import logging
 from collections import defaultdict
-from typing import Dict, List
+from typing import Dict, Optional, Set
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
+
+from ..config import CHAT_SEND_QUEUE_SIZE, CHAT_SEND_TIMEOUT_SECONDS
+from .backplane import Backplane, create_backplane
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Bounded queue of serialized messages for one websocket, drained by its own writer
+    task so a slow client only ever delays itself.
+    """
+
+    def __init__(self, websocket: WebSocket, maxsize: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.writer: Optional[asyncio.Task] = None
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = defaultdict(list)
+    """
+    Websockets connected to this worker, grouped by chat.
+
+    ``broadcast`` publishes to the backplane instead of writing to sockets directly, so
+    a message reaches the chat's participants on every worker. The manager subscribes
+    to a chat's channel when its first local socket joins and unsubscribes when the
+    last one leaves.
+
+    Delivery serializes each message once and only enqueues it for every socket; a
+    writer task per socket sends it. A socket whose queue is full, or whose send does
+    not finish within ``send_timeout``, is disconnected as a slow consumer.
+    """
+
+    def __init__(
+        self,
+        backplane: Optional[Backplane] = None,
+        queue_size: int = CHAT_SEND_QUEUE_SIZE,
+        send_timeout: float = CHAT_SEND_TIMEOUT_SECONDS,
+    ):
+        self.backplane = backplane or create_backplane()
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[int, Set[WebSocket]] = defaultdict(set)
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        self.evictions = 0
+        self._closing: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def channel(chat_id: int) -> str:
+        return f"chat:{chat_id}"
 
     async def connect(self, chat_id: int, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections[chat_id].append(websocket)
+        first_connection = not self.active_connections.get(chat_id)
+        self.active_connections[chat_id].add(websocket)
+        outbox = Outbox(websocket, self.queue_size)
+        outbox.writer = asyncio.create_task(self._write(chat_id, outbox))
+        self.outboxes[websocket] = outbox
+        if first_connection:
+            await self.backplane.subscribe(self.channel(chat_id), self.deliver)
 
-    def disconnect(self, chat_id: int, websocket: WebSocket):
-        self.active_connections[chat_id].remove(websocket)
-        if not self.active_connections[chat_id]:
+    async def disconnect(self, chat_id: int, websocket: WebSocket):
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox and outbox.writer is not asyncio.current_task():
+            outbox.writer.cancel()
+        connections = self.active_connections.get(chat_id)
+        if connections is None:
+            return
+        connections.discard(websocket)
+        if not connections:
             del self.active_connections[chat_id]
+            await self.backplane.unsubscribe(self.channel(chat_id))
 
     async def broadcast(self, chat_id: int, message: dict):
-        connections = self.active_connections.get(chat_id, [])
-        for connection in connections:
-            await connection.send_json(message)
\ No newline at end of file
+        await self.backplane.publish(self.channel(chat_id), message)
+
+    async def deliver(self, channel: str, message: dict):
+        """Queue a message from the backplane for this worker's sockets in the chat."""
+        chat_id = int(channel.split(":", 1)[1])
+        text = json.dumps(message)
+        for websocket in list(self.active_connections.get(chat_id, ())):
+            outbox = self.outboxes.get(websocket)
+            if outbox is None:
+                continue
+            try:
+                outbox.queue.put_nowait(text)
+            except asyncio.QueueFull:
+                await self._evict(chat_id, websocket, "send queue full")
+
+    async def _write(self, chat_id: int, outbox: Outbox):
+        websocket = outbox.websocket
+        while True:
+            text = await outbox.queue.get()
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    await websocket.send_text(text)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                await self._evict(chat_id, websocket, "send timed out")
+                return
+            except Exception as e:
+                logger.warning(f"Dropping websocket in chat {chat_id} after a failed send: {e!r}")
+                await self.disconnect(chat_id, websocket)
+                return
+
+    async def _evict(self, chat_id: int, websocket: WebSocket, reason: str):
+        self.evictions += 1
+        logger.warning(f"Disconnecting slow websocket in chat {chat_id}: {reason}")
+        await self.disconnect(chat_id, websocket)
+        # Closing waits on the same slow client, so it must not hold up the caller
+        task = asyncio.create_task(self._close(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=status.WS_1013_TRY_AGAIN_LATER), self.send_timeout)
+        except Exception:
+            pass
+
+    async def close(self):
+        for outbox in list(self.outboxes.values()):
+            outbox.writer.cancel()
+        self.outboxes.clear()
+        self.active_connections.clear()
+        await self.backplane.close()
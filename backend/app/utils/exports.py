@@ -0,0 +1,108 @@
+import csv
+import io
+import re
+import zlib
+from enum import Enum
+from typing import Callable, Iterable, Iterator
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.engine import Engine, MappingResult
+from sqlalchemy.orm import Session
+
+from ..config import EXPORT_BATCH_SIZE
+from .static_files import accepts
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+# Opens the rows to export on a session, streamed ``batch_size`` at a time
+RowsQuery = Callable[[Session, int], MappingResult]
+
+
+def ndjson_chunks(rows: MappingResult) -> Iterator[bytes]:
+    """One JSON object per line, a chunk per batch of rows."""
+    for batch in rows.partitions():
+        yield b"".join(orjson.dumps(dict(row), option=orjson.OPT_UTC_Z) + b"\n" for row in batch)
+
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# A signed number, such as an E.164 phone number, is read as a number and runs nothing
+SIGNED_NUMBER = re.compile(r"[+-]\d+(\.\d+)?")
+
+
+def _csv_cell(value):
+    """``value`` for a CSV cell, with text that would run as a formula quoted as text."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not SIGNED_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def csv_chunks(rows: MappingResult) -> Iterator[bytes]:
+    """A header line with the column names, then a chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(rows.keys())
+    for batch in rows.partitions():
+        writer.writerows([_csv_cell(value) for value in row.values()] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+ENCODERS = {
+    ExportFormat.NDJSON: ndjson_chunks,
+    ExportFormat.CSV: csv_chunks,
+}
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into one gzip stream, as they are produced."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(
+    bind: Engine, query: RowsQuery, export_format: ExportFormat, batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    The rows of ``query`` encoded in ``export_format``. The rows are read on a session
+    of their own, kept open while the response streams: the request's session is
+    closed once the endpoint returns.
+    """
+    with Session(bind) as db:
+        yield from ENCODERS[export_format](query(db, batch_size))
+
+
+def export_response(
+    request: Request, db: Session, query: RowsQuery, export_format: ExportFormat, filename: str
+) -> StreamingResponse:
+    """
+    Stream the rows of ``query`` as a file download, gzip-compressed on the fly for
+    clients that accept it. Only one batch of rows is held in memory at a time.
+    """
+    chunks = export_chunks(db.get_bind(), query, export_format)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"',
+        "Vary": "Accept-Encoding",
+    }
+    if accepts(request.headers.get("accept-encoding", ""), "gzip"):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[export_format], headers=headers)
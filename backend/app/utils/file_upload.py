@@ -1,30 +1,206 @@
 # In app/utils/file_upload.py
 
+import asyncio
+import hashlib
+import multiprocessing
 import os
-from typing import List
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 from uuid import uuid4
 
-from fastapi import UploadFile
+import anyio
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
 
-UPLOAD_DIRECTORY = "uploaded_images"
+from ..config import (IMAGE_MAX_PIXELS, IMAGE_PROCESS_WORKERS,
+                      MAX_IMAGE_UPLOAD_BYTES, MAX_UPLOAD_REQUEST_BYTES,
+                      UPLOAD_STAGING_DIRECTORY)
+from ..repositories.images import ImageBlobsRepository, blob_keys
+from .images import InvalidImageError, process_image
+from .storage import BlobStorage, image_storage
 
-def save_product_images(images: List[UploadFile]) -> List[str]:
-    image_urls = []
-    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
-    for image in images:
-        # You might want to add validation for image types here
-        # Reset file pointer to the beginning
-        image.file.seek(0)
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-        # Generate a unique filename
-        file_extension = os.path.splitext(image.filename)[1]
-        unique_filename = f"{uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIRECTORY, unique_filename)
+_image_pool: Optional[ProcessPoolExecutor] = None
 
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            buffer.write(image.file.read())
 
-        image_url = f"/static/{unique_filename}"
-        image_urls.append(image_url)
-    return image_urls
\ No newline at end of file
+def get_image_pool() -> ProcessPoolExecutor:
+    """Worker processes resizing uploads, so image work never holds the server's GIL."""
+    global _image_pool
+    if _image_pool is None:
+        # Spawned workers start clean instead of inheriting the server's threads and sockets
+        _image_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=True, cancel_futures=True)
+        _image_pool = None
+
+
+def _with_urls(storage: BlobStorage, variants: dict) -> dict:
+    return {
+        name: {**variant, "webp": storage.url(variant["webp"]), "jpeg": storage.url(variant["jpeg"])}
+        for name, variant in variants.items()
+    }
+
+
+def _store_variants(storage: BlobStorage, directory: str, variants: dict):
+    for key in blob_keys(variants):
+        storage.put(key, os.path.join(directory, key))
+
+
+@dataclass
+class StoredUpload:
+    filename: Optional[str]
+    path: str
+    sha256: str
+    size: int
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def stream_upload(
+    upload: UploadFile,
+    directory: str,
+    max_bytes: int = MAX_IMAGE_UPLOAD_BYTES,
+    request_bytes_left: Optional[int] = None,
+) -> StoredUpload:
+    """
+    Copy an upload to ``directory`` in fixed-size chunks, hashing it on the way.
+
+    At most one chunk is held in memory. The file is written under a temporary name
+    and renamed into place once complete, so a partial file is never visible under
+    its final name. Fails with 413 as soon as the file exceeds ``max_bytes`` or the
+    request's remaining ``request_bytes_left``, and removes what was written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        await upload.seek(0)
+        async with await anyio.open_file(temp_path, "wb") as destination:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if request_bytes_left is not None and size > request_bytes_left:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Upload exceeds the {MAX_UPLOAD_REQUEST_BYTES} byte limit per request",
+                    )
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"{upload.filename}: file exceeds the {max_bytes} byte limit",
+                    )
+                digest.update(chunk)
+                await destination.write(chunk)
+        await anyio.to_thread.run_sync(_fsync, temp_path)
+        path = os.path.join(directory, f"{digest.hexdigest()}.{uuid4().hex}.upload")
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove_file(temp_path)
+        raise
+    return StoredUpload(filename=upload.filename, path=path, sha256=digest.hexdigest(), size=size)
+
+
+image_blobs_repository = ImageBlobsRepository()
+
+
+async def save_product_images(
+    images: List[UploadFile], db: Session, storage: Optional[BlobStorage] = None
+) -> List[dict]:
+    """
+    Turn uploaded product images into resized WebP and JPEG variants in ``storage``.
+
+    Each upload is streamed to the staging directory within the size limits and
+    hashed. Images whose content is already stored are reused as they are; the others
+    are processed in parallel on the image worker pool and stored under their hash.
+    Returns, per image, the ``image_url`` of its full-size JPEG, its ``variants`` with
+    their URLs and sizes, its ``sha256`` and the ``blob`` variants with storage keys.
+    If any image is too large (413) or not a valid JPEG, PNG or WebP (400), the
+    request fails and nothing is stored. Staged originals are always removed.
+    """
+    storage = storage or image_storage
+    staging_directory = os.path.abspath(UPLOAD_STAGING_DIRECTORY)
+    # Per request, so concurrent uploads of the same image never write the same file
+    work_directory = os.path.join(staging_directory, uuid4().hex)
+    os.makedirs(work_directory)
+
+    staged: List[StoredUpload] = []
+    try:
+        request_bytes_left = MAX_UPLOAD_REQUEST_BYTES
+        for image in images:
+            upload = await stream_upload(image, staging_directory, MAX_IMAGE_UPLOAD_BYTES, request_bytes_left)
+            request_bytes_left -= upload.size
+            staged.append(upload)
+
+        blobs: Dict[str, dict] = await run_in_threadpool(
+            image_blobs_repository.claim_existing, db, [upload.sha256 for upload in staged]
+        )
+        new_uploads = list({upload.sha256: upload for upload in staged if upload.sha256 not in blobs}.values())
+        pool = get_image_pool()
+        results = await asyncio.gather(
+            *(
+                asyncio.wrap_future(
+                    pool.submit(process_image, upload.path, work_directory, upload.sha256, IMAGE_MAX_PIXELS)
+                )
+                for upload in new_uploads
+            ),
+            return_exceptions=True,
+        )
+        for upload, result in zip(new_uploads, results):
+            if isinstance(result, InvalidImageError):
+                raise HTTPException(status_code=400, detail=f"{upload.filename}: {result}")
+            if isinstance(result, BaseException):
+                raise result
+
+        stored = []
+        try:
+            for upload, variants in zip(new_uploads, results):
+                stored.append((upload.sha256, variants))
+                await run_in_threadpool(_store_variants, storage, work_directory, variants)
+                blobs[upload.sha256] = variants
+        except BaseException:
+            await run_in_threadpool(image_blobs_repository.register_unreferenced, db, stored)
+            raise
+    finally:
+        for upload in staged:
+            _remove_file(upload.path)
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    return [
+        {
+            "image_url": storage.url(blobs[upload.sha256]["full"]["jpeg"]),
+            "variants": _with_urls(storage, blobs[upload.sha256]),
+            "sha256": upload.sha256,
+            "blob": blobs[upload.sha256],
+        }
+        for upload in staged
+    ]
+
+
+def discard_product_images(db: Session, saved_images: List[dict]):
+    """Hand stored images over to the garbage collector when their product is not created."""
+    db.rollback()
+    image_blobs_repository.register_unreferenced(db, [(image["sha256"], image["blob"]) for image in saved_images])
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Optional
+
+from ..config import ID_WORKER_ID, ID_WORKER_WAIT_SECONDS
+
+# Milliseconds since 2024-01-01 UTC
+ID_EPOCH_MS = 1704067200000
+WORKER_BITS = 6
+SEQUENCE_BITS = 6
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+# How often generate_id_async checks again for a worker ID
+WORKER_ID_RETRY_SECONDS = 0.1
+
+
+class NoWorkerIdError(RuntimeError):
+    """No worker ID to generate IDs with: none configured, and no lease held."""
+
+
+class SnowflakeGenerator:
+    """
+    Time-ordered 53-bit IDs: 41 bits of milliseconds, 6 bits of worker ID and a 6-bit
+    sequence within the millisecond.
+
+    IDs are generated without a database round-trip, sort in creation order and stay
+    within JavaScript's safe integer range. Each worker process needs its own
+    ``worker_id`` for IDs to be unique across workers: either configured, or leased
+    (see WorkerIdLeasesRepository), in which case the generator is assigned its ID
+    with the lease's deadline and refuses to generate IDs once that passes, until the
+    lease is renewed.
+    """
+
+    def __init__(
+        self,
+        worker_id: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        monotonic: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self.monotonic = monotonic
+        self._lock = threading.Lock()
+        self._assigned = threading.Condition(self._lock)
+        self._last_ms = 0
+        self._sequence = 0
+        self.worker_id: Optional[int] = None
+        self._valid_until: Optional[float] = None
+        if worker_id is not None:
+            self.assign(worker_id)
+
+    def assign(self, worker_id: Optional[int], valid_for: Optional[float] = None):
+        """
+        Use ``worker_id`` from now on, for ``valid_for`` seconds if given (a lease),
+        or stop generating IDs if it is None.
+        """
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        with self._assigned:
+            self.worker_id = worker_id
+            self._valid_until = self.monotonic() + valid_for if valid_for is not None else None
+            self._assigned.notify_all()
+
+    def _has_worker_id(self) -> bool:
+        return self.worker_id is not None and (self._valid_until is None or self.monotonic() < self._valid_until)
+
+    def next_id(self, timeout: float = 0) -> int:
+        """
+        The next ID. Without a valid worker ID (the lease is not held yet, or lapsed),
+        waits up to ``timeout`` seconds for one, then raises NoWorkerIdError.
+        """
+        with self._assigned:
+            if not self._assigned.wait_for(self._has_worker_id, timeout):
+                raise NoWorkerIdError("No worker ID to generate IDs with: set ID_WORKER_ID or wait for a lease")
+            now_ms = int(self.clock() * 1000) - ID_EPOCH_MS
+            if now_ms <= self._last_ms:
+                # Same millisecond, or the clock went back: keep counting from the last one
+                now_ms = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    now_ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return (now_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+
+id_generator = SnowflakeGenerator(ID_WORKER_ID)
+
+
+def generate_id() -> int:
+    """The next ID, waiting up to ID_WORKER_WAIT_SECONDS for a worker ID. Blocks the thread."""
+    return id_generator.next_id(timeout=ID_WORKER_WAIT_SECONDS)
+
+
+async def generate_id_async() -> int:
+    """The next ID, waiting for a worker ID as long as it takes without blocking the event loop."""
+    while True:
+        try:
+            return id_generator.next_id()
+        except NoWorkerIdError:
+            await asyncio.sleep(WORKER_ID_RETRY_SECONDS)
@@ -0,0 +1,91 @@
+"""
+Image processing for uploads. Runs in worker processes, so it only depends on Pillow.
+"""
+import io
+import os
+import warnings
+from typing import Dict, Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Longest edge of each variant, in pixels. Images are never upscaled.
+IMAGE_VARIANTS = {
+    "thumbnail": 320,
+    "medium": 960,
+    "full": 2048,
+}
+ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG", "WEBP"}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """JPEG has no alpha channel: paste transparent images onto white."""
+    if image.mode != "RGBA":
+        return image
+    opaque = Image.new("RGB", image.size, (255, 255, 255))
+    opaque.paste(image, mask=image.getchannel("A"))
+    return opaque
+
+
+def _save_atomically(image: Image.Image, path: str, image_format: str, **params):
+    """Write to a temporary name and rename, so a half-written file is never served."""
+    temp_path = f"{path}.part"
+    try:
+        image.save(temp_path, image_format, **params)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def process_image(
+    source: Union[str, bytes], directory: str, stem: str, max_pixels: int
+) -> Dict[str, Dict[str, Union[str, int]]]:
+    """
+    Validate an uploaded image, given as a file path or bytes, and write its WebP and
+    JPEG variants to ``directory``.
+
+    The image is decoded, so its type is checked from the content rather than the
+    file name, turned upright according to its EXIF orientation and re-encoded
+    without any metadata. Returns, per variant, its size and the file names of both
+    encodings.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns up to twice the limit; reject anything above it
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as opened:
+                if opened.format not in ALLOWED_IMAGE_FORMATS:
+                    raise InvalidImageError(f"Unsupported image format: {opened.format}")
+                opened.load()
+                image = ImageOps.exif_transpose(opened)
+    except (UnidentifiedImageError, Image.DecompressionBombError, Image.DecompressionBombWarning,
+            OSError, SyntaxError) as e:
+        raise InvalidImageError(f"Invalid image: {e}")
+
+    image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+    variants = {}
+    # Largest first, so each smaller variant is resampled from fewer pixels
+    for name, max_edge in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        webp_name = f"{stem}_{name}.webp"
+        jpeg_name = f"{stem}_{name}.jpg"
+        _save_atomically(image, os.path.join(directory, webp_name), "WEBP", quality=WEBP_QUALITY, method=4)
+        _save_atomically(
+            _flatten(image), os.path.join(directory, jpeg_name), "JPEG",
+            quality=JPEG_QUALITY, optimize=True, progressive=True,
+        )
+        variants[name] = {"width": image.width, "height": image.height, "webp": webp_name, "jpeg": jpeg_name}
+    return {name: variants[name] for name in IMAGE_VARIANTS}
@@ -0,0 +1,18 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class RowsJSONResponse(JSONResponse):
+    """
+    JSON rendered by orjson straight from plain dicts and lists.
+
+    Endpoints return it with content already shaped like their ``response_model``
+    (built from column rows, not ORM objects), so FastAPI does not validate and
+    encode it again; the ``response_model`` still documents the schema. Datetimes
+    are rendered the way Pydantic renders them, with "Z" for UTC.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from ..config import CHAT_WRITE_BATCH_SIZE, CHAT_WRITE_INTERVAL_MS, CHAT_WRITE_MAX_PENDING
+from ..database.database import get_session_factory
+from ..repositories.chat import ChatRepository, MessageIdCollisionError
+from .ids import generate_id
+
+logger = logging.getLogger(__name__)
+
+chat_repository = ChatRepository()
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages.
+
+    The websocket loop hands over messages that already have their ID and timestamp
+    and goes on broadcasting; a background task saves them in batches of up to
+    ``batch_size``, at least every ``interval_ms``, with one INSERT and one commit per
+    batch on the threadpool.
+
+    A batch that fails stays at the head of the buffer and is retried with backoff,
+    in order, until it is saved; retries cannot duplicate messages because rows are
+    keyed by their generated ID. A message whose ID turns out to be taken by another
+    message is logged and saved under a new ID. A message that can never be saved (for example, its
+    chat was deleted) is logged and dropped without blocking the others. When more
+    than ``max_pending`` messages are unsaved, senders wait for the database instead
+    of the buffer growing without bound. ``close`` saves what is left on shutdown.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[sessionmaker] = None,
+        batch_size: int = CHAT_WRITE_BATCH_SIZE,
+        interval_ms: int = CHAT_WRITE_INTERVAL_MS,
+        max_pending: int = CHAT_WRITE_MAX_PENDING,
+        max_retry_seconds: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.max_retry_seconds = max_retry_seconds
+        self.buffer: Deque[dict] = deque()
+        self.saved = 0
+        self.failures = 0
+        self.dropped = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self.buffer)
+
+    def _bind(self):
+        # asyncio primitives belong to one event loop; a new loop (tests, reloads) gets new ones
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._drained = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = None
+
+    def _start(self):
+        self._bind()
+        if self._task is None or self._task.done():
+            self._task = self._loop.create_task(self._run())
+
+    async def submit(self, message: dict):
+        """Queue a message for saving. Waits only while the buffer is full."""
+        self._start()
+        while len(self.buffer) >= self.max_pending:
+            self._wakeup.set()
+            self._drained.clear()
+            await self._drained.wait()
+        self.buffer.append(message)
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self, max_attempts: Optional[int] = None) -> bool:
+        """
+        Save every buffered message. Retries failed batches until they are saved, or
+        up to ``max_attempts`` times per batch. Returns False if messages were left.
+        """
+        self._bind()
+        async with self._flush_lock:
+            retry_seconds = self.interval or 0.05
+            attempts = 0
+            while self.buffer:
+                batch = list(islice(self.buffer, self.batch_size))
+                try:
+                    await run_in_threadpool(self._save, batch)
+                except Exception:
+                    self.failures += 1
+                    attempts += 1
+                    logger.exception(f"Failed to save {len(batch)} chat messages, retrying in {retry_seconds:.2f}s")
+                    if max_attempts is not None and attempts >= max_attempts:
+                        return False
+                    await asyncio.sleep(retry_seconds)
+                    retry_seconds = min(retry_seconds * 2, self.max_retry_seconds)
+                    continue
+
+                for _ in batch:
+                    self.buffer.popleft()
+                attempts = 0
+                retry_seconds = self.interval or 0.05
+                self._drained.set()
+        return True
+
+    def _save(self, batch: List[dict]):
+        session_factory = self.session_factory or get_session_factory()
+        db = session_factory()
+        try:
+            try:
+                chat_repository.save_messages(db, batch)
+                self.saved += len(batch)
+                return
+            except MessageIdCollisionError as e:
+                # Two workers generated the same IDs (a worker ID used twice): keep both messages
+                logger.error(f"{e}; saving the new messages under new IDs. Check the worker ID configuration.")
+                for message in e.messages:
+                    message["id"] = generate_id()
+                chat_repository.save_messages(db, batch)
+                self.saved += len(batch)
+                return
+            except IntegrityError:
+                db.rollback()
+
+            # Some message breaks a constraint: save the rest one by one
+            for message in batch:
+                try:
+                    chat_repository.save_messages(db, [message])
+                    self.saved += 1
+                except IntegrityError:
+                    db.rollback()
+                    self.dropped += 1
+                    logger.error(f"Dropping chat message that cannot be saved: {json.dumps(message, default=str)}")
+        finally:
+            db.close()
+
+    async def close(self):
+        """Stop the background task and save what is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.buffer and not await self.flush(max_attempts=3):
+            for message in self.buffer:
+                logger.error(f"Chat message lost on shutdown: {json.dumps(message, default=str)}")
+            self.buffer.clear()
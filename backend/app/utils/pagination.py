@@ -0,0 +1,59 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort_by: str, values: List[Any]) -> str:
+    """Encode the sort key of the last row of a page into an opaque cursor token."""
+    payload = {"s": sort_by, "v": [_encode_value(value) for value in values]}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _is_of_type(value: Any, expected: type) -> bool:
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        # JSON does not keep 2.0 and 2 apart
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, sort_by: str, types: Sequence[type]) -> List[Any]:
+    """
+    Decode a cursor token, rejecting tampered tokens and tokens from another sort order.
+    ``types`` are the types of the sort key values the cursor must hold, in order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(value) for value in payload["v"]]
+        cursor_sort = payload["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if cursor_sort != sort_by:
+        raise HTTPException(
+            status_code=400, detail="Cursor does not match the requested sort order"
+        )
+    if len(values) != len(types) or not all(map(_is_of_type, values, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from ..config import PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WORKERS
+from .security import pwd_context
+
+
+class PasswordService:
+    """
+    Runs bcrypt on a dedicated thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL, so ``max_workers`` hashes run in parallel. At most
+    ``max_pending`` operations may be running or queued; beyond that callers get a
+    503 instead of piling up behind a login storm.
+    """
+
+    def __init__(
+        self,
+        context: CryptContext = pwd_context,
+        max_workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.context = context
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many sign-in attempts in progress. Please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        future = self._executor.submit(fn, *args)
+        # Released when the hash finishes, even if the awaiting request was cancelled
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and, when the stored hash uses outdated parameters, return a
+        new hash to store in its place (otherwise None).
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_service = PasswordService()
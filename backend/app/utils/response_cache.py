@@ -0,0 +1,252 @@
+import hashlib
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from ..config import (RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS,
+                      RESPONSE_CACHE_URL)
+from .cache import TTLCache
+from .static_files import etag_matches
+
+logger = logging.getLogger(__name__)
+
+CACHE_STATUS_HEADER = "X-Cache"
+# Clients may keep responses but must revalidate them with their ETag
+CACHE_CONTROL = "no-cache"
+
+# Tags of cached responses, invalidated by the repositories whose writes change them
+CATALOG_TAG = "catalog"
+
+
+def product_tag(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+def farmer_products_tag(farmer_id: int) -> str:
+    return f"farmer-products:{farmer_id}"
+
+
+def comments_tag(product_id: int) -> str:
+    return f"comments:{product_id}"
+
+
+@dataclass
+class CachedResponse:
+    """A serialized JSON body with its ETag, extra headers and the tag versions it was built at."""
+    body: bytes
+    etag: str
+    versions: Tuple[int, ...]
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def encode(self) -> bytes:
+        meta = {"etag": self.etag, "versions": self.versions, "headers": self.headers}
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> "CachedResponse":
+        meta, _, body = data.partition(b"\n")
+        meta = json.loads(meta)
+        return cls(body=body, etag=meta["etag"], versions=tuple(meta["versions"]), headers=meta["headers"])
+
+
+class ResponseCacheBackend(ABC):
+    """Storage of cached responses and of the version of each tag."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, entry: CachedResponse, ttl_seconds: float):
+        pass
+
+    @abstractmethod
+    def versions(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        pass
+
+    @abstractmethod
+    def bump(self, tags: Tuple[str, ...]):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class InMemoryResponseCacheBackend(ResponseCacheBackend):
+    """Responses in a TTLCache of this process."""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.entries = TTLCache(maxsize, RESPONSE_CACHE_TTL_SECONDS)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self.entries.get(key)
+
+    def set(self, key: str, entry: CachedResponse, ttl_seconds: float):
+        self.entries.set(key, entry, ttl_seconds)
+
+    def versions(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def bump(self, tags: Tuple[str, ...]):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self._versions.clear()
+
+
+class RedisResponseCacheBackend(ResponseCacheBackend):
+    """Responses and tag versions in Redis, shared by every worker."""
+
+    def __init__(self, client, prefix: str = "farmer_market:responses:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        data = self.client.get(self.prefix + key)
+        return CachedResponse.decode(data) if data is not None else None
+
+    def set(self, key: str, entry: CachedResponse, ttl_seconds: float):
+        self.client.set(self.prefix + key, entry.encode(), ex=max(1, int(ttl_seconds)))
+
+    def versions(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        values = self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return tuple(int(value) if value is not None else 0 for value in values)
+
+    def bump(self, tags: Tuple[str, ...]):
+        for tag in tags:
+            self.client.incr(f"{self.prefix}tag:{tag}")
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """
+    Pre-serialized JSON responses of public read endpoints, keyed by path and query.
+
+    Each response is stored with the versions of the tags it depends on, taken before
+    it was built. Invalidating a tag bumps its version, so every response built from
+    older data stops being served at once, including one still being built while the
+    write committed. Responses carry a strong ETag and revalidate with 304.
+    """
+
+    def __init__(self, backend: ResponseCacheBackend, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(request: Request) -> str:
+        query = sorted(request.query_params.multi_items())
+        return request.url.path + ("?" + "&".join(f"{name}={value}" for name, value in query) if query else "")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def respond(
+        self,
+        request: Request,
+        tags: Iterable[str],
+        adapter: TypeAdapter,
+        build: Callable[[Dict[str, str]], Any],
+    ) -> Response:
+        """
+        The cached response for ``request``, or a new one from ``build``. ``build``
+        returns the content to serialize with ``adapter`` and may add headers to the
+        dict it is given. A backend failure only bypasses the cache.
+        """
+        tags = tuple(tags)
+        key = self.key(request)
+        entry = versions = None
+        try:
+            versions = self.backend.versions(tags)
+            entry = self.backend.get(key)
+        except Exception as e:
+            self._count("errors")
+            logger.error("Response cache lookup failed: %s", e)
+
+        if entry is not None and entry.versions == versions:
+            self._count("hits")
+            status = "HIT"
+        else:
+            self._count("misses")
+            status = "MISS"
+            headers: Dict[str, str] = {}
+            content = adapter.validate_python(build(headers), from_attributes=True)
+            body = adapter.dump_json(content)
+            entry = CachedResponse(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', versions, headers)
+            if versions is not None:
+                try:
+                    self.backend.set(key, entry, self.ttl_seconds)
+                except Exception as e:
+                    self._count("errors")
+                    logger.error("Response cache store failed: %s", e)
+
+        headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": CACHE_CONTROL, CACHE_STATUS_HEADER: status}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def invalidate(self, *tags: str):
+        """Stop serving every response that depends on any of ``tags``."""
+        try:
+            self.backend.bump(tags)
+        except Exception as e:
+            self._count("errors")
+            logger.error("Response cache invalidation failed: %s", e)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = self.errors = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "ttl_seconds": self.ttl_seconds,
+            }
+        if isinstance(self.backend, InMemoryResponseCacheBackend):
+            stats["size"] = len(self.backend.entries)
+        return stats
+
+
+def create_response_cache(url: str = RESPONSE_CACHE_URL) -> ResponseCache:
+    """Build the response cache for ``url``: "memory://" (one worker) or a redis:// URL."""
+    if not url or url.startswith("memory://"):
+        return ResponseCache(InMemoryResponseCacheBackend())
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_URL points to Redis, but the 'redis' package is not installed.")
+        return ResponseCache(RedisResponseCacheBackend(redis.Redis.from_url(url)))
+    raise ValueError(f"Unsupported RESPONSE_CACHE_URL: {url}")
+
+
+response_cache = create_response_cache()
@@ -1,16 +1,21 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Iterable, Optional
 
-from fastapi import Depends, HTTPException, WebSocket
+from fastapi import Depends, HTTPException, Request, WebSocket
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
+from ..config import PASSWORD_BCRYPT_ROUNDS
 from ..database.database import get_db
 from ..database.models import User
 from ..repositories.users import UsersRepository
+from .cache import principal_cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are flagged by needs_update() and rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS)
 
 SECRET_KEY = "Messi>Ronaldo"
 ALGORITHM = "HS256"
@@ -50,42 +55,152 @@ def decode_jwt_token(token: str) -> int:
         raise e
 
 
-def check_user_role(token: str, db: Session, allowed_roles: list):
-    """Check if the user's role matches any role in the allowed_roles list."""
-    user_id = decode_jwt_token(token)
-    user = users_repository.get_user_by_id(db, user_id)
-
-    # Allow admins to bypass any role checks
-    if user.role == "Admin":
-        return user_id
-
-    # Check if the user has any of the allowed roles
-    if user.role not in allowed_roles:
-        raise HTTPException(
-            status_code=403, detail="You do not have permission to perform this action."
+@dataclass(frozen=True)
+class PrincipalInfo:
+    """What authorization checks need to know about a user; safe to share across requests."""
+    user_id: int
+    role: str
+    farmer_profile_id: Optional[int] = None
+    farmer_approval: Optional[str] = None
+    buyer_profile_id: Optional[int] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "PrincipalInfo":
+        return cls(
+            user_id=user.id,
+            role=user.role,
+            farmer_profile_id=user.farmer_profile.id if user.farmer_profile else None,
+            farmer_approval=user.farmer_profile.is_approved if user.farmer_profile else None,
+            buyer_profile_id=user.buyer_profile.id if user.buyer_profile else None,
         )
 
-    return user_id
 
+class CurrentPrincipal:
+    """
+    The authenticated user of a request.
 
-def check_farmer_approval(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    Role and approval checks use the cached PrincipalInfo; the User row (with both
+    profiles) is only loaded when an endpoint asks for ``user``.
     """
-    Verify that the user is a farmer with is_approved=True using the JWT token.
+
+    def __init__(self, info: PrincipalInfo, db: Session, user: Optional[User] = None):
+        self.info = info
+        self._db = db
+        self._user = user
+
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            self._user = _query_user(self._db, self.info.user_id)
+            if self._user is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        return self._user
+
+    @property
+    def user_id(self) -> int:
+        return self.info.user_id
+
+    @property
+    def role(self) -> str:
+        return self.info.role
+
+    @property
+    def is_admin(self) -> bool:
+        return self.info.role == "Admin"
+
+    def has_role(self, allowed_roles: Iterable[str]) -> bool:
+        # Admins pass every role check
+        return self.is_admin or self.info.role in allowed_roles
+
+    def require_role(self, allowed_roles: Iterable[str]):
+        if not self.has_role(allowed_roles):
+            raise HTTPException(
+                status_code=403, detail="You do not have permission to perform this action."
+            )
+
+    def require_approved_farmer(self):
+        if self.info.role != "Farmer":
+            raise HTTPException(
+                status_code=403, detail="Access forbidden: User is not a farmer."
+            )
+        if self.info.farmer_approval != "approved":
+            raise HTTPException(
+                status_code=403, detail="Access forbidden: Farmer is not approved."
+            )
+
+
+def _query_user(db: Session, user_id: int) -> Optional[User]:
+    return (
+        db.query(User)
+        .options(joinedload(User.farmer_profile), joinedload(User.buyer_profile))
+        .filter(User.id == user_id)
+        .first()
+    )
+
+
+def load_principal(db: Session, token: str) -> CurrentPrincipal:
     """
-    # Decode the JWT token to get user_id
-    user_id = decode_jwt_token(token)
+    Decode the token and look its user up in the principal cache, falling back to one
+    joined query for the user and both profiles.
+    """
+    try:
+        user_id = decode_jwt_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+    info = principal_cache.get(user_id)
+    if info is not None:
+        return CurrentPrincipal(info, db)
 
-    # Check if the user is a farmer and approved
-    user = db.query(User).filter(User.id == user_id, User.role == "Farmer").first()
+    user = _query_user(db, user_id)
     if not user:
-        raise HTTPException(
-            status_code=403, detail="Access forbidden: User is not a farmer."
-        )
-    if not user.farmer_profile or user.farmer_profile.is_approved != "approved":
-        raise HTTPException(
-            status_code=403, detail="Access forbidden: Farmer is not approved."
-        )
-    return user
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    info = PrincipalInfo.from_user(user)
+    principal_cache.set(user_id, info)
+    return CurrentPrincipal(info, db, user)
+
+
+def resolve_principal(request: Request, db: Session, token: str) -> CurrentPrincipal:
+    """Return the request's CurrentPrincipal, building it on first use."""
+    principal: Optional[CurrentPrincipal] = getattr(request.state, "principal", None)
+    if principal is None:
+        principal = load_principal(db, token)
+        request.state.principal = principal
+    return principal
+
+
+def get_current_principal(
+    request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> CurrentPrincipal:
+    """
+    Dependency returning the request's CurrentPrincipal. It is built once per request
+    and kept on request.state, so every check in the request reuses it.
+    """
+    return resolve_principal(request, db, token)
+
+
+def require_roles(*allowed_roles: str):
+    """Dependency factory allowing only the given roles (and admins)."""
+    def dependency(principal: CurrentPrincipal = Depends(get_current_principal)) -> CurrentPrincipal:
+        principal.require_role(allowed_roles)
+        return principal
+
+    return dependency
+
+
+def check_user_role(token: str, db: Session, allowed_roles: list):
+    """Check if the user's role matches any role in the allowed_roles list."""
+    principal = load_principal(db, token)
+    principal.require_role(allowed_roles)
+    return principal.user_id
+
+
+def check_farmer_approval(principal: CurrentPrincipal = Depends(get_current_principal)):
+    """
+    Verify that the user is a farmer with is_approved=True using the JWT token.
+    """
+    principal.require_approved_farmer()
+    return principal.user
 
 async def get_current_user_websocket(websocket: WebSocket, db: Session = Depends(get_db)) -> User:
     try:
@@ -110,12 +225,5 @@ async def get_current_user_websocket(websocket: WebSocket, db: Session = Depends
         raise HTTPException(status_code=403, detail="Invalid token")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        user_id = decode_jwt_token(token)
-        user = users_repository.get_user_by_id(db, user_id)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
\ No newline at end of file
+def get_current_user(principal: CurrentPrincipal = Depends(get_current_principal)):
+    return principal.user
@@ -0,0 +1,189 @@
+import mimetypes
+import os
+import re
+from email.utils import parsedate
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from .storage import IMMUTABLE_CACHE_CONTROL
+
+# Variants stored under the hash of their original (see ImageBlobsRepository) never change
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}_[a-z]+\.(jpg|webp)$")
+# Images uploaded before content addressing are revalidated now and then
+REVALIDATED_CACHE_CONTROL = "public, max-age=3600"
+# Pre-compressed copies looked up next to a file, by preference
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def accepts(header: str, token: str) -> bool:
+    """Whether an Accept or Accept-Encoding header lists ``token`` without q=0."""
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == token:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    The inclusive (start, end) of a single "bytes=" range, or None when the header
+    should be ignored (malformed or several ranges, which are served in full).
+    Raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    first, _, last = ranges.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not (first or last):
+        return None
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first and last and int(last) < int(first):
+        return None
+    if size == 0:
+        raise ValueError("Empty file")
+    if not first:
+        if int(last) == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - int(last)), size - 1
+    if int(first) >= size:
+        raise ValueError("Range starts past the end of the file")
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+class FileRangeResponse(Response):
+    """206 Partial Content with one byte range of a file, read in chunks."""
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict, media_type: Optional[str]):
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.start)
+            while remaining:
+                chunk = await file.read(min(RANGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class ImageStaticFiles(StaticFiles):
+    """
+    StaticFiles for product images, with HTTP caching that fits content-addressed files.
+
+    - Content-addressed variants get a strong ETag derived from their hashed name and
+      are cached as immutable; other files keep Starlette's ETag and a short max-age.
+    - A JPEG variant is answered with its WebP sibling for clients that accept WebP,
+      and any file with a ``.br`` or ``.gz`` copy next to it is served pre-compressed.
+    - If-None-Match gets a 304, and a single byte range (honoring If-Range) a 206.
+    """
+
+    def _representation(self, full_path: str, request_headers: Headers, ranged: bool):
+        """The file to serve for ``full_path``, its content encoding, and what the choice varies by."""
+        path, encoding, vary = full_path, None, []
+        if CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path)) and full_path.endswith(".jpg"):
+            webp_path = full_path[:-len(".jpg")] + ".webp"
+            if os.path.exists(webp_path):
+                vary.append("Accept")
+                if accepts(request_headers.get("accept", ""), "image/webp"):
+                    path = webp_path
+
+        compressed = [(name, suffix) for name, suffix in PRECOMPRESSED_ENCODINGS if os.path.exists(path + suffix)]
+        if compressed:
+            vary.append("Accept-Encoding")
+            accept_encoding = request_headers.get("accept-encoding", "")
+            # Ranges address the identity bytes, so ranged requests are served uncompressed
+            for name, suffix in ([] if ranged else compressed):
+                if accepts(accept_encoding, name):
+                    path, encoding = path + suffix, name
+                    break
+        return path, encoding, vary
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        range_header = request_headers.get("range") if status_code == 200 else None
+        path, encoding, vary = self._representation(full_path, request_headers, bool(range_header))
+        # A pre-compressed copy has the media type of the file it was compressed from
+        media_type = mimetypes.guess_type(os.path.splitext(path)[0] if encoding else path)[0]
+        if path != full_path:
+            stat_result = os.stat(path)
+
+        headers = {"accept-ranges": "bytes"}
+        served_name = os.path.basename(path)
+        if CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path)):
+            headers["etag"] = f'"{served_name}"'
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            headers["cache-control"] = REVALIDATED_CACHE_CONTROL
+        if vary:
+            headers["vary"] = ", ".join(vary)
+        if encoding:
+            headers["content-encoding"] = encoding
+
+        response = FileResponse(
+            path, status_code=status_code, stat_result=stat_result, headers=headers, media_type=media_type
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        if range_header:
+            if_range = request_headers.get("if-range")
+            if if_range is None or if_range.strip() == response.headers["etag"]:
+                try:
+                    byte_range = parse_range(range_header, stat_result.st_size)
+                except ValueError:
+                    return Response(
+                        status_code=416,
+                        headers={"content-range": f"bytes */{stat_result.st_size}", **headers},
+                    )
+                if byte_range is not None:
+                    range_headers = {
+                        name: value for name, value in response.headers.items()
+                        if name not in ("content-length", "content-type")
+                    }
+                    return FileRangeResponse(
+                        path, *byte_range, stat_result.st_size, range_headers, response.media_type
+                    )
+        return response
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        # If-None-Match, when sent, takes precedence over If-Modified-Since
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = response_headers.get("etag")
+            return etag is not None and etag_matches(if_none_match, etag)
+        if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+        last_modified = parsedate(response_headers.get("last-modified", ""))
+        return if_modified_since is not None and last_modified is not None and if_modified_since >= last_modified
@@ -0,0 +1,135 @@
+import logging
+import mimetypes
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from ..config import (IMAGE_PUBLIC_URL, IMAGE_STORAGE_ENDPOINT_URL,
+                      IMAGE_STORAGE_URL)
+
+logger = logging.getLogger(__name__)
+
+# Keys are content hashes, so a stored object never changes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class BlobStorage(ABC):
+    """Where uploaded images are kept, addressed by key."""
+
+    @abstractmethod
+    def put(self, key: str, path: str):
+        """Store the local file at ``path`` under ``key``. The local file is consumed."""
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Delete ``key``; deleting a missing key is not an error."""
+        pass
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        pass
+
+
+class LocalStorage(BlobStorage):
+    """A directory on this node's disk, served by the application under ``url_prefix``."""
+
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def put(self, key: str, path: str):
+        os.makedirs(self.directory, exist_ok=True)
+        # A rename is atomic, so the file is never served half-written
+        try:
+            os.replace(path, self._path(key))
+        except OSError:
+            temp_path = self._path(f".{key}.part")
+            shutil.move(path, temp_path)
+            os.replace(temp_path, self._path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+
+class S3Storage(BlobStorage):
+    """
+    An S3-compatible bucket, through a boto3 S3 client. Objects are served from
+    ``public_url`` (the bucket itself or a CDN in front of it).
+    """
+
+    def __init__(self, client, bucket: str, prefix: str = "", public_url: Optional[str] = None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = (public_url or f"https://{bucket}.s3.amazonaws.com").rstrip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put(self, key: str, path: str):
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        with open(path, "rb") as file:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._key(key),
+                Body=file,
+                ContentType=content_type,
+                CacheControl=IMMUTABLE_CACHE_CONTROL,
+            )
+        os.remove(path)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            # botocore's ClientError carries the HTTP status of the failed request
+            error = getattr(e, "response", {}).get("Error", {})
+            if error.get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{self._key(key)}"
+
+
+def create_storage(
+    url: str = IMAGE_STORAGE_URL,
+    endpoint_url: Optional[str] = IMAGE_STORAGE_ENDPOINT_URL,
+    public_url: Optional[str] = IMAGE_PUBLIC_URL,
+) -> BlobStorage:
+    """Build the storage for ``url``: a local directory or "s3://bucket/prefix"."""
+    if not url.startswith("s3://"):
+        return LocalStorage(url)
+    try:
+        import boto3
+    except ImportError:
+        raise RuntimeError("IMAGE_STORAGE_URL points to S3, but the 'boto3' package is not installed.")
+    bucket, _, prefix = url.removeprefix("s3://").partition("/")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    return S3Storage(boto3.client("s3", endpoint_url=endpoint_url), bucket, prefix, public_url)
+
+
+image_storage = create_storage()
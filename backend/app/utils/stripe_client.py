@@ -0,0 +1,56 @@
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+import stripe
+
+from ..config import (STRIPE_API_BASE, STRIPE_CONNECT_TIMEOUT_SECONDS,
+                      STRIPE_MAX_NETWORK_RETRIES, STRIPE_READ_TIMEOUT_SECONDS,
+                      STRIPE_SECRET_KEY)
+
+
+def create_stripe_http_client(
+    connect_timeout: float = STRIPE_CONNECT_TIMEOUT_SECONDS,
+    read_timeout: float = STRIPE_READ_TIMEOUT_SECONDS,
+) -> stripe.HTTPXClient:
+    """An async HTTP client with one connection pool, reused across Stripe requests."""
+    return stripe.HTTPXClient(timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+
+
+def create_stripe_client(
+    api_key: Optional[str] = STRIPE_SECRET_KEY,
+    api_base: str = STRIPE_API_BASE,
+    http_client: Optional[stripe.HTTPXClient] = None,
+    max_network_retries: int = STRIPE_MAX_NETWORK_RETRIES,
+) -> stripe.StripeClient:
+    """
+    Stripe client for async request handlers.
+
+    Connection errors, timeouts and retryable responses are retried with Stripe's
+    exponential backoff; callers pass an idempotency key so a retried request cannot
+    create a second object.
+    """
+    return stripe.StripeClient(
+        api_key or "",
+        base_addresses={"api": api_base},
+        http_client=http_client or create_stripe_http_client(),
+        max_network_retries=max_network_retries,
+    )
+
+
+# Created on first use, inside the event loop that will share their connections
+@lru_cache(maxsize=None)
+def get_stripe_http_client() -> stripe.HTTPXClient:
+    return create_stripe_http_client()
+
+
+@lru_cache(maxsize=None)
+def get_stripe_client() -> stripe.StripeClient:
+    return create_stripe_client(http_client=get_stripe_http_client())
+
+
+async def close_stripe_client():
+    if get_stripe_http_client.cache_info().currsize:
+        await get_stripe_http_client().close_async()
+    get_stripe_client.cache_clear()
+    get_stripe_http_client.cache_clear()
@@ -0,0 +1,128 @@
+import os
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_stub")
+os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_test")
+os.environ.setdefault("MAIL_USERNAME", "noreply@example.com")
+os.environ.setdefault("MAIL_PASSWORD", "test-mail-password")
+os.environ.setdefault("ID_WORKER_ID", "0")
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import models  # noqa: F401  (registers the tables on Base)
+from app.database.database import Base, create_db_engine
+from app.database.search import product_search_index
+from app.utils.cache import principal_cache
+from app.utils.response_cache import response_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """User IDs repeat across test databases, so never share cached principals."""
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Product IDs repeat across test databases, so never share cached responses."""
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A file-backed SQLite engine configured exactly like the application's."""
+    test_engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(test_engine)
+    with test_engine.begin() as connection:
+        product_search_index.create(connection)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def statements(engine):
+    """SQL statements run on ``engine``, each reduced to its first two words."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(" ".join(statement.split()[:2]).upper())
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def farmer(db):
+    """An approved farmer user with a farmer profile."""
+    user = models.User(
+        fullname="Test Farmer",
+        email="farmer@example.com",
+        phone="+77000000001",
+        password_hashed="not-a-real-hash",
+        role="Farmer",
+    )
+    user.farmer_profile = models.FarmerProfile(
+        farm_name="Test Farm", location="Astana", farm_size=10.0, is_approved="approved"
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+@pytest.fixture
+def buyer(db):
+    """A buyer user with a buyer profile."""
+    user = models.User(
+        fullname="Test Buyer",
+        email="buyer@example.com",
+        phone="+77000000002",
+        password_hashed="not-a-real-hash",
+        role="Buyer",
+    )
+    user.buyer_profile = models.BuyerProfile(delivery_address="1 Test Street")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+@pytest.fixture
+def make_product(db, farmer):
+    """Factory creating products owned by the ``farmer`` fixture."""
+    def _make_product(name="Tomato", category="Vegetables", price=1.0, quantity=10, **fields):
+        product = models.Product(
+            name=name,
+            category=category,
+            price=price,
+            quantity=quantity,
+            farmer_id=farmer.farmer_profile.id,
+            **fields,
+        )
+        db.add(product)
+        db.commit()
+        db.refresh(product)
+        return product
+
+    return _make_product
@@ -0,0 +1,53 @@
+import pytest
+
+from app.database.models import CartItem
+from app.repositories.cart import CartRepository
+from app.schemas.cart import CartItem as CartItemSchema
+
+cart_repository = CartRepository()
+
+
+def _items(*items):
+    return [CartItemSchema(product_id=product_id, quantity=quantity) for product_id, quantity in items]
+
+
+def _cart(db, user_id):
+    return {cart_item.product_id: cart_item.quantity for cart_item, _ in cart_repository.get_cart(db, user_id)}
+
+
+def test_replace_sets_the_whole_cart_in_one_upsert(db, buyer, make_product, statements):
+    products = [make_product(name=f"Product {i}", quantity=100) for i in range(30)]
+    cart_repository.add_to_cart(db, buyer.id, products[0].id, 1)
+    stale = make_product(name="Stale")
+    cart_repository.add_to_cart(db, buyer.id, stale.id, 1)
+    user_id, items = buyer.id, _items(*((product.id, 2) for product in products))
+    statements.clear()
+
+    cart_repository.set_cart_items(db, user_id, items)
+
+    executed = [statement.split()[0] for statement in statements]
+    assert [statement for statement in executed if statement in ("INSERT", "UPDATE", "DELETE")] == ["DELETE", "INSERT"]
+    assert executed.count("SELECT") == 2  # the stock check and the returned cart
+    assert _cart(db, buyer.id) == {product.id: 2 for product in products}
+
+
+def test_merge_keeps_unlisted_items_and_removes_zero_quantities(db, buyer, make_product):
+    apple, pear, plum = make_product(name="Apple"), make_product(name="Pear"), make_product(name="Plum")
+    cart_repository.set_cart_items(db, buyer.id, _items((apple.id, 1), (pear.id, 1)))
+
+    cart_repository.set_cart_items(db, buyer.id, _items((pear.id, 0), (plum.id, 3), (plum.id, 1)), replace=False)
+
+    assert _cart(db, buyer.id) == {apple.id: 1, plum.id: 4}
+    assert db.query(CartItem).count() == 2
+
+
+def test_invalid_items_leave_the_cart_untouched(db, buyer, make_product):
+    apple = make_product(name="Apple", quantity=2)
+    cart_repository.set_cart_items(db, buyer.id, _items((apple.id, 1)))
+
+    with pytest.raises(ValueError, match="Insufficient stock"):
+        cart_repository.set_cart_items(db, buyer.id, _items((apple.id, 2), (apple.id, 1)))
+    with pytest.raises(ValueError, match="does not exist"):
+        cart_repository.set_cart_items(db, buyer.id, _items((apple.id, 1), (9999, 1)))
+
+    assert _cart(db, buyer.id) == {apple.id: 1}
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from app.utils.backplane import InMemoryBackplane, RedisBackplane
+from app.utils.connection_manager import ConnectionManager
+
+
+class FakeRedisServer:
+    """In-process stand-in for a Redis server's PUBLISH/SUBSCRIBE."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+
+    def deliver(self, channel, data):
+        for pubsub in list(self.subscribers[channel]):
+            pubsub.queue.put_nowait({"type": "message", "channel": channel.encode(), "data": data.encode()})
+        return len(self.subscribers[channel])
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.server.subscribers[channel].add(self)
+        self.queue.put_nowait({"type": "subscribe", "channel": channel.encode(), "data": 1})
+
+    async def unsubscribe(self, channel):
+        self.server.subscribers[channel].discard(self)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if ignore_subscribe_messages and message["type"] == "subscribe":
+            return None
+        return message
+
+    async def close(self):
+        for subscribers in self.server.subscribers.values():
+            subscribers.discard(self)
+
+
+class FakeRedis:
+    """Client side of the stand-in: the subset of ``redis.asyncio.Redis`` the backplane uses."""
+
+    def __init__(self, server):
+        self.server = server
+
+    async def publish(self, channel, data):
+        return self.server.deliver(channel, data)
+
+    def pubsub(self):
+        return FakePubSub(self.server)
+
+    async def close(self):
+        pass
+
+
+class FakeWebSocket:
+    def __init__(self, stalled=False, broken=False):
+        self.stalled = stalled
+        self.broken = broken
+        self.sent = []
+        self.sent_texts = []
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.broken:
+            raise ConnectionResetError("client went away")
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent_texts.append(text)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def _settle():
+    await asyncio.sleep(0.1)
+
+
+def test_broadcast_reaches_sockets_on_other_workers():
+    server = FakeRedisServer()
+
+    async def scenario():
+        worker_a = ConnectionManager(RedisBackplane(FakeRedis(server), poll_timeout=0.05))
+        worker_b = ConnectionManager(RedisBackplane(FakeRedis(server), poll_timeout=0.05))
+        buyer_socket, farmer_socket, other_chat_socket = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await worker_a.connect(1, buyer_socket)
+        await worker_b.connect(1, farmer_socket)
+        await worker_b.connect(2, other_chat_socket)
+
+        await worker_a.broadcast(1, {"id": 10, "content": "Fresh eggs today?"})
+        await _settle()
+
+        await worker_b.disconnect(1, farmer_socket)
+        await worker_a.broadcast(1, {"id": 11, "content": "Still there?"})
+        await _settle()
+
+        await worker_a.close()
+        await worker_b.close()
+        return buyer_socket, farmer_socket, other_chat_socket
+
+    buyer_socket, farmer_socket, other_chat_socket = asyncio.run(scenario())
+
+    assert [message["id"] for message in buyer_socket.sent] == [10, 11]
+    assert [message["id"] for message in farmer_socket.sent] == [10]
+    assert other_chat_socket.sent == []
+    # Worker B left chat 1 with its last socket there, so it no longer receives it
+    assert not server.subscribers["farmer_market:chat:1"]
+
+
+def test_in_memory_backplane_delivers_locally():
+    async def scenario():
+        manager = ConnectionManager(InMemoryBackplane())
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(7, first)
+        await manager.connect(7, second)
+        await manager.broadcast(7, {"content": "hello"})
+        await _settle()
+        await manager.disconnect(7, first)
+        await manager.disconnect(7, second)
+        await manager.broadcast(7, {"content": "nobody listening"})
+        return manager, first, second
+
+    manager, first, second = asyncio.run(scenario())
+
+    assert first.sent == [{"content": "hello"}] and first.sent == second.sent
+    assert manager.active_connections == {}
+    assert manager.backplane.handlers == {}
+
+
+def test_slow_and_broken_clients_do_not_hold_up_the_chat():
+    async def scenario():
+        manager = ConnectionManager(InMemoryBackplane(), queue_size=2, send_timeout=5)
+        healthy, stalled, broken = FakeWebSocket(), FakeWebSocket(stalled=True), FakeWebSocket(broken=True)
+        for websocket in (healthy, stalled, broken):
+            await manager.connect(3, websocket)
+        for message_id in range(5):
+            await manager.broadcast(3, {"id": message_id})
+            await _settle()
+        await _settle()
+        connected = set(manager.active_connections[3])
+        await manager.close()
+        return manager, connected, healthy, stalled
+
+    manager, connected, healthy, stalled = asyncio.run(scenario())
+
+    assert [message["id"] for message in healthy.sent] == [0, 1, 2, 3, 4]
+    assert connected == {healthy}
+    assert stalled.close_code == 1013
+    assert manager.evictions == 1
+
+
+def test_broadcast_to_thousands_of_sockets():
+    sockets_count, stalled_count, messages_count = 5000, 50, 10
+
+    async def scenario():
+        manager = ConnectionManager(InMemoryBackplane(), queue_size=5, send_timeout=30)
+        healthy = [FakeWebSocket() for _ in range(sockets_count - stalled_count)]
+        stalled = [FakeWebSocket(stalled=True) for _ in range(stalled_count)]
+        for websocket in healthy + stalled:
+            await manager.connect(1, websocket)
+
+        started = time.perf_counter()
+        for message_id in range(messages_count):
+            await manager.broadcast(1, {"id": message_id, "content": "Apples are in stock"})
+            await asyncio.sleep(0.001)
+        while any(len(websocket.sent) < messages_count for websocket in healthy):
+            assert time.perf_counter() - started < 10
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+        connected = len(manager.active_connections[1])
+        await manager.close()
+        return manager, healthy, elapsed, connected
+
+    manager, healthy, elapsed, connected = asyncio.run(scenario())
+
+    print(f"\n{sockets_count} sockets x {messages_count} messages delivered in {elapsed:.2f}s")
+    assert elapsed < 10
+    # Stalled clients fill their queues and are dropped instead of blocking everyone else
+    assert connected == sockets_count - stalled_count
+    assert manager.evictions == stalled_count
+    # Each message is serialized once and the same string is handed to every socket
+    assert all(websocket.sent_texts[0] is healthy[0].sent_texts[0] for websocket in healthy)
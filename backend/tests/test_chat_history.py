@@ -0,0 +1,178 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.chat import router as chat_router
+from app.database.database import get_db
+from app.database.models import Chat, Message, User
+from app.repositories.chat import ChatRepository
+from app.utils.ids import generate_id
+from app.utils.pagination import encode_cursor
+from app.utils.security import create_jwt_token
+
+chat_repository = ChatRepository()
+
+
+def _chat_with_messages(db, buyer, farmer, count):
+    """A chat between ``buyer`` and ``farmer`` with ``count`` alternating messages, and their IDs."""
+    chat = Chat(buyer_id=buyer.id, farmer_id=farmer.id)
+    db.add(chat)
+    db.commit()
+    messages = [
+        {
+            "id": generate_id(),
+            "chat_id": chat.id,
+            "sender_id": buyer.id if i % 2 == 0 else farmer.id,
+            "content": f"Message {i}",
+            "timestamp": datetime.now(timezone.utc),
+        }
+        for i in range(count)
+    ]
+    if messages:
+        chat_repository.save_messages(db, messages)
+    db.refresh(chat)
+    return chat, [message["id"] for message in messages]
+
+
+def _client(session_factory):
+    app = FastAPI()
+    app.include_router(chat_router, prefix="/chat")
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def test_history_is_paged_backwards_by_message_id(db, buyer, farmer):
+    chat, _ = _chat_with_messages(db, buyer, farmer, 120)
+
+    pages, before = [], None
+    while True:
+        messages, before = chat_repository.get_messages_page(db, chat.id, limit=50, before=before)
+        pages.append([message.content for message in messages])
+        if before is None:
+            break
+
+    assert [len(page) for page in pages] == [50, 50, 20]
+    assert pages[0][-1] == "Message 119" and pages[-1][0] == "Message 0"
+    assert [content for page in reversed(pages) for content in page] == [f"Message {i}" for i in range(120)]
+
+
+def test_chat_list_has_unread_counts_and_previews_from_one_query(db, buyer, farmer, statements):
+    read_chat, message_ids = _chat_with_messages(db, buyer, farmer, 6)
+    chat_repository.mark_read(db, read_chat, buyer.id, message_ids[2])
+    unread_chat, _ = _chat_with_messages(db, buyer, farmer, 3)
+    empty_chat, _ = _chat_with_messages(db, buyer, farmer, 0)
+    buyer_id = buyer.id
+    statements.clear()
+
+    chats = chat_repository.get_user_chats(db, buyer_id, "Buyer")
+
+    executed = list(statements)
+    assert executed == ["SELECT CHATS.ID"]
+    summaries = {chat.id: chat for chat in chats}
+    # Only the farmer's messages after the pointer count; the buyer's own never do
+    assert summaries[read_chat.id].unread_count == 2
+    assert summaries[read_chat.id].last_message.content == "Message 5"
+    assert summaries[unread_chat.id].unread_count == 1
+    assert summaries[empty_chat.id].unread_count == 0
+    assert summaries[empty_chat.id].last_message is None
+
+
+def test_read_pointer_only_moves_forward(db, buyer, farmer):
+    chat, message_ids = _chat_with_messages(db, buyer, farmer, 5)
+
+    assert chat_repository.mark_read(db, chat, farmer.id, message_ids[3]) == message_ids[3]
+    assert chat_repository.mark_read(db, chat, farmer.id, message_ids[1]) == message_ids[3]
+    assert chat_repository.mark_read(db, chat, farmer.id, message_ids[-1] + 1000) == message_ids[-1]
+    assert chat.buyer_last_read_message_id is None
+
+
+def test_history_and_read_endpoints(session_factory, db, buyer, farmer):
+    chat, message_ids = _chat_with_messages(db, buyer, farmer, 30)
+    outsider = User(fullname="Other Buyer", email="other@example.com", phone="+77000000003",
+                    password_hashed="not-a-real-hash", role="Buyer")
+    db.add(outsider)
+    db.commit()
+    chat_id, last_id = chat.id, message_ids[-1]
+    headers = {"Authorization": f"Bearer {create_jwt_token(farmer.id)}"}
+
+    with _client(session_factory) as client:
+        first = client.get(f"/chat/chats/{chat_id}/messages?limit=20", headers=headers)
+        second = client.get(
+            f"/chat/chats/{chat_id}/messages?limit=20&before={first.headers['X-Next-Cursor']}", headers=headers
+        )
+        unread = client.get("/chat/chats/", headers=headers).json()
+        read = client.post(f"/chat/chats/{chat_id}/read", headers=headers)
+        after_read = client.get("/chat/chats/", headers=headers).json()
+        forbidden = client.get(
+            f"/chat/chats/{chat_id}/messages",
+            headers={"Authorization": f"Bearer {create_jwt_token(outsider.id)}"},
+        )
+
+    assert first.status_code == 200
+    assert [message["content"] for message in first.json()] == [f"Message {i}" for i in range(10, 30)]
+    assert [message["content"] for message in second.json()] == [f"Message {i}" for i in range(10)]
+    assert "X-Next-Cursor" not in second.headers
+    assert unread[0]["unread_count"] == 15
+    assert read.json() == {"chat_id": chat_id, "last_read_message_id": last_id}
+    assert after_read[0]["unread_count"] == 0
+    assert after_read[0]["last_message"]["id"] == last_id
+    assert forbidden.status_code == 403
+
+
+@pytest.mark.parametrize("values", [
+    [],
+    [datetime(2024, 1, 1, tzinfo=timezone.utc)],
+    ["2024-01-01", 5],
+    [datetime(2024, 1, 1, tzinfo=timezone.utc), 5, 6],
+])
+def test_inbox_rejects_tampered_cursor(db, buyer, values):
+    with pytest.raises(HTTPException) as exc_info:
+        chat_repository.get_inbox(db, buyer.id, "Buyer", limit=3, cursor=encode_cursor("inbox", values))
+    assert exc_info.value.status_code == 400
+
+
+def test_inbox_is_sorted_by_activity_and_paged(db, buyer, farmer, statements):
+    chats = [_chat_with_messages(db, buyer, farmer, 2)[0] for _ in range(5)]
+    # New messages move the oldest chats back to the top
+    for chat in (chats[1], chats[0]):
+        chat_repository.create_message(db, chat.id, farmer.id, f"Ping {chat.id}")
+    buyer_id = buyer.id
+    statements.clear()
+
+    first, cursor = chat_repository.get_inbox(db, buyer_id, "Buyer", limit=3)
+    executed = list(statements)
+    second, last_cursor = chat_repository.get_inbox(db, buyer_id, "Buyer", limit=3, cursor=cursor)
+
+    assert executed == ["SELECT CHATS.ID"]
+    order = [entry.chat_id for entry in first + second]
+    assert order == [chats[0].id, chats[1].id, chats[4].id, chats[3].id, chats[2].id]
+    assert last_cursor is None
+    top = first[0]
+    assert top.counterpart.fullname == "Test Farmer" and top.counterpart.role == "Farmer"
+    assert top.last_message.content == f"Ping {chats[0].id}"
+    assert top.unread_count == 2
+    assert top.last_activity_at.replace(tzinfo=None) >= first[1].last_activity_at.replace(tzinfo=None)
+
+
+def test_replayed_batch_does_not_move_a_chat_back(db, buyer, farmer):
+    chat, message_ids = _chat_with_messages(db, buyer, farmer, 3)
+    older = {
+        "id": message_ids[0] - 1, "chat_id": chat.id, "sender_id": buyer.id,
+        "content": "Late", "timestamp": datetime(2020, 1, 1, tzinfo=timezone.utc),
+    }
+
+    chat_repository.save_messages(db, [older])
+    db.refresh(chat)
+
+    assert chat.last_message_id == message_ids[-1]
+    assert chat.last_activity_at.year != 2020
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.checkout import router as checkout_router
+from app.database.database import get_db
+from app.database.models import CartItem, Order, Product, StockReservation
+from app.utils.security import create_jwt_token
+from app.utils.stripe_client import (create_stripe_client,
+                                     create_stripe_http_client,
+                                     get_stripe_client)
+
+
+class StubStripe(ThreadingHTTPServer):
+    """A local stand-in for the Stripe API that replays scripted responses."""
+
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubStripeHandler)
+        self.responses = []
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubStripeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        self.server.requests.append({"path": self.path, "headers": dict(self.headers), "body": body})
+        status, delay = self.server.responses.pop(0) if self.server.responses else (200, 0)
+        time.sleep(delay)
+        if status == 200:
+            payload = {"id": "cs_test_1", "object": "checkout.session", "url": "https://checkout.test/cs_test_1"}
+        else:
+            payload = {"error": {"type": "api_error", "message": "Stripe is having a bad day"}}
+        content = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up waiting
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_stripe():
+    server = StubStripe()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def checkout_client(session_factory, stub_stripe):
+    app = FastAPI()
+    app.include_router(checkout_router, prefix="/checkout")
+    stripe_client = create_stripe_client(
+        api_key="sk_test_stub",
+        api_base=stub_stripe.url,
+        http_client=create_stripe_http_client(connect_timeout=1, read_timeout=0.5),
+        max_network_retries=1,
+    )
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_stripe_client] = lambda: stripe_client
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def cart(db, buyer, make_product):
+    product = make_product(name="Honey", description="Wildflower honey", price=10.0, quantity=5)
+    db.add(CartItem(user_id=buyer.id, product_id=product.id, quantity=2))
+    db.commit()
+    return product
+
+
+def _checkout(client, buyer):
+    return client.post(
+        "/checkout/create-checkout-session",
+        headers={"Authorization": f"Bearer {create_jwt_token(buyer.id)}"},
+    )
+
+
+def test_checkout_creates_session_with_order_idempotency_key(checkout_client, stub_stripe, db, buyer, cart):
+    response = _checkout(checkout_client, buyer)
+
+    assert response.status_code == 200
+    assert response.json() == {"checkout_url": "https://checkout.test/cs_test_1"}
+    order = db.query(Order).one()
+    [request] = stub_stripe.requests
+    assert request["path"] == "/v1/checkout/sessions"
+    assert request["headers"]["Idempotency-Key"] == f"checkout-order-{order.id}"
+    assert db.query(StockReservation).one().checkout_session_id == "cs_test_1"
+
+
+def test_checkout_retries_server_errors_with_the_same_key(checkout_client, stub_stripe, db, buyer, cart):
+    stub_stripe.responses = [(500, 0)]
+
+    response = _checkout(checkout_client, buyer)
+
+    assert response.status_code == 200
+    keys = [request["headers"]["Idempotency-Key"] for request in stub_stripe.requests]
+    assert len(keys) == 2 and len(set(keys)) == 1
+
+
+def test_slow_stripe_times_out_and_releases_the_stock(checkout_client, stub_stripe, db, buyer, cart):
+    stub_stripe.responses = [(200, 2), (200, 2)]
+
+    started = time.monotonic()
+    response = _checkout(checkout_client, buyer)
+
+    assert response.status_code == 502
+    assert time.monotonic() - started < 4
+    assert len(stub_stripe.requests) == 2
+    db.expire_all()
+    assert db.get(Product, cart.id).quantity == 5
+    assert db.query(Order).one().status == "Cancelled"
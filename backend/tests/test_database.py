@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import text
+
+from app.database.database import create_async_db_engine, create_db_engine
+
+
+def test_sqlite_engine_uses_wal_and_busy_timeout(engine):
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() > 0
+    assert engine.pool.size() > 1
+
+
+def test_memory_sqlite_shares_one_connection():
+    memory_engine = create_db_engine("sqlite://")
+    with memory_engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (id INTEGER)"))
+    with memory_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM t")).scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_async_engine_swaps_in_async_driver(tmp_path):
+    async_engine = create_async_db_engine(f"sqlite:///{tmp_path / 'async.db'}")
+    assert async_engine.url.drivername == "sqlite+aiosqlite"
+    async with async_engine.connect() as connection:
+        result = await connection.execute(text("PRAGMA journal_mode"))
+        assert result.scalar() == "wal"
+    await async_engine.dispose()
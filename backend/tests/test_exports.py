@@ -0,0 +1,147 @@
+import csv
+import gzip
+import io
+import json
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app.api import admin as admin_api
+from app.database.database import get_db
+from app.database.models import FarmerProfile, User
+from app.repositories.farmers import FarmersRepository
+from app.utils.exports import ExportFormat, export_chunks
+
+farmers_repository = FarmersRepository()
+
+
+@pytest.fixture
+def client(session_factory):
+    app = FastAPI()
+    app.include_router(admin_api.router)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[admin_api.admin_required] = lambda: None
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _add_farmers(db, count, first_id=100):
+    db.execute(insert(User), [
+        {"id": first_id + i, "fullname": f"Farmer {i}", "email": f"farmer{first_id + i}@farms.example.com",
+         "phone": f"+7702{first_id + i:07d}", "password_hashed": "not-a-real-hash", "role": "Farmer"}
+        for i in range(count)
+    ])
+    db.execute(insert(FarmerProfile), [
+        {"farm_name": f"Farm {i}", "location": "Shymkent, South", "farm_size": 1.5 + i, "is_approved": "pending",
+         "user_id": first_id + i}
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def test_users_are_exported_as_ndjson(client, farmer, buyer):
+    response = client.get("/admin/export/users")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="users.ndjson"'
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"id": farmer.id, "fullname": "Test Farmer", "email": "farmer@example.com", "phone": "+77000000001",
+         "role": "Farmer", "is_active": True},
+        {"id": buyer.id, "fullname": "Test Buyer", "email": "buyer@example.com", "phone": "+77000000002",
+         "role": "Buyer", "is_active": True},
+    ]
+
+
+def test_farmers_and_buyers_are_exported_as_csv(client, db, farmer, buyer):
+    _add_farmers(db, 2)
+    db.add(User(fullname="No Profile", email="np@example.com", phone="+77000000009",
+                password_hashed="x", role="Farmer"))
+    db.commit()
+
+    farmers = list(csv.reader(io.StringIO(client.get("/admin/export/farmers?format=csv").text)))
+    buyers = client.get("/admin/export/buyers", params={"format": "csv"})
+
+    assert farmers[0] == ["id", "fullname", "email", "phone", "farm_name", "location", "farm_size", "is_approved"]
+    assert farmers[1][4:] == ["Test Farm", "Astana", "10.0", "approved"]
+    assert farmers[2][4:] == ["Farm 0", "Shymkent, South", "1.5", "pending"]
+    assert farmers[-1][1:] == ["No Profile", "np@example.com", "+77000000009", "", "", "", ""]
+    assert len(farmers) == 5
+    assert buyers.headers["content-type"] == "text/csv; charset=utf-8"
+    assert buyers.text.splitlines() == [
+        "id,fullname,email,phone,delivery_address",
+        f"{buyer.id},Test Buyer,buyer@example.com,+77000000002,1 Test Street",
+    ]
+    assert client.get("/admin/export/buyers?format=xml").status_code == 422
+
+
+def test_csv_cells_cannot_run_as_formulas(client, db, buyer):
+    db.add(User(fullname="=HYPERLINK(\"http://evil.example\")", email="f@example.com", phone="+77000000010",
+                password_hashed="x", role="Farmer",
+                farmer_profile=FarmerProfile(farm_name="@SUM(A1)", location="-1+2", farm_size=-3.0,
+                                             is_approved="pending")))
+    buyer.buyer_profile.delivery_address = "+cmd|' /C calc'!A0"
+    db.commit()
+
+    farmer_row = list(csv.reader(io.StringIO(client.get("/admin/export/farmers?format=csv").text)))[1]
+    buyer_row = list(csv.reader(io.StringIO(client.get("/admin/export/buyers?format=csv").text)))[1]
+    ndjson = json.loads(client.get("/admin/export/buyers").text)
+
+    assert farmer_row[1:] == [
+        "'=HYPERLINK(\"http://evil.example\")", "f@example.com", "+77000000010",
+        "'@SUM(A1)", "'-1+2", "-3.0", "pending",
+    ]
+    assert buyer_row[-1] == "'+cmd|' /C calc'!A0"
+    # JSON is not opened by spreadsheets and keeps values as they are
+    assert ndjson["delivery_address"] == "+cmd|' /C calc'!A0"
+
+
+def test_exports_are_gzipped_on_the_fly(client, db, farmer):
+    _add_farmers(db, 500)
+
+    compressed = client.get("/admin/export/farmers", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/admin/export/farmers", headers={"Accept-Encoding": "identity"})
+    with client.stream("GET", "/admin/export/farmers", headers={"Accept-Encoding": "gzip"}) as streamed:
+        raw = b"".join(streamed.iter_raw())
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in identity.headers
+    assert compressed.headers["vary"] == identity.headers["vary"] == "Accept-Encoding"
+    assert compressed.content == identity.content
+    assert len(identity.text.splitlines()) == 501
+    assert gzip.decompress(raw) == identity.content
+    assert len(raw) < len(identity.content) / 4
+
+
+def _peak_memory(engine, export_format):
+    tracemalloc.start()
+    try:
+        size = sum(len(chunk) for chunk in export_chunks(engine, farmers_repository.export_farmers, export_format, 200))
+        return size, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("export_format", list(ExportFormat))
+def test_exports_stream_in_batches_with_flat_memory(engine, db, export_format):
+    _add_farmers(db, 1000)
+    chunks = list(export_chunks(engine, farmers_repository.export_farmers, export_format, 200))
+    small = _peak_memory(engine, export_format)
+    _add_farmers(db, 9000, first_id=10_000)
+    large = _peak_memory(engine, export_format)
+
+    assert len(chunks) == 5
+    assert large[0] > 9 * small[0]
+    # Ten times the rows, about the same memory: only one batch is held at a time
+    assert large[1] < 2 * small[1], (small, large)
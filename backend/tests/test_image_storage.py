@@ -0,0 +1,189 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import event
+
+from app.api import products as products_api
+from app.database.database import get_db
+from app.database.models import ImageBlob, ProductImage
+from app.repositories.images import ImageBlobsRepository, blob_keys
+from app.repositories.products import ProductsRepository
+from app.utils import file_upload
+from app.utils.storage import IMMUTABLE_CACHE_CONTROL, S3Storage
+from app.utils.security import create_jwt_token
+
+image_blobs_repository = ImageBlobsRepository()
+products_repository = ProductsRepository()
+
+
+class FakeClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """The part of boto3's S3 client S3Storage uses, keeping objects in memory."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType, CacheControl):
+        self.objects[(Bucket, Key)] = {"body": Body.read(), "content_type": ContentType, "cache_control": CacheControl}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeClientError("404")
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def _jpeg(color=(200, 150, 0)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(session_factory, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = FastAPI()
+    app.include_router(products_api.router, prefix="/products")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _create(client, farmer, *images):
+    response = client.post(
+        "/products/",
+        headers={"Authorization": f"Bearer {create_jwt_token(farmer.id)}"},
+        data={"name": "Honey", "quantity": "3", "category": "Fruits", "price": "5.0"},
+        files=[("images", (f"photo{i}.jpg", image, "image/jpeg")) for i, image in enumerate(images)],
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def _collect(db, storage):
+    db.expire_all()
+    return image_blobs_repository.collect_garbage(db, storage, grace_seconds=0)
+
+
+def test_identical_images_are_stored_once_and_collected_with_their_last_product(client, db, farmer, tmp_path):
+    photo = _jpeg()
+    first = _create(client, farmer, photo, photo)
+    second = _create(client, farmer, photo, _jpeg((0, 80, 200)))
+    stored = tmp_path / "uploaded_images"
+
+    assert len(os.listdir(stored)) == 12  # two blobs, three variants, two encodings
+    assert first["images"][0]["variants"] == second["images"][0]["variants"]
+    blob = db.get(ImageBlob, db.query(ProductImage.blob_sha256).filter_by(product_id=first["id"]).limit(1).scalar())
+    assert blob.ref_count == 3
+
+    products_repository.delete_product(db, first["id"])
+    assert _collect(db, file_upload.image_storage) == 0
+    assert db.get(ImageBlob, blob.sha256).ref_count == 1
+
+    products_repository.delete_product(db, second["id"])
+    assert _collect(db, file_upload.image_storage) == 2
+    assert os.listdir(stored) == []
+    assert db.query(ImageBlob).count() == 0
+
+
+def test_unreferenced_blobs_are_kept_for_the_grace_period(client, db, farmer):
+    product = _create(client, farmer, _jpeg())
+    products_repository.delete_product(db, product["id"])
+
+    assert image_blobs_repository.collect_garbage(db, file_upload.image_storage, grace_seconds=3600) == 0
+
+    # An upload finding the blob restarts its grace period
+    blob = db.query(ImageBlob).one()
+    blob.released_at = datetime.now(timezone.utc) - timedelta(hours=2)
+    db.commit()
+    image_blobs_repository.claim_existing(db, [blob.sha256])
+    assert image_blobs_repository.collect_garbage(db, file_upload.image_storage, grace_seconds=3600) == 0
+
+    _create(client, farmer, _jpeg())
+    db.expire_all()
+    assert db.query(ImageBlob).one().ref_count == 1
+    assert db.query(ImageBlob).one().released_at is None
+
+
+def test_blob_collected_while_being_claimed_is_uploaded_again(client, db, engine, farmer, tmp_path):
+    product = _create(client, farmer, _jpeg())
+    products_repository.delete_product(db, product["id"])
+    keys = blob_keys(db.query(ImageBlob).one().variants)
+
+    collected = []
+
+    def collect_first(conn, cursor, statement, parameters, context, executemany):
+        # The garbage collector deletes the blob between the upload's query and its update
+        if statement.startswith("UPDATE image_blobs SET released_at") and not collected:
+            collected.append(statement)
+            cursor.execute("DELETE FROM image_blobs")
+            for key in keys:
+                file_upload.image_storage.delete(key)
+
+    event.listen(engine, "before_cursor_execute", collect_first)
+    try:
+        _create(client, farmer, _jpeg())
+    finally:
+        event.remove(engine, "before_cursor_execute", collect_first)
+
+    db.expire_all()
+    assert collected
+    assert db.query(ImageBlob).one().ref_count == 1
+    assert all(file_upload.image_storage.exists(key) for key in keys)
+
+
+def test_images_of_a_product_that_failed_to_save_are_collected(client, db, farmer, tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(products_api.products_repository, "create_product", fail)
+    with pytest.raises(RuntimeError):
+        _create(client, farmer, _jpeg())
+
+    blob = db.query(ImageBlob).one()
+    assert blob.ref_count == 0
+    assert _collect(db, file_upload.image_storage) == 1
+    assert os.listdir(tmp_path / "uploaded_images") == []
+
+
+def test_s3_storage_serves_images_from_the_bucket(client, db, farmer, monkeypatch):
+    s3 = FakeS3Client()
+    storage = S3Storage(s3, "market-images", "products/", "https://cdn.example.com")
+    monkeypatch.setattr(file_upload, "image_storage", storage)
+
+    product = _create(client, farmer, _jpeg())
+
+    image = product["images"][0]
+    sha256 = db.query(ImageBlob.sha256).scalar()
+    assert image["image_url"] == f"https://cdn.example.com/products/{sha256}_full.jpg"
+    assert image["variants"]["thumbnail"]["webp"] == f"https://cdn.example.com/products/{sha256}_thumbnail.webp"
+    assert len(s3.objects) == 6
+    webp = s3.objects[("market-images", f"products/{sha256}_thumbnail.webp")]
+    assert webp["content_type"] == "image/webp"
+    assert webp["cache_control"] == IMMUTABLE_CACHE_CONTROL
+    assert storage.exists(f"{sha256}_full.jpg")
+
+    products_repository.delete_product(db, product["id"])
+    assert _collect(db, storage) == 1
+    assert s3.objects == {}
+    assert not storage.exists(f"{sha256}_full.jpg")
@@ -0,0 +1,212 @@
+"""
+The list endpoints serialize column rows with orjson instead of building a Pydantic
+object per row and validating it again against the response model. The endpoints
+below are the previous implementations, kept as the reference the new responses
+must match and as the baseline of the benchmark.
+"""
+import time
+
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
+
+from app.api import admin as admin_api
+from app.api.orders import router as orders_router
+from app.database.database import get_db
+from app.database.models import (FarmerProfile, Order, OrderItem, Product,
+                                 User)
+from app.schemas.orders import (FarmerPurchasedProducts, OrderedProductDetail,
+                                OrderInfo, ProductInfo, PurchasedProductInfo)
+from app.schemas.users import FarmerProfileInfo, ProfileInfo
+from app.utils.security import create_jwt_token
+
+BENCHMARK_ROWS = 10_000
+
+legacy_router = APIRouter()
+
+
+@legacy_router.get("/admin/farmers", response_model=list[FarmerProfileInfo])
+def legacy_get_all_farmers(db: Session = Depends(get_db)):
+    farmers = db.query(User).filter(User.role == "Farmer").options(joinedload(User.farmer_profile)).all()
+    return [
+        FarmerProfileInfo(
+            id=farmer.id,
+            fullname=farmer.fullname,
+            email=farmer.email,
+            phone=farmer.phone,
+            role=farmer.role,
+            profile=ProfileInfo(
+                farm_name=farmer.farmer_profile.farm_name,
+                location=farmer.farmer_profile.location,
+                farm_size=farmer.farmer_profile.farm_size,
+                is_approved=farmer.farmer_profile.is_approved,
+                user_id=farmer.farmer_profile.user_id,
+            )
+            if farmer.farmer_profile
+            else None,
+        )
+        for farmer in farmers
+    ]
+
+
+@legacy_router.get("/orders/{order_id}", response_model=OrderInfo)
+def legacy_get_order(order_id: int, db: Session = Depends(get_db)):
+    order = (
+        db.query(Order)
+        .options(joinedload(Order.items).joinedload(OrderItem.product))
+        .filter(Order.id == order_id)
+        .first()
+    )
+    return OrderInfo(
+        id=order.id,
+        total_price=order.total_price,
+        status=order.status,
+        created_at=order.created_at,
+        buyer_id=order.buyer_id,
+        items=[
+            OrderedProductDetail(
+                product=ProductInfo(
+                    id=item.product.id,
+                    name=item.product.name,
+                    description=item.product.description,
+                    category=item.product.category,
+                    price=item.product.price,
+                ),
+                quantity=item.quantity,
+            )
+            for item in order.items
+        ],
+    )
+
+
+@legacy_router.get("/farmers/{farmer_id}/purchases", response_model=FarmerPurchasedProducts)
+def legacy_get_purchases(farmer_id: int, db: Session = Depends(get_db)):
+    order_items = (
+        db.query(OrderItem).join(Product).join(Order)
+        .filter(Product.farmer_id == farmer_id)
+        .order_by(OrderItem.id)  # the new query orders by item; this one had no defined order
+        .all()
+    )
+    return FarmerPurchasedProducts(purchases=[
+        PurchasedProductInfo(
+            product=ProductInfo(
+                id=item.product.id,
+                name=item.product.name,
+                description=item.product.description,
+                category=item.product.category,
+                price=item.product.price,
+            ),
+            quantity=item.quantity,
+            purchase_time=item.order.created_at,
+        )
+        for item in order_items
+    ])
+
+
+@pytest.fixture
+def client(session_factory):
+    app = FastAPI()
+    app.include_router(admin_api.router)
+    app.include_router(orders_router, prefix="/orders")
+    app.include_router(legacy_router, prefix="/legacy")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[admin_api.admin_required] = lambda: None
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _add_farmers(db, count):
+    first_id = (db.query(User.id).order_by(User.id.desc()).limit(1).scalar() or 0) + 1
+    db.execute(insert(User), [
+        {
+            "id": first_id + i,
+            "fullname": f"Farmer {i}",
+            "email": f"farmer{i}@farms.example.com",
+            "phone": f"+7701{i:07d}",
+            "password_hashed": "not-a-real-hash",
+            "role": "Farmer",
+        }
+        for i in range(count)
+    ])
+    db.execute(insert(FarmerProfile), [
+        {"farm_name": f"Farm {i}", "location": "Almaty", "farm_size": 2.5 + i, "is_approved": "pending",
+         "user_id": first_id + i}
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def _add_order(db, buyer, products, count):
+    order = Order(buyer_id=buyer.buyer_profile.id, total_price=12.5, status="Paid")
+    db.add(order)
+    db.flush()
+    if count:
+        db.execute(insert(OrderItem), [
+            {"order_id": order.id, "product_id": products[i % len(products)].id, "quantity": i % 7 + 1}
+            for i in range(count)
+        ])
+    db.commit()
+    return order
+
+
+def _urls(farmer, order):
+    """(new, previous) URL pairs of the same responses."""
+    return [
+        ("/admin/farmers", "/legacy/admin/farmers"),
+        (f"/orders/{order.id}", f"/legacy/orders/{order.id}"),
+        ("/orders/farmer/orders", f"/legacy/farmers/{farmer.farmer_profile.id}/purchases"),
+    ]
+
+
+def test_responses_match_the_validated_models(client, db, farmer, buyer, make_product):
+    db.add(User(fullname="No Profile", email="np@example.com", phone="+77000000009",
+                password_hashed="x", role="Farmer"))
+    db.commit()
+    _add_farmers(db, 3)
+    products = [make_product(name="Apple", description="Red"), make_product(name="Milk", category="Dairy",
+                                                                            description="Fresh", price=2.25)]
+    order = _add_order(db, buyer, products, 5)
+    empty_order = _add_order(db, buyer, products, 0)
+    headers = {"Authorization": f"Bearer {create_jwt_token(farmer.id)}"}
+
+    for new, previous in _urls(farmer, order) + [(f"/orders/{empty_order.id}", f"/legacy/orders/{empty_order.id}")]:
+        response = client.get(new, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == client.get(previous).json(), new
+
+    assert client.get("/orders/999999", headers=headers).status_code == 404
+
+
+def _rows_per_second(client, url, headers, rows):
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        best = min(best, time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return rows / best
+
+
+def test_ten_thousand_row_responses_are_serialized_faster(client, db, farmer, buyer, make_product):
+    _add_farmers(db, BENCHMARK_ROWS - 1)
+    products = [make_product(name=f"Product {i}", description="Fresh") for i in range(50)]
+    order = _add_order(db, buyer, products, BENCHMARK_ROWS)
+    headers = {"Authorization": f"Bearer {create_jwt_token(farmer.id)}"}
+
+    print()
+    for new, previous in _urls(farmer, order):
+        before = _rows_per_second(client, previous, headers, BENCHMARK_ROWS)
+        after = _rows_per_second(client, new, headers, BENCHMARK_ROWS)
+        print(f"{new}: {before:,.0f} -> {after:,.0f} rows/s ({after / before:.1f}x)")
+        assert after > before * 1.5, (new, before, after)
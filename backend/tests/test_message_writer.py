@@ -0,0 +1,223 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.api import chat as chat_api
+from app.database.database import get_session_factory
+from app.database.models import Chat, Message
+from app.repositories.chat import MessageIdCollisionError
+from app.utils import ids as ids_module
+from app.utils import message_writer as message_writer_module
+from app.utils.ids import (MAX_WORKER_ID, SEQUENCE_BITS, NoWorkerIdError,
+                           SnowflakeGenerator, generate_id)
+from app.utils.message_writer import MessageWriter
+from app.utils.security import create_jwt_token
+
+
+def _chat(db, buyer, farmer):
+    chat = Chat(buyer_id=buyer.id, farmer_id=farmer.id)
+    db.add(chat)
+    db.commit()
+    return chat.id
+
+
+def _message(chat_id, sender_id, content):
+    return {
+        "id": generate_id(),
+        "chat_id": chat_id,
+        "sender_id": sender_id,
+        "content": content,
+        "timestamp": datetime.now(timezone.utc),
+    }
+
+
+def test_generated_ids_are_unique_ordered_and_js_safe():
+    now = [1760000000.0]
+    generator = SnowflakeGenerator(worker_id=5, clock=lambda: now[0])
+    ids = [generator.next_id() for _ in range(200)]  # more than one millisecond's sequence
+    now[0] -= 1  # the clock steps back
+    ids += [generator.next_id() for _ in range(10)]
+
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert max(ids) < 2 ** 53
+    other_worker = SnowflakeGenerator(worker_id=6, clock=lambda: 1760000000.0)
+    assert not set(ids) & {other_worker.next_id() for _ in range(200)}
+
+
+def test_leased_worker_id_stops_generating_when_the_lease_runs_out():
+    elapsed = [0.0]
+    generator = SnowflakeGenerator(monotonic=lambda: elapsed[0])
+    with pytest.raises(RuntimeError):
+        generator.next_id()
+
+    generator.assign(7, valid_for=10)
+    generator.next_id()
+    elapsed[0] = 10
+    with pytest.raises(RuntimeError):
+        generator.next_id()
+    generator.assign(7, valid_for=10)  # renewed
+    generator.next_id()
+
+
+def test_generating_an_id_waits_for_the_lease():
+    generator = SnowflakeGenerator()
+    with pytest.raises(NoWorkerIdError):
+        generator.next_id(timeout=0.05)
+
+    threading.Timer(0.1, generator.assign, args=(3,), kwargs={"valid_for": 10}).start()
+    started = time.monotonic()
+    generator.next_id(timeout=5)
+
+    assert 0.05 < time.monotonic() - started < 5
+    assert generator.worker_id == 3
+
+
+def test_messages_are_saved_in_batches(session_factory, db, buyer, farmer, statements):
+    chat_id, buyer_id = _chat(db, buyer, farmer), buyer.id
+    writer = MessageWriter(session_factory, batch_size=100, interval_ms=10000)
+    messages = [_message(chat_id, buyer_id, f"Message {i}") for i in range(250)]
+    statements.clear()
+
+    async def scenario():
+        for message in messages:
+            await writer.submit(message)
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    assert statements.count("INSERT INTO") == 3
+    saved = db.query(Message).order_by(Message.id).all()
+    assert [message.content for message in saved] == [message["content"] for message in messages]
+    assert writer.saved == 250 and writer.pending == 0
+
+
+def test_failed_batch_is_replayed_without_duplicates(session_factory, db, buyer, farmer, monkeypatch):
+    chat_id, buyer_id = _chat(db, buyer, farmer), buyer.id
+    save_messages = message_writer_module.chat_repository.save_messages
+    calls = []
+
+    def flaky_save_messages(session, batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            # Committed, but the connection dropped before the result came back
+            save_messages(session, batch)
+            raise OperationalError("COMMIT", {}, Exception("connection lost"))
+        if len(calls) == 2:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        save_messages(session, batch)
+
+    monkeypatch.setattr(message_writer_module.chat_repository, "save_messages", flaky_save_messages)
+    writer = MessageWriter(session_factory, batch_size=10, interval_ms=1)
+
+    async def scenario():
+        for i in range(5):
+            await writer.submit(_message(chat_id, buyer_id, f"Message {i}"))
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    assert calls == [5, 5, 5]
+    assert writer.failures == 2
+    assert [message.content for message in db.query(Message).order_by(Message.id)] == [
+        f"Message {i}" for i in range(5)
+    ]
+
+
+def test_message_that_cannot_be_saved_does_not_block_others(session_factory, db, buyer, farmer):
+    chat_id, buyer_id = _chat(db, buyer, farmer), buyer.id
+    writer = MessageWriter(session_factory, batch_size=10, interval_ms=1)
+
+    async def scenario():
+        await writer.submit(_message(chat_id, buyer_id, "First"))
+        await writer.submit(_message(chat_id, buyer_id, None))
+        await writer.submit(_message(chat_id, buyer_id, "Second"))
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    assert [message.content for message in db.query(Message).order_by(Message.id)] == ["First", "Second"]
+    assert writer.saved == 2 and writer.dropped == 1
+
+
+def test_colliding_message_ids_keep_both_messages(session_factory, db, buyer, farmer):
+    chat_id, buyer_id, farmer_id = _chat(db, buyer, farmer), buyer.id, farmer.id
+    first = _message(chat_id, buyer_id, "From worker A")
+    # Worker B was given the same worker ID and generated the same ID
+    second = {**_message(chat_id, farmer_id, "From worker B"), "id": first["id"]}
+    writer = MessageWriter(session_factory, batch_size=10, interval_ms=1)
+
+    async def scenario():
+        await writer.submit(first)
+        await writer.flush()
+        await writer.submit(dict(first))  # a replay is still skipped
+        await writer.submit(second)
+        await writer.flush()
+        await writer.close()
+
+    message_writer_module.chat_repository.save_messages(db, [dict(first)])
+    with pytest.raises(MessageIdCollisionError) as exc_info:
+        message_writer_module.chat_repository.save_messages(db, [dict(second)])
+    asyncio.run(scenario())
+
+    assert [message["content"] for message in exc_info.value.messages] == ["From worker B"]
+    saved = db.query(Message).order_by(Message.id).all()
+    assert [(message.id == first["id"], message.content) for message in saved] == [
+        (True, "From worker A"), (False, "From worker B"),
+    ]
+    assert writer.saved == 3 and writer.dropped == 0
+
+
+def test_websocket_broadcasts_before_the_message_is_saved(session_factory, db, buyer, farmer, monkeypatch):
+    chat_id = _chat(db, buyer, farmer)
+    token = create_jwt_token(buyer.id)
+    monkeypatch.setattr(chat_api, "message_writer", MessageWriter(session_factory, interval_ms=20))
+    app = FastAPI()
+    app.include_router(chat_api.router, prefix="/chat")
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/chat/ws/chat/{chat_id}?token={token}") as websocket:
+            websocket.send_json({"content": "Do you have honey?"})
+            message = websocket.receive_json()
+
+            deadline = time.monotonic() + 5
+            while not db.get(Message, message["id"]) and time.monotonic() < deadline:
+                db.expire_all()
+                time.sleep(0.02)
+
+    assert message["content"] == "Do you have honey?"
+    assert message["sender_id"] == buyer.id
+    saved = db.get(Message, message["id"])
+    assert saved is not None and saved.content == "Do you have honey?"
+
+
+def test_websocket_waits_for_a_worker_id_instead_of_closing(session_factory, db, buyer, farmer, monkeypatch):
+    chat_id = _chat(db, buyer, farmer)
+    token = create_jwt_token(buyer.id)
+    # Not leased yet, as right after startup or while the database is unreachable
+    generator = SnowflakeGenerator()
+    monkeypatch.setattr(ids_module, "id_generator", generator)
+    monkeypatch.setattr(chat_api, "message_writer", MessageWriter(session_factory, interval_ms=20))
+    app = FastAPI()
+    app.include_router(chat_api.router, prefix="/chat")
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/chat/ws/chat/{chat_id}?token={token}") as websocket:
+            websocket.send_json({"content": "Anyone there?"})
+            threading.Timer(0.2, generator.assign, args=(9,), kwargs={"valid_for": 60}).start()
+            first = websocket.receive_json()
+            websocket.send_json({"content": "Still here"})
+            second = websocket.receive_json()
+
+    assert [first["content"], second["content"]] == ["Anyone there?", "Still here"]
+    assert (first["id"] >> SEQUENCE_BITS) & MAX_WORKER_ID == 9
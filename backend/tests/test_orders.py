@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from app.database.models import Order, OrderItem, Product
+from app.repositories.orders import OrdersRepository
+from app.schemas.orders import OrderCreate
+
+orders_repository = OrdersRepository()
+
+
+def _order_data(*items):
+    return OrderCreate(
+        total_price=1.0,
+        status="Pending",
+        items=[{"product_id": product_id, "quantity": quantity} for product_id, quantity in items],
+    )
+
+
+def test_failed_order_leaves_no_order_and_no_stock_change(db, buyer, make_product):
+    apple = make_product(name="Apple", quantity=5)
+    pear = make_product(name="Pear", quantity=1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        orders_repository.create_order(db, _order_data((apple.id, 2), (pear.id, 3)), buyer.buyer_profile.id)
+
+    assert exc_info.value.status_code == 400
+    assert db.query(Order).count() == 0
+    db.refresh(apple)
+    assert apple.quantity == 5
+
+
+def test_repeated_product_lines_are_reserved_together(db, buyer, make_product):
+    apple = make_product(name="Apple", quantity=3)
+
+    with pytest.raises(HTTPException):
+        orders_repository.create_order(db, _order_data((apple.id, 2), (apple.id, 2)), buyer.buyer_profile.id)
+
+    order = orders_repository.create_order(db, _order_data((apple.id, 1), (apple.id, 2)), buyer.buyer_profile.id)
+    db.refresh(apple)
+    assert apple.quantity == 0
+    assert len(order.items) == 2
+
+
+def test_parallel_checkouts_never_oversell(session_factory, db, buyer, make_product):
+    stock, checkouts = 50, 300
+    product = make_product(quantity=stock)
+    buyer_id = buyer.buyer_profile.id
+
+    def checkout(_):
+        session = session_factory()
+        try:
+            orders_repository.create_order(session, _order_data((product.id, 1)), buyer_id)
+            return True
+        except HTTPException as e:
+            assert e.status_code == 400, e.detail
+            return False
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(checkout, range(checkouts)))
+
+    db.expire_all()
+    assert results.count(True) == stock
+    assert db.get(Product, product.id).quantity == 0
+    assert db.query(Order).count() == stock
+    assert db.query(func.sum(OrderItem.quantity)).scalar() == stock
@@ -0,0 +1,113 @@
+import asyncio
+import statistics
+import time
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+from app.api.auth import router as auth_router
+from app.database.database import get_db
+from app.database.models import User
+from app.utils.passwords import PasswordService
+
+
+def _context(rounds):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+async def _typical_loop_lag(workload, interval=0.005):
+    """Run ``workload`` while a ticker measures how late the event loop wakes it up.
+
+    Returns the median lag: a single scheduler hiccup on a busy runner should not
+    decide whether the loop was blocked.
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        await workload()
+    finally:
+        done.set()
+        await ticker_task
+    return statistics.median(lags)
+
+
+def test_login_storm_keeps_event_loop_latency_flat():
+    context = _context(10)
+    hashed = context.hash("secret")
+    service = PasswordService(context, max_workers=4, max_pending=64)
+    logins = 16
+
+    async def inline_storm():
+        for _ in range(logins):
+            context.verify("secret", hashed)
+            await asyncio.sleep(0)
+
+    async def pooled_storm():
+        results = await asyncio.gather(*(service.verify("secret", hashed) for _ in range(logins)))
+        assert all(results)
+
+    try:
+        blocked_lag = asyncio.run(_typical_loop_lag(inline_storm))
+        pooled_lag = asyncio.run(_typical_loop_lag(pooled_storm))
+    finally:
+        service.shutdown()
+
+    # Each inline verification stalls the loop for a whole bcrypt round; pooled ones do not
+    assert blocked_lag > 0.02
+    assert pooled_lag < 0.02
+
+
+def test_saturated_pool_rejects_with_503():
+    context = _context(10)
+    hashed = context.hash("secret")
+    service = PasswordService(context, max_workers=1, max_pending=2)
+
+    async def storm():
+        return await asyncio.gather(
+            *(service.verify("secret", hashed) for _ in range(3)), return_exceptions=True
+        )
+
+    try:
+        results = asyncio.run(storm())
+    finally:
+        service.shutdown()
+
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert [result.status_code for result in rejected] == [503]
+    assert results.count(True) == 2
+    assert service.pending == 0
+
+
+def test_outdated_hash_is_replaced_on_login(session_factory, db, buyer):
+    buyer.password_hashed = _context(4).hash("secret")
+    db.commit()
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        wrong = client.post("/auth/users/login", json={"email": buyer.email, "password": "wrong"})
+        response = client.post("/auth/users/login", json={"email": buyer.email, "password": "secret"})
+
+    assert wrong.status_code == 401
+    assert response.status_code == 200, response.text
+    db.expire_all()
+    new_hash = db.get(User, buyer.id).password_hashed
+    assert not new_hash.startswith("$2b$04$")
+    assert _context(12).verify("secret", new_hash)
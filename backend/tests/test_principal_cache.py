@@ -0,0 +1,74 @@
+import pytest
+from fastapi import HTTPException
+
+from app.repositories.farmers import FarmersRepository
+from app.repositories.users import UsersRepository
+from app.schemas.users import UserUpdate
+from app.utils.cache import TTLCache, principal_cache
+from app.utils.security import create_jwt_token, load_principal
+
+farmers_repository = FarmersRepository()
+users_repository = UsersRepository()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl_seconds=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats() | {"hit_ratio": None} == {
+        "size": 1, "maxsize": 2, "ttl_seconds": 10, "hits": 3, "misses": 2, "evictions": 1, "hit_ratio": None,
+    }
+
+
+def test_principal_is_cached_across_requests(db, farmer, statements):
+    token = create_jwt_token(farmer.id)
+    load_principal(db, token)
+    statements.clear()
+
+    principal = load_principal(db, token)
+
+    assert statements == []
+    assert (principal.role, principal.info.farmer_approval) == ("Farmer", "approved")
+    assert principal_cache.stats()["hits"] == 1
+
+
+def test_approval_change_invalidates_the_cached_principal(db, farmer):
+    token = create_jwt_token(farmer.id)
+    load_principal(db, token).require_approved_farmer()
+
+    farmers_repository.update_farmer_approval(db, farmer.id, "rejected")
+
+    with pytest.raises(HTTPException) as exc_info:
+        load_principal(db, token).require_approved_farmer()
+    assert exc_info.value.status_code == 403
+
+
+def test_user_update_and_delete_invalidate_the_cached_principal(db, buyer):
+    token = create_jwt_token(buyer.id)
+    load_principal(db, token)
+
+    users_repository.update_user(db, buyer.id, UserUpdate(fullname="Renamed Buyer"))
+    assert len(principal_cache) == 0
+    load_principal(db, token)
+
+    users_repository.delete_user(db, buyer.id)
+    with pytest.raises(HTTPException) as exc_info:
+        load_principal(db, token)
+    assert exc_info.value.status_code == 401
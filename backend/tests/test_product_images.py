@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api.products import router as products_router
+from app.database.database import get_db
+from app.utils import file_upload
+from app.utils.file_upload import UPLOAD_CHUNK_SIZE, stream_upload
+from app.utils.images import InvalidImageError, process_image
+from app.utils.security import create_jwt_token
+
+MAX_PIXELS = 40_000_000
+
+
+def _encode(image, image_format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **params)
+    return buffer.getvalue()
+
+
+def _phone_photo():
+    """A large landscape-encoded JPEG that EXIF says to rotate, with camera and GPS tags."""
+    image = Image.effect_noise((3000, 2000), 64).convert("RGB")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° clockwise
+    exif[0x010F] = "PhoneMaker"  # Make
+    exif[0x8825] = {1: "N", 2: (51.0, 10.0, 0.0)}  # GPS
+    return _encode(image, "JPEG", quality=95, exif=exif)
+
+
+def test_photo_is_rotated_resized_and_stripped(tmp_path):
+    original = _phone_photo()
+
+    variants = process_image(original, str(tmp_path), "photo", MAX_PIXELS)
+
+    assert list(variants) == ["thumbnail", "medium", "full"]
+    # Upright: the 3000x2000 sensor image becomes portrait
+    assert (variants["thumbnail"]["width"], variants["thumbnail"]["height"]) == (213, 320)
+    assert (variants["medium"]["width"], variants["medium"]["height"]) == (640, 960)
+    assert (variants["full"]["width"], variants["full"]["height"]) == (1365, 2048)
+    for variant in variants.values():
+        for key, expected_format in (("webp", "WEBP"), ("jpeg", "JPEG")):
+            with Image.open(tmp_path / variant[key]) as saved:
+                assert saved.format == expected_format
+                assert not saved.getexif()
+                assert "icc_profile" not in saved.info
+    thumbnail_size = os.path.getsize(tmp_path / variants["thumbnail"]["webp"])
+    assert thumbnail_size * 20 < len(original)
+
+
+def test_transparent_png_keeps_alpha_in_webp_only(tmp_path):
+    image = Image.new("RGBA", (100, 50), (0, 128, 0, 0))
+
+    variants = process_image(_encode(image, "PNG"), str(tmp_path), "logo", MAX_PIXELS)
+
+    with Image.open(tmp_path / variants["full"]["webp"]) as webp:
+        assert webp.mode == "RGBA"
+    with Image.open(tmp_path / variants["full"]["jpeg"]) as jpeg:
+        assert jpeg.mode == "RGB"
+        assert jpeg.getpixel((10, 10)) == (255, 255, 255)
+    assert (variants["full"]["width"], variants["full"]["height"]) == (100, 50)
+
+
+@pytest.mark.parametrize("data", [
+    b"not an image at all",
+    _encode(Image.new("RGB", (10, 10)), "GIF"),
+    _encode(Image.new("RGB", (10, 10)), "JPEG")[:40],
+])
+def test_invalid_uploads_are_rejected(tmp_path, data):
+    with pytest.raises(InvalidImageError):
+        process_image(data, str(tmp_path), "bad", MAX_PIXELS)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("size", [(1100, 1100), (3000, 3000)])
+def test_images_over_the_pixel_limit_are_rejected(tmp_path, size):
+    data = _encode(Image.new("L", size), "PNG")
+
+    with pytest.raises(InvalidImageError):
+        process_image(data, str(tmp_path), "bomb", 1_000_000)
+
+
+class RecordingFile(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def test_upload_is_streamed_in_chunks_and_hashed(tmp_path):
+    data = os.urandom(UPLOAD_CHUNK_SIZE * 3 + 123)
+    source = RecordingFile(data)
+    source.read(10)  # a consumed file is rewound first
+
+    stored = asyncio.run(stream_upload(UploadFile(source, filename="big.jpg"), str(tmp_path), len(data)))
+
+    assert stored.size == len(data)
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / os.path.basename(stored.path)).read_bytes() == data
+    assert os.listdir(tmp_path) == [os.path.basename(stored.path)]
+    assert set(source.reads[1:]) == {UPLOAD_CHUNK_SIZE}
+
+
+@pytest.mark.parametrize("max_bytes, request_bytes_left, message", [
+    (1000, None, "big.jpg: file exceeds the 1000 byte limit"),
+    (10_000, 1000, "per request"),
+])
+def test_oversized_upload_is_rejected_while_streaming(tmp_path, max_bytes, request_bytes_left, message):
+    source = RecordingFile(b"x" * (UPLOAD_CHUNK_SIZE * 4))
+    upload = UploadFile(source, filename="big.jpg")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(stream_upload(upload, str(tmp_path), max_bytes, request_bytes_left))
+
+    assert error.value.status_code == 413
+    assert message in error.value.detail
+    assert len(source.reads) == 1  # stopped at the first chunk over the limit
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_stores_variant_urls(session_factory, farmer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = FastAPI()
+    app.include_router(products_router, prefix="/products")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    headers = {"Authorization": f"Bearer {create_jwt_token(farmer.id)}"}
+    form = {"name": "Honey", "quantity": "3", "category": "Fruits", "price": "5.0"}
+    jpeg = _encode(Image.new("RGB", (1200, 800), (200, 150, 0)), "JPEG")
+
+    with TestClient(app) as client:
+        rejected = client.post("/products/", headers=headers, data=form, files=[
+            ("images", ("honey.jpg", jpeg, "image/jpeg")),
+            ("images", ("notes.jpg", b"%PDF-1.7", "image/jpeg")),
+        ])
+        stored_after_rejection = (tmp_path / "uploaded_images").exists()
+        created = client.post("/products/", headers=headers, data=form, files=[
+            ("images", ("honey.jpg", jpeg, "image/jpeg")),
+        ])
+
+    assert rejected.status_code == 400
+    assert "notes.jpg" in rejected.json()["detail"]
+    assert not stored_after_rejection
+    assert created.status_code == 201, created.text
+    image = created.json()["images"][0]
+    assert image["image_url"] == image["variants"]["full"]["jpeg"]
+    thumbnail = image["variants"]["thumbnail"]
+    assert (thumbnail["width"], thumbnail["height"]) == (320, 213)
+    assert (tmp_path / "uploaded_images" / thumbnail["webp"].removeprefix("/static/")).exists()
+    # Originals are only staged while processing
+    assert os.listdir(tmp_path / "upload_staging") == []
+
+
+def test_upload_over_the_request_limit_is_rejected(session_factory, farmer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_upload, "MAX_UPLOAD_REQUEST_BYTES", 150_000)
+    app = FastAPI()
+    app.include_router(products_router, prefix="/products")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    headers = {"Authorization": f"Bearer {create_jwt_token(farmer.id)}"}
+    form = {"name": "Honey", "quantity": "3", "category": "Fruits", "price": "5.0"}
+    photo = _encode(Image.effect_noise((400, 400), 64).convert("RGB"), "PNG")
+
+    with TestClient(app) as client:
+        response = client.post("/products/", headers=headers, data=form, files=[
+            ("images", ("one.png", photo, "image/png")),
+            ("images", ("two.png", photo, "image/png")),
+        ])
+
+    assert len(photo) > 75_000
+    assert response.status_code == 413
+    assert os.listdir(tmp_path / "upload_staging") == []
+    assert not (tmp_path / "uploaded_images").exists()
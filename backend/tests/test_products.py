@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.repositories.products import ProductsRepository
+from app.schemas.products import ProductCreate, ProductUpdate
+from app.utils.pagination import encode_cursor
+
+products_repository = ProductsRepository()
+
+
+def _walk_pages(db, **filters):
+    seen, cursor = [], None
+    while True:
+        page, cursor = products_repository.get_products_page(db, limit=3, cursor=cursor, **filters)
+        seen.extend(page)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("sort_by, key, reverse", [
+    ("id", lambda p: p.id, False),
+    ("price_asc", lambda p: (p.price, p.id), False),
+    ("price_desc", lambda p: (p.price, p.id), True),
+    ("newest", lambda p: (p.created_at, p.id), True),
+])
+def test_products_page_walks_catalog_in_order(db, make_product, sort_by, key, reverse):
+    created = datetime(2024, 1, 1)
+    # Repeated prices and timestamps exercise the id tie-breaker
+    products = [
+        make_product(name=f"Product {i}", price=float(i % 3), created_at=created + timedelta(days=i % 4))
+        for i in range(10)
+    ]
+
+    seen = _walk_pages(db, sort_by=sort_by)
+
+    assert [p.id for p in seen] == [p.id for p in sorted(products, key=key, reverse=reverse)]
+
+
+def test_products_page_applies_filters(db, make_product):
+    make_product(name="Apple", category="Fruits", price=5.0)
+    make_product(name="Pear", category="Fruits", price=50.0)
+    make_product(name="Carrot", category="Vegetables", price=5.0)
+
+    seen = _walk_pages(db, category="Fruits", price_until=10.0)
+
+    assert [p.name for p in seen] == ["Apple"]
+
+
+def test_products_page_rejects_cursor_from_another_sort(db, make_product):
+    for i in range(4):
+        make_product(name=f"Product {i}")
+    _, cursor = products_repository.get_products_page(db, limit=2, sort_by="price_asc")
+
+    with pytest.raises(HTTPException) as exc_info:
+        products_repository.get_products_page(db, limit=2, cursor=cursor, sort_by="newest")
+    assert exc_info.value.status_code == 400
+
+    with pytest.raises(HTTPException):
+        products_repository.get_products_page(db, limit=2, cursor="not-a-cursor")
+
+
+@pytest.mark.parametrize("sort_by, values", [
+    ("id", []),
+    ("id", [3, 4]),
+    ("id", ["3"]),
+    ("price_asc", [1.0]),
+    ("price_asc", ["cheap", 3]),
+    ("newest", [7, 3]),
+    ("popularity", [True, 3]),
+])
+def test_products_page_rejects_tampered_cursor_values(db, make_product, sort_by, values):
+    make_product()
+
+    with pytest.raises(HTTPException) as exc_info:
+        products_repository.get_products_page(db, limit=2, cursor=encode_cursor(sort_by, values), sort_by=sort_by)
+    assert (exc_info.value.status_code, exc_info.value.detail) == (400, "Invalid cursor")
+
+
+def _create(db, farmer, name, category="Vegetables", description=None):
+    return products_repository.create_product(
+        db,
+        ProductCreate(name=name, category=category, price=1.0, quantity=5, description=description),
+        farmer.id,
+        [],
+    )
+
+
+def test_search_matches_word_prefixes_across_fields(db, farmer):
+    tomato = _create(db, farmer, "Cherry tomatoes", description="Sweet and red")
+    _create(db, farmer, "Potatoes")
+    milk = _create(db, farmer, "Fresh milk", category="Dairy")
+
+    assert [p.id for p in products_repository.search_products(db, name="tom")] == [tomato.id]
+    assert [p.id for p in products_repository.search_products(db, q="sweet")] == [tomato.id]
+    assert [p.id for p in products_repository.search_products(db, q="dair")] == [milk.id]
+    assert len(products_repository.search_products(db, farm_location="astan")) == 3
+    assert products_repository.search_products(db, farm_location="almaty") == []
+
+
+def test_search_ranks_name_matches_first(db, farmer):
+    described = _create(db, farmer, "Basket", description="apple apple basket")
+    named = _create(db, farmer, "Apple")
+
+    results = products_repository.search_products(db, q="apple")
+
+    assert [p.id for p in results] == [named.id, described.id]
+
+
+def test_search_index_follows_updates_and_deletes(db, farmer):
+    product = _create(db, farmer, "Carrot")
+
+    products_repository.update_product(db, product.id, ProductUpdate(name="Beetroot"))
+    assert products_repository.search_products(db, name="carrot") == []
+    assert [p.id for p in products_repository.search_products(db, name="beet")] == [product.id]
+
+    products_repository.delete_product(db, product.id)
+    assert products_repository.search_products(db, name="beet") == []
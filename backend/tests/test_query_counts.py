@@ -0,0 +1,155 @@
+"""
+Pin the number of SQL statements authenticated endpoints execute, so repeated user
+lookups cannot creep back into a request.
+"""
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api.orders import router as orders_router
+from app.api.products import router as products_router
+from app.api.profiles import router as profiles_router
+from app.database.database import get_db
+from app.utils.security import create_jwt_token
+
+
+@pytest.fixture
+def client(session_factory, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # product images are saved relative to the working directory
+    app = FastAPI()
+    app.include_router(products_router, prefix="/products")
+    app.include_router(profiles_router, prefix="/profiles")
+    app.include_router(orders_router, prefix="/orders")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _auth(user):
+    return {"Authorization": f"Bearer {create_jwt_token(user.id)}"}
+
+
+def _request(client, statements, method, url, user, **kwargs):
+    headers = _auth(user)
+    statements.clear()
+    response = client.request(method, url, headers=headers, **kwargs)
+    return response, list(statements)
+
+
+def _user_lookups(executed):
+    return sum(1 for statement in executed if statement.startswith("SELECT USERS."))
+
+
+def test_create_product(client, statements, farmer):
+    response, executed = _request(
+        client, statements, "POST", "/products/",
+        farmer,
+        data={"name": "Honey", "quantity": "3", "category": "Fruits", "price": "5.0"},
+        files=[("images", ("honey.jpg", _jpeg(), "image/jpeg"))],
+    )
+
+    assert response.status_code == 201, response.text
+    # user + profiles; stored blob lookup; blob reference, product, image, search index
+    # (delete + insert); reload for the response
+    assert _user_lookups(executed) == 1
+    assert len(executed) == 9
+
+
+def test_create_product_rejects_unapproved_farmer_after_one_query(client, statements, db, farmer):
+    farmer.farmer_profile.is_approved = "pending"
+    db.commit()
+
+    response, executed = _request(
+        client, statements, "POST", "/products/",
+        farmer,
+        data={"name": "Honey", "quantity": "3", "category": "Fruits", "price": "5.0"},
+        files=[("images", ("honey.jpg", _jpeg(), "image/jpeg"))],
+    )
+
+    assert response.status_code == 403
+    assert len(executed) == 1
+
+
+def test_update_product(client, statements, farmer, make_product):
+    product_id = make_product().id
+
+    response, executed = _request(client, statements, "PATCH", f"/products/{product_id}", farmer, json={"price": 2.5})
+
+    assert response.status_code == 200, response.text
+    assert _user_lookups(executed) == 1
+    # user + profiles; load, update and re-index the product; reload it
+    assert len(executed) == 6
+
+
+def test_update_product_with_cached_principal(client, statements, farmer, make_product):
+    product_id = make_product().id
+    _request(client, statements, "PATCH", f"/products/{product_id}", farmer, json={"price": 2.5})
+
+    response, executed = _request(client, statements, "PATCH", f"/products/{product_id}", farmer, json={"price": 3.0})
+
+    assert response.status_code == 200, response.text
+    assert _user_lookups(executed) == 0
+    assert len(executed) == 5
+
+
+def test_delete_product(client, statements, farmer, make_product):
+    product_id = make_product().id
+
+    response, executed = _request(client, statements, "DELETE", f"/products/{product_id}", farmer)
+
+    assert response.status_code == 200, response.text
+    assert _user_lookups(executed) == 1
+    # user + profiles; load the product, drop it from the search index, load the
+    # relationships the ORM unlinks, delete it
+    assert len(executed) == 8
+
+
+def test_buyer_cannot_delete_product(client, statements, buyer, make_product):
+    product_id = make_product().id
+
+    response, executed = _request(client, statements, "DELETE", f"/products/{product_id}", buyer)
+
+    assert response.status_code == 403
+    assert len(executed) == 1
+
+
+def test_get_my_profile(client, statements, farmer):
+    response, executed = _request(client, statements, "GET", "/profiles/me", farmer)
+
+    assert response.status_code == 200, response.text
+    assert response.json()["farm_name"] == "Test Farm"
+    assert len(executed) == 1
+
+
+def test_get_farmer_orders(client, statements, farmer):
+    response, executed = _request(client, statements, "GET", "/orders/farmer/orders", farmer)
+
+    assert response.status_code == 200, response.text
+    assert _user_lookups(executed) == 1
+    # user + profiles; the farmer's profile and ordered items
+    assert len(executed) == 3
+
+
+def test_invalid_token_is_rejected_without_queries(client, statements):
+    statements.clear()
+    response = client.get("/profiles/me", headers={"Authorization": "Bearer not-a-token"})
+
+    assert response.status_code == 401
+    assert statements == []
@@ -0,0 +1,142 @@
+"""
+Query-plan regressions: each hot repository lookup must be served by an index.
+
+The statements a repository method issues are captured and re-run under SQLite's
+EXPLAIN QUERY PLAN, and the plan must mention the index that covers the lookup.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.database.models import Chat, Comment, Message
+from app.repositories.cart import CartRepository
+from app.repositories.chat import ChatRepository
+from app.repositories.comments import CommentsRepository
+from app.repositories.orders import OrdersRepository
+from app.repositories.products import ProductsRepository
+from app.schemas.orders import OrderCreate
+from app.schemas.products import ProductCreate
+
+
+@contextmanager
+def captured_selects(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def query_plan(engine, statements) -> str:
+    details = []
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            details.extend(row[-1] for row in rows)
+    return "\n".join(details)
+
+
+@pytest.fixture
+def chat(db, buyer, farmer):
+    chat = Chat(buyer_id=buyer.id, farmer_id=farmer.id)
+    chat.messages = [Message(sender_id=buyer.id, content="Hello")]
+    db.add(chat)
+    db.commit()
+    return chat
+
+
+@pytest.fixture
+def order(db, buyer, make_product):
+    product = make_product(description="Ordered product")
+    return OrdersRepository().create_order(
+        db,
+        OrderCreate(total_price=1.0, status="Pending", items=[{"product_id": product.id, "quantity": 1}]),
+        buyer.buyer_profile.id,
+    )
+
+
+CASES = {
+    "cart lookup by user": (
+        lambda db, ctx: CartRepository().get_cart(db, ctx["buyer"].id),
+        "uq_cart_items_user_id_product_id",
+    ),
+    "cart item by user and product": (
+        lambda db, ctx: CartRepository().add_to_cart(db, ctx["buyer"].id, ctx["product"].id, 1),
+        "uq_cart_items_user_id_product_id",
+    ),
+    "products by farmer": (
+        lambda db, ctx: ProductsRepository().get_products_by_farmer_id(db, ctx["farmer"].farmer_profile.id),
+        "ix_products_farmer_id",
+    ),
+    "product images by product": (
+        lambda db, ctx: ProductsRepository().get_products_by_farmer_id(db, ctx["farmer"].farmer_profile.id),
+        "ix_product_images_product_id",
+    ),
+    "category listing by price": (
+        lambda db, ctx: ProductsRepository().get_products_page(db, category="Vegetables", sort_by="price_asc"),
+        "ix_products_category_price",
+    ),
+    "farmer profile by user": (
+        lambda db, ctx: ProductsRepository().create_product(
+            db, ProductCreate(name="Pear", category="Fruits", price=1.0, quantity=1), ctx["farmer"].id, []
+        ),
+        "ix_farmer_profiles_user_id",
+    ),
+    "orders by buyer": (
+        lambda db, ctx: OrdersRepository().get_orders_by_user_id(db, ctx["buyer"].buyer_profile.id),
+        "ix_orders_buyer_id",
+    ),
+    "order items by order": (
+        lambda db, ctx: OrdersRepository().get_order_by_id(db, ctx["order"].id),
+        "ix_order_items_order_id",
+    ),
+    "order items by product": (
+        lambda db, ctx: OrdersRepository().get_purchased_products_by_farmer_user_id(db, ctx["farmer"].id),
+        "ix_order_items_product_id",
+    ),
+    "chat between users": (
+        lambda db, ctx: ChatRepository().get_chat_between_users(db, ctx["buyer"].id, ctx["farmer"].id),
+        "ix_chats_buyer_id_farmer_id",
+    ),
+    "chats of a farmer": (
+        lambda db, ctx: ChatRepository().get_user_chats(db, ctx["farmer"].id, "Farmer"),
+        "ix_chats_farmer_id",
+    ),
+    "inbox of a buyer": (
+        lambda db, ctx: ChatRepository().get_inbox(db, ctx["buyer"].id, "Buyer"),
+        "ix_chats_buyer_id_last_activity_at",
+    ),
+    "recent messages of a chat": (
+        lambda db, ctx: ChatRepository().get_recent_messages(db, ctx["chat"].id),
+        "ix_messages_chat_id_id",
+    ),
+    "older messages of a chat": (
+        lambda db, ctx: ChatRepository().get_messages_page(db, ctx["chat"].id, before=ctx["chat"].messages[0].id),
+        "ix_messages_chat_id_id",
+    ),
+    "comments of a product": (
+        lambda db, ctx: CommentsRepository().get_comment_by_product_id(db, ctx["product"].id),
+        "ix_comments_product_id",
+    ),
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_repository_lookup_uses_index(engine, db, buyer, farmer, make_product, chat, order, case):
+    product = make_product()
+    db.add(Comment(content="Tasty", author_id=buyer.id, product_id=product.id))
+    db.commit()
+    ctx = {"buyer": buyer, "farmer": farmer, "product": product, "chat": chat, "order": order}
+    run, index_name = CASES[case]
+
+    with captured_selects(engine) as statements:
+        run(db, ctx)
+
+    assert index_name in query_plan(engine, statements)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from app.database.models import Order, Product, ProductSalesDaily, StockReservation
+from app.repositories.orders import OrdersRepository
+from app.repositories.reservations import ReservationsRepository
+from app.schemas.orders import OrderCreate
+
+orders_repository = OrdersRepository()
+reservations_repository = ReservationsRepository()
+
+
+def _pending_order(db, buyer, product, quantity):
+    order_data = OrderCreate(
+        total_price=1.0,
+        status="Pending",
+        items=[{"product_id": product.id, "quantity": quantity}],
+    )
+    return orders_repository.create_order(db, order_data, buyer.buyer_profile.id)
+
+
+def _after_expiry():
+    return datetime.now(timezone.utc) + timedelta(days=1)
+
+
+def test_pending_order_holds_its_stock(db, buyer, make_product):
+    product = make_product(quantity=5)
+
+    order = _pending_order(db, buyer, product, 2)
+
+    reservation = db.query(StockReservation).filter_by(order_id=order.id).one()
+    assert (reservation.product_id, reservation.quantity, reservation.status) == (product.id, 2, "Held")
+    assert reservations_repository.get_hold_expiry(db, order.id) > datetime.now(timezone.utc)
+    assert reservations_repository.release_expired(db) == 0
+
+
+def test_expired_hold_returns_stock_and_cancels_order(db, buyer, make_product):
+    product = make_product(quantity=5)
+    order = _pending_order(db, buyer, product, 2)
+
+    assert reservations_repository.release_expired(db, now=_after_expiry()) == 1
+    assert reservations_repository.release_expired(db, now=_after_expiry()) == 0
+
+    db.expire_all()
+    assert db.get(Product, product.id).quantity == 5
+    assert db.get(Product, product.id).order_count == 0
+    assert db.get(Order, order.id).status == "Cancelled"
+
+
+def test_committed_hold_is_not_released(db, buyer, make_product):
+    product = make_product(quantity=5)
+    order = _pending_order(db, buyer, product, 2)
+
+    assert reservations_repository.commit_order(db, order.id)
+
+    assert reservations_repository.release_expired(db, now=_after_expiry()) == 0
+    db.expire_all()
+    assert db.get(Product, product.id).quantity == 3
+    assert db.get(Order, order.id).status == "Pending"
+
+
+def test_payment_after_expiry_takes_stock_again(db, buyer, make_product):
+    product = make_product(quantity=3)
+    late_order = _pending_order(db, buyer, product, 2)
+    reservations_repository.release_expired(db, now=_after_expiry())
+
+    assert reservations_repository.commit_order(db, late_order.id)
+    db.expire_all()
+    assert db.get(Product, product.id).quantity == 1
+    # Released stock was taken off the popularity counters; the late sale puts it back
+    late_product = db.get(Product, product.id)
+    assert (late_product.order_count, late_product.sales_count, late_product.order_count_7d) == (1, 2, 1)
+    assert [(row.order_count, row.sales_count) for row in db.query(ProductSalesDaily)] == [(1, 2)]
+
+    # Once the stock is sold to someone else, the late payment cannot be fulfilled
+    sold_out_order = _pending_order(db, buyer, product, 1)
+    reservations_repository.release_expired(db, now=_after_expiry())
+    _pending_order(db, buyer, product, 1)
+    assert not reservations_repository.commit_order(db, sold_out_order.id)
+    db.expire_all()
+    assert db.get(Product, product.id).order_count == 2
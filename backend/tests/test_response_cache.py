@@ -0,0 +1,222 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import products as products_api
+from app.api.comments import router as comments_router
+from app.database.database import get_db
+from app.repositories.comments import CommentsRepository
+from app.repositories.orders import OrdersRepository
+from app.repositories.popularity import PopularityRepository
+from app.repositories.products import ProductsRepository
+from app.repositories.reservations import ReservationsRepository
+from app.schemas.comments import CommentCreate
+from app.schemas.orders import OrderCreate
+from app.schemas.products import ProductUpdate
+from app.utils import response_cache as response_cache_module
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.response_cache import (CACHE_STATUS_HEADER,
+                                      RedisResponseCacheBackend, ResponseCache)
+
+comments_repository = CommentsRepository()
+orders_repository = OrdersRepository()
+popularity_repository = PopularityRepository()
+products_repository = ProductsRepository()
+reservations_repository = ReservationsRepository()
+
+
+class FakeRedis:
+    """The part of the redis client RedisResponseCacheBackend uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("Redis is down")
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value
+
+    def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        self._check()
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip("*"))]
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def client(session_factory):
+    app = FastAPI()
+    app.include_router(products_api.router, prefix="/products")
+    app.include_router(comments_router, prefix="/comments")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_repeated_requests_are_served_from_cache(client, statements, make_product):
+    for i in range(3):
+        make_product(name=f"Product {i}")
+
+    first = client.get("/products/", params={"limit": 2, "sort_by": "id"})
+    statements.clear()
+    second = client.get("/products/", params={"limit": 2, "sort_by": "id"})
+    reordered = client.get("/products/?sort_by=id&limit=2")
+
+    assert first.headers[CACHE_STATUS_HEADER] == "MISS"
+    assert second.headers[CACHE_STATUS_HEADER] == reordered.headers[CACHE_STATUS_HEADER] == "HIT"
+    assert statements == []
+    assert second.content == first.content
+    assert second.headers[NEXT_CURSOR_HEADER] == first.headers[NEXT_CURSOR_HEADER]
+    assert second.headers["etag"] == first.headers["etag"]
+    assert [product["name"] for product in second.json()] == ["Product 0", "Product 1"]
+
+
+def test_clients_revalidate_with_etag(client, make_product):
+    product_id = make_product().id
+    response = client.get(f"/products/{product_id}")
+
+    revalidated = client.get(f"/products/{product_id}", headers={"If-None-Match": response.headers["etag"]})
+    changed = client.get(f"/products/{product_id}", headers={"If-None-Match": '"stale"'})
+
+    assert response.headers["cache-control"] == "no-cache"
+    assert (revalidated.status_code, revalidated.content) == (304, b"")
+    assert revalidated.headers["etag"] == response.headers["etag"]
+    assert changed.status_code == 200
+
+
+def test_writes_invalidate_only_the_responses_they_change(client, db, farmer, buyer, make_product):
+    apple, pear = make_product(name="Apple"), make_product(name="Pear")
+    farmer_id = farmer.farmer_profile.id
+    urls = [
+        "/products/",
+        f"/products/{apple.id}",
+        f"/products/{pear.id}",
+        f"/products/farmer/{farmer_id}",
+        f"/comments/products/{apple.id}/comments",
+        f"/comments/products/{pear.id}/comments",
+    ]
+    for url in urls:
+        client.get(url)
+
+    products_repository.update_product(db, apple.id, ProductUpdate(price=9.5))
+    comments_repository.create_comment(db, buyer.id, pear.id, CommentCreate(content="Juicy"))
+    responses = {url: client.get(url) for url in urls}
+
+    status = {url: response.headers[CACHE_STATUS_HEADER] for url, response in responses.items()}
+    assert status == {
+        "/products/": "MISS",
+        f"/products/{apple.id}": "MISS",
+        f"/products/{pear.id}": "HIT",
+        f"/products/farmer/{farmer_id}": "MISS",
+        f"/comments/products/{apple.id}/comments": "HIT",
+        f"/comments/products/{pear.id}/comments": "MISS",
+    }
+    assert responses[f"/products/{apple.id}"].json()["price"] == 9.5
+    assert [c["content"] for c in responses[f"/comments/products/{pear.id}/comments"].json()["comments"]] == ["Juicy"]
+
+    products_repository.delete_product(db, apple.id)
+    assert client.get(f"/products/{apple.id}").status_code == 404
+    assert [product["name"] for product in client.get("/products/").json()] == ["Pear"]
+
+
+def test_stock_and_popularity_changes_invalidate_the_catalog(client, db, farmer, buyer, make_product):
+    apple, pear = make_product(name="Apple", quantity=5), make_product(name="Pear", quantity=5)
+    urls = [
+        "/products/?sort_by=popularity_7d",
+        f"/products/{apple.id}",
+        f"/products/{pear.id}",
+        f"/products/farmer/{farmer.farmer_profile.id}",
+    ]
+    for url in urls:
+        client.get(url)
+
+    order_data = OrderCreate(total_price=2.0, status="Pending", items=[{"product_id": apple.id, "quantity": 2}])
+    orders_repository.create_order(db, order_data, buyer.buyer_profile.id)
+    after_checkout = {url: client.get(url) for url in urls}
+    reservations_repository.release_expired(db, now=datetime.now(timezone.utc) + timedelta(days=1))
+    after_release = client.get(f"/products/{apple.id}")
+    popularity_repository.refresh_rolling_counts(db)
+    after_refresh = client.get(urls[0])
+
+    assert {url: response.headers[CACHE_STATUS_HEADER] for url, response in after_checkout.items()} == {
+        "/products/?sort_by=popularity_7d": "MISS",
+        f"/products/{apple.id}": "MISS",
+        f"/products/{pear.id}": "HIT",
+        f"/products/farmer/{farmer.farmer_profile.id}": "MISS",
+    }
+    assert after_checkout[f"/products/{apple.id}"].json()["quantity"] == 3
+    assert [product["name"] for product in after_checkout[urls[0]].json()] == ["Apple", "Pear"]
+    assert (after_release.headers[CACHE_STATUS_HEADER], after_release.json()["quantity"]) == ("MISS", 5)
+    assert after_refresh.headers[CACHE_STATUS_HEADER] == "MISS"
+
+
+def test_response_built_during_a_write_is_not_served(client, db, make_product, monkeypatch):
+    product = make_product(name="Apple")
+    get_product_by_id = products_repository.get_product_by_id
+
+    def read_then_concurrent_write(session, product_id):
+        stale = get_product_by_id(session, product_id)
+        # Another request commits an update while this response is being built
+        products_repository.update_product(db, product_id, ProductUpdate(price=3.0))
+        return stale
+
+    monkeypatch.setattr(products_api.products_repository, "get_product_by_id", read_then_concurrent_write)
+    built_during_write = client.get(f"/products/{product.id}")
+    monkeypatch.setattr(products_api.products_repository, "get_product_by_id", get_product_by_id)
+    after = client.get(f"/products/{product.id}")
+
+    assert built_during_write.json()["price"] == 1.0
+    assert after.headers[CACHE_STATUS_HEADER] == "MISS"
+    assert after.json()["price"] == 3.0
+
+
+def test_shared_backend_is_consistent_across_workers(client, db, make_product, monkeypatch):
+    redis = FakeRedis()
+    worker_a = ResponseCache(RedisResponseCacheBackend(redis))
+    worker_b = ResponseCache(RedisResponseCacheBackend(redis))
+    product = make_product(name="Apple")
+    url = f"/products/{product.id}"
+
+    monkeypatch.setattr(products_api, "response_cache", worker_a)
+    client.get(url)
+    monkeypatch.setattr(products_api, "response_cache", worker_b)
+    from_b = client.get(url)
+    # Writes invalidate through the shared backend, whichever worker made them
+    monkeypatch.setattr(response_cache_module.response_cache, "backend", RedisResponseCacheBackend(redis))
+    products_repository.update_product(db, product.id, ProductUpdate(price=4.0))
+    after_write = client.get(url)
+    redis.fail = True
+    while_down = client.get(url)
+
+    assert from_b.headers[CACHE_STATUS_HEADER] == "HIT"
+    assert after_write.headers[CACHE_STATUS_HEADER] == "MISS"
+    assert after_write.json()["price"] == 4.0
+    assert while_down.status_code == 200
+    assert while_down.json()["price"] == 4.0
+    assert worker_b.stats()["errors"] == 1
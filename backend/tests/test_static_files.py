@@ -0,0 +1,202 @@
+import gzip
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.staticfiles import StaticFiles
+
+from app.utils.images import process_image
+from app.utils.static_files import ImageStaticFiles, parse_range
+from app.utils.storage import IMMUTABLE_CACHE_CONTROL
+
+BROWSER_ACCEPT = "image/avif,image/webp,*/*;q=0.8"
+
+
+def _photo(seed):
+    """A photo-like image: smooth gradients with some texture."""
+    gradient = Image.radial_gradient("L").resize((640, 480))
+    noise = Image.effect_noise((640, 480), 24 + seed)
+    return Image.merge("RGB", (gradient, Image.blend(gradient, noise, 0.15), gradient.point(lambda v: 255 - v)))
+
+
+def _store(directory, seed):
+    """Process a photo the way uploads are, returning its variants by name."""
+    image = _photo(seed)
+    source = directory / f"source{seed}.png"
+    image.save(source)
+    stem = hashlib.sha256(source.read_bytes()).hexdigest()
+    variants = process_image(str(source), str(directory), stem, 40_000_000)
+    source.unlink()
+    return variants
+
+
+@pytest.fixture
+def images(tmp_path):
+    directory = tmp_path / "uploaded_images"
+    directory.mkdir()
+    variants = _store(directory, 0)
+    (directory / "legacy.svg").write_text("<svg xmlns='http://www.w3.org/2000/svg'>" + "<g/>" * 200 + "</svg>")
+    (directory / "legacy.svg.gz").write_bytes(gzip.compress((directory / "legacy.svg").read_bytes()))
+    return directory, variants
+
+
+def _client(directory, static_files=ImageStaticFiles):
+    app = FastAPI()
+    app.mount("/static", static_files(directory=str(directory)), name="static")
+    return TestClient(app)
+
+
+def test_content_addressed_variants_are_immutable_and_revalidate_by_etag(images):
+    directory, variants = images
+    name = variants["thumbnail"]["webp"]
+
+    with _client(directory) as client:
+        response = client.get(f"/static/{name}")
+        etag = response.headers["etag"]
+        revalidations = [
+            client.get(f"/static/{name}", headers={"If-None-Match": value})
+            for value in (etag, f"W/{etag}", f'"other", {etag}', "*")
+        ]
+        changed = client.get(f"/static/{name}", headers={"If-None-Match": '"other"'})
+
+    assert response.status_code == 200
+    assert response.content == (directory / name).read_bytes()
+    assert etag == f'"{name}"'
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["accept-ranges"] == "bytes"
+    for revalidation in revalidations:
+        assert revalidation.status_code == 304
+        assert revalidation.content == b""
+        assert revalidation.headers["etag"] == etag
+        assert revalidation.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert changed.status_code == 200
+
+
+def test_jpeg_urls_are_answered_with_webp_when_accepted(images):
+    directory, variants = images
+    jpeg, webp = variants["full"]["jpeg"], variants["full"]["webp"]
+
+    with _client(directory) as client:
+        negotiated = client.get(f"/static/{jpeg}", headers={"Accept": BROWSER_ACCEPT})
+        plain = client.get(f"/static/{jpeg}", headers={"Accept": "image/jpeg, image/webp;q=0"})
+
+    assert negotiated.headers["content-type"] == "image/webp"
+    assert negotiated.headers["etag"] == f'"{webp}"'
+    assert negotiated.content == (directory / webp).read_bytes()
+    assert plain.headers["content-type"] == "image/jpeg"
+    assert plain.headers["etag"] == f'"{jpeg}"'
+    assert negotiated.headers["vary"] == plain.headers["vary"] == "Accept"
+
+
+def test_byte_ranges(images):
+    directory, variants = images
+    name = variants["medium"]["jpeg"]
+    data = (directory / name).read_bytes()
+    url = f"/static/{name}"
+
+    with _client(directory) as client:
+        first = client.get(url, headers={"Range": "bytes=0-99"})
+        rest = client.get(url, headers={"Range": "bytes=100-"})
+        suffix = client.get(url, headers={"Range": "bytes=-10"})
+        resumed = client.get(url, headers={"Range": "bytes=100-", "If-Range": f'"{name}"'})
+        stale = client.get(url, headers={"Range": "bytes=100-", "If-Range": '"other"'})
+        several = client.get(url, headers={"Range": "bytes=0-1, 5-9"})
+        past_end = client.get(url, headers={"Range": f"bytes={len(data)}-"})
+        head = client.head(url, headers={"Range": "bytes=0-99"})
+
+    assert first.status_code == 206
+    assert first.headers["content-range"] == f"bytes 0-99/{len(data)}"
+    assert first.content + rest.content == data
+    assert suffix.content == data[-10:]
+    assert resumed.status_code == 206
+    assert resumed.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert (stale.status_code, stale.content) == (200, data)
+    assert (several.status_code, several.content) == (200, data)
+    assert past_end.status_code == 416
+    assert past_end.headers["content-range"] == f"bytes */{len(data)}"
+    assert (head.status_code, head.content, head.headers["content-length"]) == (206, b"", "100")
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-0", (0, 0)),
+    ("bytes=10-5000", (10, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=5-2", None),
+    ("items=0-5", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_precompressed_copies_and_files_without_hashed_names(images):
+    directory, _ = images
+    original = (directory / "legacy.svg").read_bytes()
+
+    with _client(directory) as client:
+        compressed = client.get("/static/legacy.svg", headers={"Accept-Encoding": "br, gzip"})
+        identity = client.get("/static/legacy.svg", headers={"Accept-Encoding": "identity"})
+        ranged = client.get("/static/legacy.svg", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-3"})
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["content-type"] == "image/svg+xml"
+    assert int(compressed.headers["content-length"]) < len(original)
+    assert compressed.content == original
+    assert "content-encoding" not in identity.headers
+    assert identity.content == original
+    assert compressed.headers["vary"] == identity.headers["vary"] == "Accept-Encoding"
+    assert compressed.headers["cache-control"] == identity.headers["cache-control"] == "public, max-age=3600"
+    assert (ranged.status_code, ranged.content) == (206, original[:4])
+
+
+def _browse(client, urls, cache):
+    """
+    Fetch ``urls`` like a browser cache would: fresh immutable responses are reused
+    without a request, others are revalidated with their ETag. Returns the number of
+    requests sent and response body bytes received.
+    """
+    requests = transferred = 0
+    for url in urls:
+        cached = cache.get(url)
+        if cached and "immutable" in cached.get("cache-control", ""):
+            continue
+        headers = {"Accept": BROWSER_ACCEPT}
+        if cached and "etag" in cached:
+            headers["If-None-Match"] = cached["etag"]
+        response = client.get(url, headers=headers)
+        requests += 1
+        transferred += len(response.content)
+        if response.status_code == 200:
+            cache[url] = response.headers
+    return requests, transferred
+
+
+def test_catalog_browse_session_transfers_less(tmp_path):
+    """
+    A buyer opens the catalog (12 thumbnails) and two products, then reopens the app
+    later and browses the same catalog and another product. Compared with the plain
+    StaticFiles mount, the JPEG URLs the app uses are answered with WebP, and the
+    second visit only requests the product not seen before.
+    """
+    directory = tmp_path / "uploaded_images"
+    directory.mkdir()
+    products = [_store(directory, seed) for seed in range(12)]
+    catalog = [f"/static/{variants['thumbnail']['jpeg']}" for variants in products]
+    first_visit = catalog + [f"/static/{products[i]['full']['jpeg']}" for i in (0, 1)]
+    second_visit = catalog + [f"/static/{products[i]['full']['jpeg']}" for i in (0, 2)]
+
+    results = {}
+    for name, static_files in (("plain", StaticFiles), ("cached", ImageStaticFiles)):
+        cache = {}
+        with _client(directory, static_files) as client:
+            results[name] = _browse(client, first_visit, cache), _browse(client, second_visit, cache)
+
+    (plain_first, plain_second), (cached_first, cached_second) = results["plain"], results["cached"]
+    plain_bytes = plain_first[1] + plain_second[1]
+    cached_bytes = cached_first[1] + cached_second[1]
+    # Second visit: plain revalidates all 14 images; the new layer only fetches the new product
+    assert plain_second[0] == 14
+    assert cached_second[0] == 1
+    assert cached_bytes < plain_bytes / 2, (cached_bytes, plain_bytes)
@@ -0,0 +1,157 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.webhook import process_stripe_event, router as webhook_router
+from app.config import STRIPE_WEBHOOK_SECRET
+from app.database.database import get_db, get_session_factory
+from app.database.models import CartItem, Order, Payment, Product, StockReservation, StripeEvent
+from app.repositories.orders import OrdersRepository
+from app.repositories.reservations import ReservationsRepository
+from app.schemas.orders import OrderCreate
+
+orders_repository = OrdersRepository()
+reservations_repository = ReservationsRepository()
+
+
+@pytest.fixture
+def webhook_client(session_factory):
+    app = FastAPI()
+    app.include_router(webhook_router)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def order(db, buyer, make_product):
+    product = make_product(name="Honey", price=10.0, quantity=5)
+    db.add(CartItem(user_id=buyer.id, product_id=product.id, quantity=2))
+    db.commit()
+    order_data = OrderCreate(total_price=20.0, status="Pending", items=[{"product_id": product.id, "quantity": 2}])
+    return orders_repository.create_order(db, order_data, buyer.buyer_profile.id)
+
+
+def _deliver(client, event_id, event_type, data):
+    payload = json.dumps({"id": event_id, "object": "event", "type": event_type, "data": {"object": data}})
+    timestamp = int(time.time())
+    signature = hmac.new(
+        STRIPE_WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return client.post(
+        "/webhook",
+        content=payload,
+        headers={"stripe-signature": f"t={timestamp},v1={signature}", "Content-Type": "application/json"},
+    )
+
+
+def _session(order, buyer, **fields):
+    return {
+        "id": "cs_test_1",
+        "object": "checkout.session",
+        "client_reference_id": str(buyer.id),
+        "metadata": {"order_id": str(order.id)},
+        "amount_total": 2000,
+        "payment_intent": "pi_test_1",
+        **fields,
+    }
+
+
+def test_completed_session_is_applied_once(webhook_client, db, buyer, order):
+    response = _deliver(webhook_client, "evt_1", "checkout.session.completed", _session(order, buyer))
+    assert response.json() == {"status": "success"}
+
+    db.expire_all()
+    assert db.get(Order, order.id).status == "Paid"
+    payment = db.query(Payment).one()
+    assert (payment.status, payment.amount, payment.stripe_payment_intent_id) == ("Completed", 20.0, "pi_test_1")
+    assert db.query(StockReservation).one().status == "Committed"
+    assert db.query(CartItem).count() == 0
+    assert db.get(StripeEvent, "evt_1").status == "Processed"
+
+    # Stripe retries the delivery after the buyer filled a new cart: nothing is re-applied
+    db.add(CartItem(user_id=buyer.id, product_id=order.items[0].product_id, quantity=1))
+    db.commit()
+    response = _deliver(webhook_client, "evt_1", "checkout.session.completed", _session(order, buyer))
+    assert response.json() == {"status": "duplicate"}
+    assert db.query(CartItem).count() == 1
+    assert db.get(StripeEvent, "evt_1").attempts == 1
+
+
+def test_expired_session_releases_stock_and_fails_payment(webhook_client, db, buyer, order):
+    _deliver(webhook_client, "evt_2", "checkout.session.expired", _session(order, buyer))
+
+    db.expire_all()
+    assert db.get(Order, order.id).status == "Cancelled"
+    assert db.get(Product, order.items[0].product_id).quantity == 5
+    assert db.query(Payment).one().status == "Failed"
+
+
+def test_late_payment_for_sold_out_stock_is_left_for_a_refund(webhook_client, db, buyer, order):
+    reservations_repository.release_expired(db, now=datetime.now(timezone.utc) + timedelta(days=1))
+    # Someone else bought the released stock before the payment came in
+    product = db.get(Product, order.items[0].product_id)
+    product.quantity = 1
+    db.commit()
+
+    _deliver(webhook_client, "evt_8", "checkout.session.completed", _session(order, buyer))
+
+    db.expire_all()
+    assert db.get(Order, order.id).status == "Cancelled"
+    assert db.query(Payment).one().status == "Completed"
+    assert db.query(StockReservation).one().status == "Released"
+    assert db.get(Product, product.id).quantity == 1
+    assert db.query(CartItem).count() == 1
+    assert db.get(StripeEvent, "evt_8").status == "Processed"
+
+
+def test_failed_payment_does_not_undo_a_completed_one(webhook_client, db, buyer, order):
+    payment_intent = {"id": "pi_test_1", "object": "payment_intent", "metadata": {"order_id": str(order.id)}}
+
+    _deliver(webhook_client, "evt_3", "payment_intent.payment_failed", payment_intent)
+    db.expire_all()
+    assert db.query(Payment).one().status == "Failed"
+    assert db.get(Order, order.id).status == "Pending"
+
+    _deliver(webhook_client, "evt_4", "checkout.session.completed", _session(order, buyer))
+    _deliver(webhook_client, "evt_5", "payment_intent.payment_failed", payment_intent)
+    db.expire_all()
+    assert db.query(Payment).one().status == "Completed"
+
+
+def test_failed_event_is_recorded_and_can_be_retried(webhook_client, session_factory, db, buyer, order):
+    response = _deliver(webhook_client, "evt_6", "checkout.session.completed", _session(order, buyer, client_reference_id=None))
+    assert response.status_code == 200
+
+    event = db.get(StripeEvent, "evt_6")
+    assert (event.status, event.attempts) == ("Failed", 1)
+    assert "client_reference_id" in event.last_error
+
+    db.query(StripeEvent).filter_by(id="evt_6").update({"payload": event.payload.replace('"client_reference_id": null', f'"client_reference_id": "{buyer.id}"')})
+    db.commit()
+    process_stripe_event("evt_6", session_factory)
+    db.expire_all()
+    assert (db.get(StripeEvent, "evt_6").status, db.get(StripeEvent, "evt_6").attempts) == ("Processed", 2)
+    assert db.get(Order, order.id).status == "Paid"
+
+
+def test_unhandled_events_are_not_recorded(webhook_client, db):
+    response = _deliver(webhook_client, "evt_7", "customer.created", {"id": "cus_1", "object": "customer"})
+
+    assert response.json() == {"status": "ignored"}
+    assert db.query(StripeEvent).count() == 0
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.database.models import WorkerIdLease
+from app.repositories.worker_ids import WorkerIdLeasesRepository
+from app.utils.ids import MAX_WORKER_ID
+
+worker_id_leases_repository = WorkerIdLeasesRepository()
+
+
+def test_running_processes_lease_distinct_worker_ids(db):
+    first = worker_id_leases_repository.acquire(db, "host-a:1", 60)
+    # Containers on different hosts, both running the app as PID 1
+    second = worker_id_leases_repository.acquire(db, "host-b:1", 60)
+
+    assert (first, second) == (0, 1)
+    assert worker_id_leases_repository.renew(db, first, "host-a:1", 60)
+    assert not worker_id_leases_repository.renew(db, first, "host-b:1", 60)
+
+
+def test_expired_lease_is_taken_over_and_lost_by_its_old_owner(db):
+    worker_id = worker_id_leases_repository.acquire(db, "old", 60)
+    db.get(WorkerIdLease, worker_id).expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+
+    assert worker_id_leases_repository.acquire(db, "new", 60) == worker_id
+    assert not worker_id_leases_repository.renew(db, worker_id, "old", 60)
+
+    worker_id_leases_repository.release(db, worker_id, "new")
+    assert worker_id_leases_repository.acquire(db, "next", 60) == worker_id
+
+
+def test_no_worker_id_is_handed_out_twice(db):
+    for i in range(MAX_WORKER_ID + 1):
+        worker_id_leases_repository.acquire(db, f"process-{i}", 60)
+
+    with pytest.raises(RuntimeError):
+        worker_id_leases_repository.acquire(db, "one-too-many", 60)